@@ -0,0 +1,22 @@
+"""
+Import time (`timeraw_*`) of the package and of the array-only code path,
+each measured in a fresh interpreter.
+
+Geometry libraries are imported lazily, so these should stay well below
+the cost of importing geopandas.
+"""
+
+
+def timeraw_import_package():
+    return "import partisan_dislocation"
+
+
+def timeraw_import_array_path():
+    return """
+    from partisan_dislocation import VoterPoints, calculate_voter_knn, score_plans
+    """
+
+
+def timeraw_import_geopandas():
+    "Reference point for the two benchmarks above"
+    return "import geopandas"
@@ -0,0 +1,87 @@
+"""
+Wall time (`time_*`) and peak memory (`peakmem_*`) of each pipeline stage.
+
+Run with `asv run` or, against the installed package without building
+environments, `asv run --python=same`.
+"""
+
+import partisan_dislocation as pdn
+
+from .common import input_data
+
+# Synthetic grids always run; state subsets need the git-lfs shapefiles.
+DATASETS = ["grid-30", "grid-100", "state-small", "state-medium", "state-large"]
+
+# Sampling rates suited to grids (1000 votes per precinct) and to real
+# states (tens of millions of votes) respectively.
+GRID_P = [0.01, 0.03]
+STATE_P = [0.0001, 0.001]
+
+
+def _p(dataset, level):
+    "Sampling rate for the dataset at level 0 (sparse) or 1 (dense)"
+    return (GRID_P if dataset.startswith("grid") else STATE_P)[level]
+
+
+class PointGeneration:
+    params = (DATASETS, [0, 1])
+    param_names = ["dataset", "p_level"]
+    timeout = 600
+
+    def setup(self, dataset, p_level):
+        self.precincts, _ = input_data(dataset)
+        self.p = _p(dataset, p_level)
+
+    def time_random_points_in_polygon(self, dataset, p_level):
+        pdn.random_points_in_polygon(self.precincts, p=self.p, random_seed=0)
+
+    def peakmem_random_points_in_polygon(self, dataset, p_level):
+        pdn.random_points_in_polygon(self.precincts, p=self.p, random_seed=0)
+
+    def time_random_points_as_voter_points(self, dataset, p_level):
+        pdn.random_points_in_polygon(
+            self.precincts, p=self.p, random_seed=0, as_voter_points=True
+        )
+
+
+class NearestNeighbors:
+    params = (DATASETS, [0, 1], [20, 200], ["exact", "grid"])
+    param_names = ["dataset", "p_level", "k", "method"]
+    timeout = 600
+
+    def setup(self, dataset, p_level, k, method):
+        precincts, _ = input_data(dataset)
+        self.voters = pdn.random_points_in_polygon(
+            precincts, p=_p(dataset, p_level), random_seed=0, as_voter_points=True
+        )
+        if k >= len(self.voters):
+            raise NotImplementedError("Too few voters for k.")
+
+    def time_calculate_voter_knn(self, dataset, p_level, k, method):
+        pdn.calculate_voter_knn(self.voters, k, method=method)
+
+    def peakmem_calculate_voter_knn(self, dataset, p_level, k, method):
+        pdn.calculate_voter_knn(self.voters, k, method=method)
+
+
+class Dislocation:
+    params = (DATASETS, [0, 1])
+    param_names = ["dataset", "p_level"]
+    timeout = 600
+
+    def setup(self, dataset, p_level):
+        precincts, self.districts = input_data(dataset)
+        voters = pdn.random_points_in_polygon(
+            precincts, p=_p(dataset, p_level), random_seed=0, as_voter_points=True
+        )
+        self.voters = pdn.calculate_voter_knn(voters, min(50, len(voters) - 1))
+        self.voters_gdf = self.voters.to_geodataframe()
+
+    def time_calculate_dislocation(self, dataset, p_level):
+        pdn.calculate_dislocation(self.voters_gdf, self.districts, unassigned="keep")
+
+    def peakmem_calculate_dislocation(self, dataset, p_level):
+        pdn.calculate_dislocation(self.voters_gdf, self.districts, unassigned="keep")
+
+    def time_calculate_dislocation_voter_points(self, dataset, p_level):
+        pdn.calculate_dislocation(self.voters, self.districts, unassigned="keep")
@@ -0,0 +1,88 @@
+"""Input data shared by the benchmarks."""
+
+import os
+
+import numpy as np
+import geopandas as gpd
+from shapely.geometry import box
+
+DATA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "2008_presidential_precinct_data",
+)
+
+# State FIPS codes of the bundled-data benchmarks, smallest to largest.
+STATES = {"small": "10", "medium": "37", "large": "48"}
+
+_state_cache = {}
+
+
+def _is_lfs_pointer(path):
+    "True for files git-lfs has not replaced with their content"
+    with open(path, "rb") as f:
+        return f.read(40).startswith(b"version https://git-lfs")
+
+
+def state_data(size):
+    """
+    Precincts (with `dem`/`rep` columns) and congressional districts of
+    one state from the bundled 2008 shapefiles, in ESRI:102010.
+
+    Raises NotImplementedError, which asv reports as a skipped benchmark,
+    when the shapefiles have not been fetched with git-lfs.
+    """
+    if size in _state_cache:
+        return _state_cache[size]
+
+    precinct_file = os.path.join(DATA_DIR, "2008_presidential_precinct_counts.shp")
+    district_file = os.path.join(DATA_DIR, "US_cd114th_2014.shp")
+    for path in (precinct_file, district_file):
+        if not os.path.exists(path) or _is_lfs_pointer(path):
+            raise NotImplementedError("Bundled shapefiles are not available.")
+
+    state = STATES[size]
+    precincts = gpd.read_file(precinct_file, where=f"STATE = '{state}'")
+    precincts = precincts.rename(columns={"P2008_D": "dem", "P2008_R": "rep"})
+    districts = gpd.read_file(district_file, where=f"STATEFP = '{state}'")
+
+    _state_cache[size] = (
+        precincts.to_crs("esri:102010").reset_index(drop=True),
+        districts.to_crs("esri:102010").reset_index(drop=True),
+    )
+    return _state_cache[size]
+
+
+def grid_data(n, n_districts=4, votes=1000, seed=0):
+    """
+    Synthetic n x n grid of unit square precincts with random vote
+    counts averaging `votes` per precinct, and `n_districts` vertical
+    strip districts.
+    """
+    rng = np.random.default_rng(seed)
+    dem = rng.integers(0, votes, n * n)
+    precincts = gpd.GeoDataFrame(
+        {
+            "dem": dem,
+            "rep": votes - dem,
+            "geometry": [box(i, j, i + 1, j + 1) for i in range(n) for j in range(n)],
+        },
+        crs="esri:102010",
+    )
+
+    edges = np.linspace(0, n, n_districts + 1)
+    districts = gpd.GeoDataFrame(
+        {
+            "district": np.arange(n_districts),
+            "geometry": [box(x0, 0, x1, n) for x0, x1 in zip(edges[:-1], edges[1:])],
+        },
+        crs="esri:102010",
+    )
+    return precincts, districts
+
+
+def input_data(dataset):
+    "Precincts and districts for a dataset name such as 'grid-100' or 'state-small'"
+    kind, size = dataset.split("-")
+    if kind == "grid":
+        return grid_data(int(size))
+    return state_data(size)
@@ -1,9 +1,47 @@
 """Partisan Dislocation"""
 
-from .partisan_dislocation import (
-    random_points_in_polygon,
-    calculate_voter_knn,
-    calculate_dislocation,
-)
+import importlib
+
+# Public names and the submodules defining them. Submodules are imported
+# on first access, so `import partisan_dislocation` is nearly free and
+# array-only work (VoterPoints, kNN shares, scoring precinct assignments
+# with score_plans) loads NumPy and SciPy but never geopandas or shapely.
+_EXPORTS = {
+    "random_points_in_polygon": "partisan_dislocation",
+    "weighted_points_in_polygon": "partisan_dislocation",
+    "calculate_voter_knn": "partisan_dislocation",
+    "calculate_dislocation": "partisan_dislocation",
+    "assign_districts": "partisan_dislocation",
+    "iter_dislocation_tiles": "streaming",
+    "score_plans": "ensemble",
+    "replicate_dislocation": "replication",
+    "aggregate_dislocation": "aggregation",
+    "VoterCache": "cache",
+    "cached_voter_knn": "cache",
+    "profile": "profiling",
+    "ProfileReport": "profiling",
+    "precinct_dislocation": "analytic",
+    "IncrementalDislocation": "incremental",
+    "read_precincts": "columnar",
+    "write_precincts": "columnar",
+    "read_voter_points": "columnar",
+    "write_voter_points": "columnar",
+    "VoterPoints": "voter_points",
+}
+
+__all__ = list(_EXPORTS)
 
 __version__ = "0.7.3"
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(f".{_EXPORTS[name]}", __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted([*globals(), *_EXPORTS])
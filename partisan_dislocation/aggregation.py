@@ -0,0 +1,112 @@
+"""Aggregation of voter-level dislocation to precincts and districts."""
+
+import numpy as np
+import pandas as pd
+
+from .partisan_dislocation import _assign_points
+from .voter_points import VoterPoints
+
+
+def _unit_codes(voter_dislocation, units, unit_column, unit_id_col):
+    "Position in `units` of each voter's unit, or -1 for voters in none"
+    if unit_column is None:
+        if isinstance(voter_dislocation, VoterPoints):
+            xs, ys = voter_dislocation.x, voter_dislocation.y
+        else:
+            xs = voter_dislocation.geometry.x.to_numpy()
+            ys = voter_dislocation.geometry.y.to_numpy()
+        units = units.to_crs(voter_dislocation.crs)
+        return _assign_points(xs, ys, units.geometry.to_numpy())
+
+    values = np.asarray(voter_dislocation[unit_column])
+
+    if unit_id_col is None:
+        if len(values) and ((values < -1).any() or (values >= len(units)).any()):
+            raise ValueError(
+                f"Values of {unit_column} are not positions in the units GeoDataFrame."
+            )
+        return values.astype("int64")
+
+    labels = pd.Index(units[unit_id_col])
+    if not labels.is_unique:
+        raise ValueError(f"Values of {unit_id_col} must be unique.")
+    return labels.get_indexer(values)
+
+
+def aggregate_dislocation(
+    voter_dislocation,
+    units,
+    unit_column=None,
+    unit_id_col=None,
+    dislocation_column="partisan_dislocation",
+    dem_column="dem",
+    weight_column=None,
+):
+    """
+    Aggregates voter-level dislocation to precincts, districts or any
+    other set of polygons.
+
+    Voters are grouped by integer unit codes and every statistic comes out
+    of one :func:`numpy.bincount` pass, so this stays fast for hundreds of
+    millions of voters.
+
+    Returns a :class:`geopandas.GeoDataFrame` with one row per unit (same
+    index, geometry and `unit_id_col` as `units`) and columns `n_voters`,
+    `dem_share`, `mean_dislocation` (signed), `mean_abs_dislocation` and
+    `rms_dislocation`. Statistics are NaN for units without voters.
+
+    :param voter_dislocation: :class:`geopandas.GeoDataFrame` or :class:`VoterPoints`.
+          Output of :func:`calculate_dislocation`.
+    :param units: :class:`geopandas.GeoDataFrame`.
+          Polygons to aggregate to, e.g. the precincts or districts.
+    :param unit_column: (default=None)
+          Column of `voter_dislocation` identifying each voter's unit. If
+          None, voters are assigned to units by location.
+    :param unit_id_col: (default=None)
+          Column of `units` holding the identifiers found in
+          `unit_column`. If None, `unit_column` holds positions in `units`
+          (as the precinct positions recorded by
+          :func:`random_points_in_polygon` do).
+    :param dislocation_column: (default="partisan_dislocation")
+          Column of `voter_dislocation` with dislocation scores.
+    :param dem_column: (default="dem")
+          Column with voter attribute to be averaged (usually "dem").
+    :param weight_column: (default=None)
+          Column with the number of voters each point stands for (see
+          :func:`weighted_points_in_polygon`). `n_voters` is then the sum
+          of weights and all statistics are weighted.
+    """
+
+    codes = _unit_codes(voter_dislocation, units, unit_column, unit_id_col)
+    dislocation = np.asarray(voter_dislocation[dislocation_column], dtype="float64")
+    dem = np.asarray(voter_dislocation[dem_column], dtype="float64")
+
+    if weight_column is None:
+        weight = np.ones(len(codes))
+    else:
+        weight = np.asarray(voter_dislocation[weight_column], dtype="float64")
+
+    keep = (codes >= 0) & ~np.isnan(dislocation)
+    codes, dislocation, dem = codes[keep], dislocation[keep], dem[keep]
+    weight = weight[keep]
+
+    def totals(values=None):
+        weights = weight if values is None else values * weight
+        return np.bincount(codes, weights=weights, minlength=len(units))
+
+    n_voters = totals()
+    if weight_column is None:
+        n_voters = n_voters.astype("int64")
+    keep = [units.geometry.name]
+    if unit_id_col is not None:
+        keep.insert(0, unit_id_col)
+    aggregated = units[keep].copy()
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        aggregated["n_voters"] = n_voters
+        aggregated["dem_share"] = totals(dem) / n_voters
+        aggregated["mean_dislocation"] = totals(dislocation) / n_voters
+        aggregated["mean_abs_dislocation"] = totals(np.abs(dislocation)) / n_voters
+        aggregated["rms_dislocation"] = np.sqrt(totals(dislocation**2) / n_voters)
+
+    return aggregated
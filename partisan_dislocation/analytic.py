@@ -0,0 +1,391 @@
+"""Precinct-level dislocation without sampling voter points."""
+
+import numpy as np
+import shapely
+
+from .partisan_dislocation import (
+    _assign_points,
+    _check_inputs,
+    _group_means,
+    _shard,
+    random_points_in_polygon,
+    calculate_voter_knn,
+    calculate_dislocation,
+)
+
+# Relative error in the expected number of voters in a neighborhood at
+# which the radius search stops, and a cap on its iterations.
+_RADIUS_TOLERANCE = 1e-4
+_MAX_RADIUS_ITERATIONS = 100
+
+# Upper bound on polygon edges processed at once when measuring overlaps.
+_MAX_EDGES_PER_BLOCK = 5_000_000
+
+
+def _expected_votes(dem_votes, rep_votes, uniform_swing_to_dems):
+    "Expected dem and total votes per precinct after uniform swing"
+    dem_votes = np.asarray(dem_votes, dtype="float64")
+    voters = dem_votes + np.asarray(rep_votes, dtype="float64")
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        share = np.where(voters > 0, dem_votes / voters, 0.5)
+    share = np.clip(share + uniform_swing_to_dems, 0, 1)
+    return share * voters, voters
+
+
+def _angle(ux, uy, vx, vy):
+    "Signed angle from vector u to vector v"
+    return np.arctan2(ux * vy - uy * vx, ux * vx + uy * vy)
+
+
+def _segment_disk_areas(ax, ay, bx, by, radius):
+    """
+    Signed area of the intersection of the triangle (origin, a, b) with
+    the disk of `radius` around the origin. Summed over the edges of a
+    counter-clockwise ring, this is the exact area of the ring's interior
+    inside the disk.
+
+    The segment is split where it crosses the circle: the part inside
+    contributes a triangle and the parts outside contribute circular
+    sectors.
+    """
+    dx, dy = bx - ax, by - ay
+    a = dx * dx + dy * dy
+    b = ax * dx + ay * dy
+    c = ax * ax + ay * ay - radius * radius
+    discriminant = b * b - a * c
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        root = np.sqrt(np.maximum(discriminant, 0))
+        t1 = np.clip((-b - root) / a, 0, 1)
+        t2 = np.clip((-b + root) / a, 0, 1)
+
+    # Segments that miss the circle are all sector.
+    misses = (discriminant <= 0) | (a == 0)
+    t1 = np.where(misses, 1, t1)
+    t2 = np.where(misses, 1, t2)
+
+    x1, y1 = ax + t1 * dx, ay + t1 * dy
+    x2, y2 = ax + t2 * dx, ay + t2 * dy
+
+    triangle = (x1 * y2 - y1 * x2) / 2
+    sectors = radius * radius / 2 * (_angle(ax, ay, x1, y1) + _angle(x2, y2, bx, by))
+    return triangle + sectors
+
+
+class _DiskOverlap:
+    """
+    Exact area of the intersection of disks with a fixed set of polygons,
+    from the polygons' edges.
+
+    Rings are stored counter-clockwise with a sign of +1 for exteriors and
+    -1 for holes, so summing :func:`_segment_disk_areas` over a polygon's
+    edges gives its area inside a disk without any polygon overlay.
+    """
+
+    def __init__(self, geometries):
+        self.tree = shapely.STRtree(geometries)
+
+        parts, part_polygon = shapely.get_parts(geometries, return_index=True)
+        rings, ring_part = shapely.get_rings(parts, return_index=True)
+        exterior = np.concatenate([[True], ring_part[1:] != ring_part[:-1]])
+        coords, coord_ring = shapely.get_coordinates(rings, return_index=True)
+
+        # Edges join consecutive coordinates of the same (closed) ring.
+        starts = np.flatnonzero(coord_ring[1:] == coord_ring[:-1])
+        edge_ring = coord_ring[starts]
+        a, b = coords[starts], coords[starts + 1]
+
+        # Orient every ring counter-clockwise.
+        ring_area = np.bincount(
+            edge_ring,
+            weights=a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0],
+            minlength=len(rings),
+        )
+        clockwise = ring_area[edge_ring] < 0
+        a, b = np.where(clockwise[:, None], b, a), np.where(clockwise[:, None], a, b)
+
+        self.ax, self.ay = a[:, 0], a[:, 1]
+        self.bx, self.by = b[:, 0], b[:, 1]
+        self.sign = np.where(exterior[edge_ring], 1.0, -1.0)
+
+        # Edges are grouped by polygon, in order.
+        edge_polygon = part_polygon[ring_part[edge_ring]]
+        self.edge_count = np.bincount(edge_polygon, minlength=len(geometries))
+        self.edge_start = np.concatenate([[0], np.cumsum(self.edge_count)[:-1]])
+
+    def areas(self, x, y, radius):
+        """
+        Pairs of (disk, polygon) whose bounding boxes overlap and the area
+        of each polygon inside each disk, for disks centered at x, y.
+        """
+        disk_index, polygon_index = self.tree.query(
+            shapely.box(x - radius, y - radius, x + radius, y + radius)
+        )
+        areas = np.empty(len(disk_index))
+
+        # Process pairs in blocks of bounded total edge count.
+        edge_counts = self.edge_count[polygon_index]
+        n_blocks = int(edge_counts.sum() // _MAX_EDGES_PER_BLOCK) + 1
+
+        for start, stop in _shard(edge_counts, n_blocks):
+            disks, polygons = disk_index[start:stop], polygon_index[start:stop]
+            counts = edge_counts[start:stop]
+            pair = np.repeat(np.arange(len(polygons)), counts)
+            first = np.cumsum(counts) - counts
+            edge = self.edge_start[polygons][pair] + np.arange(len(pair)) - first[pair]
+
+            cx, cy = x[disks][pair], y[disks][pair]
+            contribution = _segment_disk_areas(
+                self.ax[edge] - cx,
+                self.ay[edge] - cy,
+                self.bx[edge] - cx,
+                self.by[edge] - cy,
+                radius[disks][pair],
+            )
+            areas[start:stop] = np.bincount(
+                pair, weights=contribution * self.sign[edge], minlength=len(polygons)
+            )
+
+        return disk_index, polygon_index, areas
+
+
+def _expected_knn_shares(geometries, dem_votes, voters, centers, target):
+    """
+    Expected dem share of the `target` voters nearest each center,
+    treating each precinct's votes as spread uniformly over its area.
+
+    For every center, a disk radius is found so the disk is expected to
+    hold `target` voters; the share is the overlap-weighted dem votes over
+    the overlap-weighted votes in that disk. Returns the shares and the
+    radii.
+
+    The expected count grows with the square of the radius where density
+    is locally even, so each step rescales the radius by the square root
+    of target over current count, which usually converges in a few
+    steps. Steps that would leave the bracket of radii known to be too
+    small and too large bisect it instead, so the search always converges.
+    """
+    areas = shapely.area(geometries)
+    usable = areas > 0
+    geometries, areas = geometries[usable], areas[usable]
+    values = np.column_stack([voters[usable], dem_votes[usable]])
+    overlap = _DiskOverlap(geometries)
+    x, y = shapely.get_x(centers), shapely.get_y(centers)
+
+    def totals_within(rows, radii):
+        disk_index, precinct_index, inside = overlap.areas(x[rows], y[rows], radii)
+        weight = inside / areas[precinct_index]
+        return np.column_stack(
+            [
+                np.bincount(
+                    disk_index,
+                    weights=weight * values[precinct_index, column],
+                    minlength=len(rows),
+                )
+                for column in range(values.shape[1])
+            ]
+        )
+
+    # Start at the radius implied by the state's average density.
+    min_x, min_y, max_x, max_y = shapely.total_bounds(geometries)
+    density = values[:, 0].sum() / max((max_x - min_x) * (max_y - min_y), 1e-300)
+    max_radius = 2 * np.hypot(max_x - min_x, max_y - min_y)
+
+    radius = np.full(len(centers), np.sqrt(target / (np.pi * density)))
+    low = np.zeros(len(centers))
+    high = np.full(len(centers), np.inf)
+    totals = np.zeros((len(centers), 2))
+    active = np.arange(len(centers))
+
+    for _ in range(_MAX_RADIUS_ITERATIONS):
+        totals[active] = totals_within(active, radius[active])
+        count = totals[active, 0]
+
+        enough = count >= target
+        high[active] = np.where(
+            enough, np.minimum(high[active], radius[active]), high[active]
+        )
+        low[active] = np.where(
+            enough, low[active], np.maximum(low[active], radius[active])
+        )
+        if (low[active] > max_radius).any():
+            raise ValueError(
+                "k must be smaller than the expected number of voter points."
+            )
+
+        converged = np.abs(count - target) <= _RADIUS_TOLERANCE * target
+        active, count = active[~converged], count[~converged]
+        if len(active) == 0:
+            break
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            proposal = radius[active] * np.sqrt(target / count)
+        outside = ~((proposal > low[active]) & (proposal < high[active]))
+        fallback = np.where(
+            np.isfinite(high[active]),
+            (low[active] + high[active]) / 2,
+            2 * radius[active],
+        )
+        radius[active] = np.where(outside, fallback, proposal)
+
+    return totals[:, 1] / totals[:, 0], radius
+
+
+def precinct_dislocation(
+    precincts,
+    districts,
+    k,
+    p=0.01,
+    dem_vote_count="dem",
+    repub_vote_count="rep",
+    uniform_swing_to_dems=0,
+    method="sampling",
+    random_seed=None,
+    precinct_id_col=None,
+    district_id_col=None,
+):
+    """
+    Average dislocation of the voters of each precinct.
+
+    With `method="sampling"`, voter points are drawn and scored with
+    :func:`random_points_in_polygon`, :func:`calculate_voter_knn` and
+    :func:`calculate_dislocation`, then averaged by precinct.
+
+    With `method="analytic"`, no points are drawn. Each precinct's votes
+    are treated as spread uniformly over its area. The neighborhood of a
+    precinct is the disk around its representative point expected to
+    contain k / p voters, and its kNN share is the dem share of the votes
+    in that disk, weighting each precinct by the share of its area inside
+    the disk. District shares weight precincts by their overlap with
+    each district in the same way. This is the expectation the sampling
+    method estimates (up to evaluating each precinct's neighborhood at
+    one point), without Monte Carlo noise, and its cost scales with the
+    number of precincts rather than voters.
+
+    Returns a :class:`geopandas.GeoDataFrame` with one row per precinct
+    (same index and geometry as `precincts`) and columns `knn_shr_dem`,
+    `district_dem_share` and `partisan_dislocation`. The sampling method
+    adds `n_voters` (NaN statistics for precincts without voter points),
+    the analytic method adds `knn_radius`.
+
+    :param precincts: :class:`geopandas.GeoDataFrame`
+          Polygon shapefile with vote totals.
+    :param districts: :class:`geopandas.GeoDataFrame`.
+          GeoDataFrame of electoral district polygons.
+    :param k: Num nearest neighbors to consider.
+    :param p: (default=0.01)
+          Sampling parameter. The analytic neighborhood holds k / p voters.
+    :param dem_vote_count: (default="dem")
+          Name of column with Democratic vote counts per precinct.
+    :param repub_vote_count: (default="rep")
+          Name of column with Republican vote counts per precinct.
+    :param uniform_swing_to_dems: (default=0)
+          Swing in expected vote share for dems.
+    :param method: (default="sampling")
+          "sampling" or "analytic".
+    :param random_seed: (default=None)
+          Seed for the sampling method.
+    :param precinct_id_col: (default=None)
+          Column of `precincts` to include in the output.
+    :param district_id_col: (default=None)
+          Column of `districts` to include in the output, giving the
+          district containing each precinct's representative point.
+    """
+
+    if method not in ("sampling", "analytic"):
+        raise ValueError('method must be "sampling" or "analytic".')
+
+    _check_inputs(precincts, uniform_swing_to_dems)
+
+    districts = districts.to_crs(precincts.crs).reset_index(drop=True)
+    geometries = precincts.geometry.to_numpy()
+    centers = shapely.point_on_surface(geometries)
+
+    keep = [precincts.geometry.name]
+    if precinct_id_col is not None:
+        keep.insert(0, precinct_id_col)
+    result = precincts[keep].copy()
+
+    if method == "sampling":
+        voters = random_points_in_polygon(
+            precincts,
+            p=p,
+            dem_vote_count=dem_vote_count,
+            repub_vote_count=repub_vote_count,
+            uniform_swing_to_dems=uniform_swing_to_dems,
+            random_seed=random_seed,
+            as_voter_points=True,
+        )
+        voters = calculate_dislocation(
+            calculate_voter_knn(voters, k), districts, unassigned="keep"
+        )
+        precinct = voters.precinct
+        assigned = ~np.isnan(voters["partisan_dislocation"])
+        precinct = precinct[assigned]
+
+        for column in ["knn_shr_dem", "district_dem_share", "partisan_dislocation"]:
+            result[column] = _group_means(
+                precinct, voters[column][assigned], len(precincts)
+            )
+        result["n_voters"] = np.bincount(voters.precinct, minlength=len(precincts))
+
+    else:
+        dem_votes, votes = _expected_votes(
+            precincts[dem_vote_count].to_numpy(),
+            precincts[repub_vote_count].to_numpy(),
+            uniform_swing_to_dems,
+        )
+        if k >= p * votes.sum():
+            raise ValueError(
+                "k must be smaller than the expected number of voter points."
+            )
+
+        knn_share, radius = _expected_knn_shares(
+            geometries, dem_votes, votes, centers, k / p
+        )
+
+        # Share of each precinct's area in each district
+        district_geometries = districts.geometry.to_numpy()
+        precinct_index, district_index = shapely.STRtree(district_geometries).query(
+            geometries
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weight = shapely.area(
+                shapely.intersection(
+                    geometries[precinct_index], district_geometries[district_index]
+                )
+            ) / shapely.area(geometries[precinct_index])
+        weight = np.nan_to_num(weight)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            district_share = np.bincount(
+                district_index,
+                weights=weight * dem_votes[precinct_index],
+                minlength=len(districts),
+            ) / np.bincount(
+                district_index,
+                weights=weight * votes[precinct_index],
+                minlength=len(districts),
+            )
+            precinct_share = np.bincount(
+                precinct_index,
+                weights=weight * np.nan_to_num(district_share[district_index]),
+                minlength=len(precincts),
+            ) / np.bincount(precinct_index, weights=weight, minlength=len(precincts))
+
+        result["knn_shr_dem"] = knn_share
+        result["district_dem_share"] = precinct_share
+        result["partisan_dislocation"] = precinct_share - knn_share
+        result["knn_radius"] = radius
+
+    if district_id_col is not None:
+        assignment = _assign_points(
+            shapely.get_x(centers),
+            shapely.get_y(centers),
+            districts.geometry.to_numpy(),
+        )
+        labels = districts[district_id_col].reset_index(drop=True)
+        result[district_id_col] = labels.reindex(assignment).to_numpy()
+
+    return result
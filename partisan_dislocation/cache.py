@@ -0,0 +1,247 @@
+"""On-disk cache of generated voter points and kNN scores."""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import shapely
+
+from .partisan_dislocation import random_points_in_polygon, calculate_voter_knn
+from .voter_points import VoterPoints
+
+# Bumped whenever point generation or the storage layout changes, so stale
+# entries are never read back.
+_CACHE_FORMAT = 1
+
+_default_cache = None
+
+
+class VoterCache:
+    """
+    Directory of cached voter points with kNN scores.
+
+    Each entry is a subdirectory named after its key, written with
+    :meth:`VoterPoints.save` so it can be memory-mapped on load. When
+    the total size exceeds `max_bytes`, the least recently used entries are
+    removed.
+
+    :param directory: (default=None)
+          Where entries are stored. Defaults to the
+          `PARTISAN_DISLOCATION_CACHE_DIR` environment variable, or
+          `~/.cache/partisan_dislocation`.
+    :param max_bytes: (default=10 GiB)
+          Total size of entries kept on disk.
+    :param enabled: (default=True)
+          If False, nothing is read or written.
+    """
+
+    def __init__(self, directory=None, max_bytes=10 * 2**30, enabled=True):
+        if directory is None:
+            directory = os.environ.get(
+                "PARTISAN_DISLOCATION_CACHE_DIR",
+                os.path.join(os.path.expanduser("~"), ".cache", "partisan_dislocation"),
+            )
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+
+    def __repr__(self):
+        return f"<VoterCache: {self.directory}>"
+
+    def _entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if os.path.isfile(os.path.join(self.directory, name, "meta.json"))
+        ]
+
+    def size(self):
+        "Total bytes of all entries"
+        return sum(_directory_size(entry) for entry in self._entries())
+
+    def clear(self):
+        "Removes all entries"
+        for entry in self._entries():
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def get(self, key, mmap_mode="r"):
+        """
+        The :class:`VoterPoints` stored under `key`, or None.
+
+        :param mmap_mode: (default="r")
+              Passed to :meth:`VoterPoints.load`. None reads the arrays
+              into memory instead of memory-mapping them.
+        """
+        if not self.enabled:
+            return None
+
+        entry = os.path.join(self.directory, key)
+        try:
+            voters = VoterPoints.load(entry, mmap_mode=mmap_mode)
+        except (OSError, ValueError, KeyError):
+            return None
+
+        # Mark as recently used for eviction. Best effort, since the cache
+        # may be read-only or shared.
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return voters
+
+    def put(self, key, voter_points):
+        "Stores `voter_points` under `key`, then evicts old entries"
+        if not self.enabled:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=self.directory, prefix=".tmp-")
+        try:
+            voter_points.save(staging)
+
+            # Rename is atomic, so readers never see a partial entry.
+            os.replace(staging, os.path.join(self.directory, key))
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.isdir(os.path.join(self.directory, key)):
+                raise
+
+        self.evict()
+
+    def evict(self):
+        "Removes least recently used entries until under `max_bytes`"
+        entries = sorted(self._entries(), key=os.path.getmtime)
+        sizes = [_directory_size(entry) for entry in entries]
+        total = sum(sizes)
+        for entry, size in zip(entries, sizes):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+
+def _directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(path, name))
+        for name in os.listdir(path)
+        if os.path.isfile(os.path.join(path, name))
+    )
+
+
+def _resolve_cache(cache):
+    global _default_cache
+    if cache is False:
+        return VoterCache(enabled=False)
+    if cache is None or cache is True:
+        if _default_cache is None:
+            _default_cache = VoterCache()
+        return _default_cache
+    return cache
+
+
+def cache_key(precincts, dem_vote_count="dem", repub_vote_count="rep", **params):
+    """
+    Content hash identifying the voter points (and kNN scores) generated
+    from `precincts` with the given parameters. Geometries are hashed as
+    WKB along with the vote columns and CRS, so editing any precinct
+    changes the key.
+    """
+    digest = hashlib.sha256()
+    params = json.dumps(
+        {"format": _CACHE_FORMAT, **params},
+        sort_keys=True,
+        default=lambda value: np.asarray(value).tolist(),
+    )
+    digest.update(params.encode())
+    digest.update(str(precincts.crs).encode())
+    for wkb in shapely.to_wkb(precincts.geometry.to_numpy()):
+        digest.update(wkb)
+    for column in (dem_vote_count, repub_vote_count):
+        digest.update(
+            np.ascontiguousarray(precincts[column], dtype="float64").tobytes()
+        )
+    return digest.hexdigest()
+
+
+def cached_voter_knn(
+    precincts,
+    k,
+    p=0.01,
+    dem_vote_count="dem",
+    repub_vote_count="rep",
+    uniform_swing_to_dems=0,
+    random_seed=None,
+    cache=None,
+    n_jobs=1,
+    workers=1,
+    chunk_size=None,
+):
+    """
+    Voter points with kNN scores, as :func:`random_points_in_polygon`
+    (with `as_voter_points=True`) followed by :func:`calculate_voter_knn`,
+    reusing earlier results for the same inputs from an on-disk cache.
+
+    Results are only cached when `random_seed` is given, since otherwise
+    every call is meant to produce a new draw.
+
+    :param precincts: :class:`geopandas.GeoDataFrame`
+          Polygon shapefile with vote totals.
+    :param k: Num nearest neighbors to consider (or a list of them).
+    :param p: (default=0.01)
+          Sampling parameter passed to :func:`random_points_in_polygon`.
+    :param dem_vote_count: (default="dem")
+          Name of column with Democratic vote counts per precinct.
+    :param repub_vote_count: (default="rep")
+          Name of column with Republican vote counts per precinct.
+    :param uniform_swing_to_dems: (default=0)
+          Swing in expected vote share for dems.
+    :param random_seed: (default=None)
+          Seed passed to :class:`numpy.random.SeedSequence`.
+    :param cache: (default=None)
+          A :class:`VoterCache`. None uses a shared default cache and
+          False disables caching.
+    :param n_jobs: (default=1)
+          Number of processes used to place points.
+    :param workers: (default=1)
+          Number of threads used to query the kNN tree.
+    :param chunk_size: (default=None)
+          Number of voters queried at a time. By default sized from k,
+          as in :func:`calculate_voter_knn`.
+    """
+    cache = _resolve_cache(cache)
+
+    key = None
+    if random_seed is not None and cache.enabled:
+        key = cache_key(
+            precincts,
+            dem_vote_count,
+            repub_vote_count,
+            k=np.atleast_1d(k).tolist() if np.ndim(k) else int(k),
+            p=p,
+            uniform_swing_to_dems=uniform_swing_to_dems,
+            random_seed=random_seed,
+        )
+        voters = cache.get(key)
+        if voters is not None:
+            return voters
+
+    voters = random_points_in_polygon(
+        precincts,
+        p=p,
+        dem_vote_count=dem_vote_count,
+        repub_vote_count=repub_vote_count,
+        uniform_swing_to_dems=uniform_swing_to_dems,
+        random_seed=random_seed,
+        n_jobs=n_jobs,
+        as_voter_points=True,
+    )
+    voters = calculate_voter_knn(voters, k, workers=workers, chunk_size=chunk_size)
+
+    if key is not None:
+        cache.put(key, voters)
+    return voters
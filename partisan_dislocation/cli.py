@@ -0,0 +1,448 @@
+"""Command-line batch runner: ``python -m partisan_dislocation``."""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from .aggregation import aggregate_dislocation
+from .columnar import (
+    _as_column_type,
+    _is_parquet,
+    read_precincts,
+    write_voter_points,
+)
+from .partisan_dislocation import (
+    _resolve_n_jobs,
+    calculate_dislocation,
+    calculate_voter_knn,
+    random_points_in_polygon,
+)
+from .profiling import logger
+from .voter_points import VoterPoints
+
+# Directory under the output root holding each state's voters and kNN
+# scores, shared by all of that state's chambers.
+VOTER_DIR = "_voters"
+
+# Column added to district files holding each district's row position.
+DISTRICT_COLUMN = "district"
+
+
+def _parse_districts(values):
+    "Turns NAME=PATH (or PATH, named after the file) arguments into a dict"
+    chambers = {}
+    for value in values:
+        name, sep, path = value.partition("=")
+        if not sep:
+            path = value
+            name = os.path.splitext(os.path.basename(value))[0]
+        if name in chambers:
+            raise ValueError(f"District set {name} given more than once.")
+        chambers[name] = path
+    return chambers
+
+
+def _state_seed(random_seed, state):
+    "Seed of one state's draw, independent of which other states run"
+    if random_seed is None:
+        return None
+    return [random_seed, zlib.crc32(str(state).encode())]
+
+
+def _replace(staging, path):
+    "Moves a finished file or directory into place, replacing any old one"
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.replace(staging, path)
+
+
+def _voter_parameters(state_seed, crs, options):
+    "Everything a state's saved voters depend on besides its precincts"
+    return {
+        "seed": state_seed,
+        "crs": crs.to_wkt() if hasattr(crs, "to_wkt") else crs,
+        **{
+            name: options[name]
+            for name in (
+                "k",
+                "p",
+                "dem_vote_count",
+                "repub_vote_count",
+                "uniform_swing_to_dems",
+            )
+        },
+    }
+
+
+def _saved_parameters(path):
+    "Parameters stored with saved voters, or None"
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            return json.load(f).get("parameters")
+    except (OSError, ValueError):
+        return None
+
+
+def _state_voters(precincts, path, state_seed, parameters, options):
+    """
+    Generates one state's voters with kNN scores and saves them to path,
+    with `parameters` added to their meta.json
+    """
+    voters = random_points_in_polygon(
+        precincts,
+        p=options["p"],
+        dem_vote_count=options["dem_vote_count"],
+        repub_vote_count=options["repub_vote_count"],
+        uniform_swing_to_dems=options["uniform_swing_to_dems"],
+        random_seed=state_seed,
+        as_voter_points=True,
+    )
+    voters = calculate_voter_knn(voters, options["k"], workers=options["workers"])
+
+    staging = tempfile.mkdtemp(dir=os.path.dirname(path), prefix=".tmp-")
+    voters.save(staging)
+    meta_path = os.path.join(staging, "meta.json")
+    with open(meta_path) as f:
+        meta = json.load(f)
+    meta["parameters"] = parameters
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    _replace(staging, path)
+    return path
+
+
+def _write_voters(voter_points, path, output_format):
+    "Writes voter-level output as a .npy directory or an x/y parquet file"
+    staging = tempfile.mkdtemp(dir=os.path.dirname(path), prefix=".tmp-")
+    if output_format == "npy":
+        voter_points.save(staging)
+    else:
+        staging_file = os.path.join(staging, "voters.parquet")
+        write_voter_points(voter_points, staging_file)
+        os.replace(staging_file, path)
+        shutil.rmtree(staging)
+        return
+    _replace(staging, path)
+
+
+def _chamber_dislocation(voter_path, districts, voter_output, summary_output, options):
+    "Scores one state's voters against one set of districts and writes outputs"
+    voters = VoterPoints.load(voter_path)
+    dislocation = calculate_dislocation(
+        voters, districts, district_id_col=DISTRICT_COLUMN
+    )
+    _write_voters(dislocation, voter_output, options["format"])
+
+    summary = aggregate_dislocation(
+        dislocation,
+        districts,
+        unit_column=DISTRICT_COLUMN,
+        unit_id_col=DISTRICT_COLUMN,
+    )
+    summary = pd.DataFrame(summary.drop(columns=summary.geometry.name))
+    staging = summary_output + ".tmp"
+    summary.to_csv(staging, index=False)
+    os.replace(staging, summary_output)
+    return summary_output
+
+
+def _output_paths(output, chamber, state, output_format):
+    "Voter-level and district summary output paths of one job"
+    suffix = ".parquet" if output_format == "parquet" else ""
+    directory = os.path.join(output, chamber)
+    return (
+        os.path.join(directory, f"{state}_voters{suffix}"),
+        os.path.join(directory, f"{state}_districts.csv"),
+    )
+
+
+def _is_complete(path):
+    "True for outputs written in full (partial ones are never renamed in)"
+    if os.path.isdir(path):
+        return os.path.isfile(os.path.join(path, "meta.json"))
+    return os.path.isfile(path)
+
+
+def run(
+    precinct_file,
+    district_files,
+    output,
+    k,
+    p=0.01,
+    dem_vote_count="dem",
+    repub_vote_count="rep",
+    uniform_swing_to_dems=0,
+    random_seed=None,
+    state_column="STATE",
+    district_state_column=None,
+    states=None,
+    crs="esri:102010",
+    output_format="npy",
+    resume=False,
+    n_jobs=1,
+    workers=1,
+):
+    """
+    Runs every state x chamber dislocation job and writes the results
+    under `output`. Returns a list of (state, chamber, error) tuples for
+    jobs that failed.
+
+    Each state's voters and kNN scores are generated once, saved under
+    `output/_voters/<state>`, and memory-mapped by all of that state's
+    chamber jobs. For each chamber, `output/<chamber>/<state>_voters`
+    holds voter-level dislocation (`district` is the row of the district
+    in its file) and `output/<chamber>/<state>_districts.csv` the
+    per-district summary of :func:`aggregate_dislocation`.
+
+    Outputs are written under a temporary name and renamed into place
+    when complete. With `resume`, finished outputs (including saved
+    voters) are kept and only missing jobs run. Saved voters record the
+    parameters they were generated with; a state whose voters were made
+    with a different `k`, `p`, seed, swing, vote columns or CRS is redone
+    in full.
+
+    :param precinct_file: Precinct file readable by :func:`read_precincts`.
+          For GeoParquet sorted by state (see :func:`write_precincts`),
+          only the row groups of the requested `states` are read.
+    :param district_files: Dict of chamber name to district file.
+    :param output: Output directory.
+    :param k: Num nearest neighbors to consider.
+    :param p: (default=0.01)
+          Sampling parameter passed to :func:`random_points_in_polygon`.
+    :param dem_vote_count: (default="dem")
+          Name of column with Democratic vote counts per precinct.
+    :param repub_vote_count: (default="rep")
+          Name of column with Republican vote counts per precinct.
+    :param uniform_swing_to_dems: (default=0)
+          Swing in expected vote share for dems.
+    :param random_seed: (default=None)
+          Seed combined with each state's code, so a state's draw does not
+          depend on which other states are run.
+    :param state_column: (default="STATE")
+          Column of the precinct file identifying the state.
+    :param district_state_column: (default=None)
+          Column of the district files identifying the state. Defaults to
+          `state_column`.
+    :param states: (default=None)
+          States to run. Defaults to all states in the precinct file.
+    :param crs: (default="esri:102010")
+          Projected CRS used for all computations.
+    :param output_format: (default="npy")
+          "npy" writes voter-level output with :meth:`VoterPoints.save`,
+          "parquet" with :func:`write_voter_points` as x/y columns
+          (requires pyarrow).
+    :param resume: (default=False)
+          Skip outputs that already exist.
+    :param n_jobs: (default=1)
+          Number of processes running jobs. -1 uses all cores.
+    :param workers: (default=1)
+          Number of threads used to query each kNN tree.
+    """
+    if output_format not in ("npy", "parquet"):
+        raise ValueError('output_format must be "npy" or "parquet".')
+    if district_state_column is None:
+        district_state_column = state_column
+
+    options = {
+        "k": k,
+        "p": p,
+        "dem_vote_count": dem_vote_count,
+        "repub_vote_count": repub_vote_count,
+        "uniform_swing_to_dems": uniform_swing_to_dems,
+        "workers": workers,
+        "format": output_format,
+    }
+
+    # GeoParquet precincts sorted by state skip other states' row groups.
+    # The filter needs values of the column's type, e.g. 37 and not "37".
+    read_kwargs = {}
+    if states is not None and _is_parquet(precinct_file):
+        states = _as_column_type(precinct_file, state_column, list(states))
+        read_kwargs["filters"] = [(state_column, "in", states)]
+    precincts = read_precincts(precinct_file, crs=crs, **read_kwargs)
+    precincts[state_column] = precincts[state_column].astype(str)
+    if states is None:
+        states = sorted(precincts[state_column].unique())
+    states = [str(state) for state in states]
+
+    chambers = {}
+    for chamber, path in district_files.items():
+        districts = read_precincts(path, crs=crs)
+        districts[DISTRICT_COLUMN] = np.arange(len(districts))
+        districts[district_state_column] = districts[district_state_column].astype(str)
+        chambers[chamber] = districts
+        os.makedirs(os.path.join(output, chamber), exist_ok=True)
+    os.makedirs(os.path.join(output, VOTER_DIR), exist_ok=True)
+
+    def chamber_jobs(state, skip_complete):
+        "Chamber jobs of a state that still need to run"
+        jobs = []
+        for chamber, districts in chambers.items():
+            paths = _output_paths(output, chamber, state, output_format)
+            if skip_complete and all(_is_complete(path) for path in paths):
+                continue
+            state_districts = districts[districts[district_state_column] == state]
+            if len(state_districts) == 0:
+                logger.warning("No %s districts in state %s.", chamber, state)
+                continue
+            jobs.append((chamber, state_districts.reset_index(drop=True), paths))
+        return jobs
+
+    failures = []
+    with ProcessPoolExecutor(max_workers=_resolve_n_jobs(n_jobs)) as pool:
+        running = {}
+        pending = {}
+
+        def submit_chambers(state, voter_path):
+            for chamber, districts, paths in pending.pop(state):
+                future = pool.submit(
+                    _chamber_dislocation, voter_path, districts, *paths, options
+                )
+                running[future] = (state, chamber)
+
+        for state in states:
+            voter_path = os.path.join(output, VOTER_DIR, state)
+            state_seed = _state_seed(random_seed, state)
+            parameters = _voter_parameters(state_seed, crs, options)
+
+            # Outputs made from voters with other parameters are stale.
+            current = resume and _saved_parameters(voter_path) == parameters
+            if resume and not current and _is_complete(voter_path):
+                logger.info("State %s was run with other parameters; redoing.", state)
+
+            pending[state] = chamber_jobs(state, skip_complete=current)
+            if not pending[state]:
+                logger.info("State %s already complete.", state)
+                continue
+
+            if current:
+                submit_chambers(state, voter_path)
+                continue
+
+            state_precincts = precincts[precincts[state_column] == state]
+            future = pool.submit(
+                _state_voters,
+                state_precincts.reset_index(drop=True),
+                voter_path,
+                state_seed,
+                parameters,
+                options,
+            )
+            running[future] = (state, None)
+
+        # Chamber jobs of a state start as soon as its voters are saved.
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                state, chamber = running.pop(future)
+                step = "voters" if chamber is None else chamber
+                try:
+                    result = future.result()
+                except Exception as error:
+                    logger.error("State %s, %s failed: %r", state, step, error)
+                    failures.append((state, step, error))
+                    continue
+
+                logger.info("State %s, %s done.", state, step)
+                if chamber is None:
+                    submit_chambers(state, result)
+
+    return failures
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m partisan_dislocation",
+        description=(
+            "Compute partisan dislocation for every state and set of "
+            "districts (chamber) in a precinct file and district files."
+        ),
+    )
+    parser.add_argument("precincts", help="Precinct file with vote counts.")
+    parser.add_argument(
+        "districts",
+        nargs="+",
+        help="District files as NAME=PATH (e.g. USCongress=cd114.shp) or PATH.",
+    )
+    parser.add_argument("-o", "--output", required=True, help="Output directory.")
+    parser.add_argument("-k", type=int, required=True, help="Num nearest neighbors.")
+    parser.add_argument("-p", type=float, default=0.01, help="Sampling parameter.")
+    parser.add_argument("--dem", default="dem", help="Democratic vote column.")
+    parser.add_argument("--rep", default="rep", help="Republican vote column.")
+    parser.add_argument(
+        "--swing", type=float, default=0, help="Uniform swing to dems, as a share."
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Random seed.")
+    parser.add_argument(
+        "--state-column", default="STATE", help="State column of the precinct file."
+    )
+    parser.add_argument(
+        "--district-state-column",
+        default=None,
+        help="State column of the district files (default: --state-column).",
+    )
+    parser.add_argument(
+        "--states", nargs="+", default=None, help="States to run (default: all)."
+    )
+    parser.add_argument(
+        "--crs", default="esri:102010", help="Projected CRS for computations."
+    )
+    parser.add_argument(
+        "--format",
+        choices=["npy", "parquet"],
+        default="npy",
+        help="Voter-level output format.",
+    )
+    parser.add_argument(
+        "--resume", action="store_true", help="Skip outputs that already exist."
+    )
+    parser.add_argument(
+        "-j", "--n-jobs", type=int, default=1, help="Processes (-1 for all cores)."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Threads per kNN tree query."
+    )
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only log errors.")
+    return parser
+
+
+def main(argv=None):
+    "Entry point of ``python -m partisan_dislocation``. Returns an exit code."
+    args = _parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.ERROR if args.quiet else logging.INFO,
+        format="%(asctime)s %(message)s",
+    )
+
+    failures = run(
+        args.precincts,
+        _parse_districts(args.districts),
+        args.output,
+        k=args.k,
+        p=args.p,
+        dem_vote_count=args.dem,
+        repub_vote_count=args.rep,
+        uniform_swing_to_dems=args.swing,
+        random_seed=args.seed,
+        state_column=args.state_column,
+        district_state_column=args.district_state_column,
+        states=args.states,
+        crs=args.crs,
+        output_format=args.format,
+        resume=args.resume,
+        n_jobs=args.n_jobs,
+        workers=args.workers,
+    )
+    if failures:
+        print(f"{len(failures)} job(s) failed; rerun with --resume.", file=sys.stderr)
+        return 1
+    return 0
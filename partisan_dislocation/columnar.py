@@ -0,0 +1,224 @@
+"""GeoParquet / Arrow reading and writing of precincts and voter points."""
+
+import json
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pyarrow = None
+
+from .voter_points import VoterPoints
+
+# Key of the schema metadata entry holding the CRS of x/y voter files.
+_METADATA_KEY = b"partisan_dislocation"
+
+_PARQUET_SUFFIXES = (".parquet", ".geoparquet", ".pq")
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise ImportError("Reading and writing parquet files requires pyarrow.")
+
+
+def _is_parquet(path):
+    return str(path).lower().endswith(_PARQUET_SUFFIXES)
+
+
+def _as_column_type(path, column, values):
+    "Casts filter values to the type of a parquet column, e.g. '37' to 37"
+    _require_pyarrow()
+    field = pq.read_schema(path).field(column)
+    return pyarrow.array(values).cast(field.type).to_pylist()
+
+
+def read_precincts(path, bbox=None, columns=None, crs=None, **kwargs):
+    """
+    Reads precincts (or districts) from a GeoParquet file or any file
+    :func:`geopandas.read_file` supports.
+
+    For GeoParquet written by :func:`write_precincts`, `bbox` only reads
+    the row groups whose stored bounding boxes intersect it, so one state
+    can be read without scanning a national file. Keyword arguments are
+    passed on to :func:`geopandas.read_parquet` (e.g. pyarrow `filters`
+    such as ``[("STATE", "==", "37")]``, which also skip row groups) or
+    :func:`geopandas.read_file` (e.g. `where`).
+
+    :param path: File path. Files ending in `.parquet` are read as GeoParquet.
+    :param bbox: (default=None)
+          (minx, miny, maxx, maxy) in the file's CRS. Only rows
+          intersecting it are returned.
+    :param columns: (default=None)
+          Columns to read, besides geometry. Defaults to all.
+    :param crs: (default=None)
+          If given, the result is projected to this CRS.
+    """
+    if _is_parquet(path):
+        _require_pyarrow()
+        if columns is not None:
+            columns = [*columns, "geometry"]
+        precincts = gpd.read_parquet(path, columns=columns, bbox=bbox, **kwargs)
+    else:
+        precincts = gpd.read_file(path, bbox=bbox, columns=columns, **kwargs)
+
+    if crs is not None:
+        precincts = precincts.to_crs(crs)
+    return precincts
+
+
+def write_precincts(precincts, path, sort_by=None, row_group_size=10_000):
+    """
+    Writes precincts (or districts) to GeoParquet laid out for fast
+    filtered reads.
+
+    Rows are sorted by `sort_by` (e.g. a state column), then along a
+    Hilbert curve, so each row group covers a compact area, and every
+    row gets a bounding box column whose per-row-group statistics let
+    :func:`read_precincts` skip row groups outside a `bbox`.
+
+    :param precincts: :class:`geopandas.GeoDataFrame`
+    :param path: Output file path.
+    :param sort_by: (default=None)
+          Column (or list of columns) to group rows by before sorting
+          spatially.
+    :param row_group_size: (default=10_000)
+          Rows per parquet row group.
+    """
+    _require_pyarrow()
+
+    keys = {"_hilbert": precincts.geometry.hilbert_distance()}
+    if sort_by is not None:
+        sort_by = [sort_by] if isinstance(sort_by, str) else list(sort_by)
+        keys = {**{name: precincts[name] for name in sort_by}, **keys}
+    order = (
+        pd.DataFrame({name: np.asarray(values) for name, values in keys.items()})
+        .sort_values(list(keys), kind="stable")
+        .index
+    )
+
+    precincts.iloc[order].to_parquet(
+        path, index=False, write_covering_bbox=True, row_group_size=row_group_size
+    )
+
+
+def write_voter_points(voter_points, path, geometry="xy", row_group_size=1_000_000):
+    """
+    Writes voter points (e.g. the output of :func:`calculate_dislocation`)
+    to a parquet file.
+
+    With `geometry="xy"` coordinates are stored as plain float64 `x` and
+    `y` columns instead of WKB points, which is much faster to write and
+    read and compresses better; the CRS goes into the file metadata. With
+    `geometry="wkb"` a GeoParquet file readable by any GeoParquet tool is
+    written.
+
+    :param voter_points: :class:`VoterPoints` or :class:`geopandas.GeoDataFrame`
+    :param path: Output file path.
+    :param geometry: (default="xy")
+          "xy" or "wkb".
+    :param row_group_size: (default=1_000_000)
+          Rows per parquet row group.
+    """
+    _require_pyarrow()
+    if geometry not in ("xy", "wkb"):
+        raise ValueError('geometry must be "xy" or "wkb".')
+
+    if not isinstance(voter_points, VoterPoints):
+        voter_points = VoterPoints.from_geodataframe(voter_points)
+
+    if geometry == "wkb":
+        voter_points.to_geodataframe(precinct_column="precinct").to_parquet(
+            path, index=False, write_covering_bbox=True, row_group_size=row_group_size
+        )
+        return
+
+    crs = voter_points.crs
+    metadata = {"crs": crs.to_wkt() if hasattr(crs, "to_wkt") else crs}
+    table = pyarrow.table(
+        {
+            "x": voter_points.x,
+            "y": voter_points.y,
+            "dem": voter_points.dem,
+            "precinct": voter_points.precinct,
+            **{
+                name: np.asarray(values)
+                for name, values in voter_points.columns.items()
+            },
+        },
+        metadata={_METADATA_KEY: json.dumps(metadata)},
+    )
+    pq.write_table(table, path, row_group_size=row_group_size)
+
+
+def read_voter_points(path, bbox=None, columns=None):
+    """
+    Reads voter points written by :func:`write_voter_points` (either
+    geometry encoding) as :class:`VoterPoints`.
+
+    :param path: File path.
+    :param bbox: (default=None)
+          (minx, miny, maxx, maxy). Only voters inside it are read; row
+          groups whose x/y range lies outside it are skipped.
+    :param columns: (default=None)
+          Additional columns to read. Defaults to all.
+    """
+    _require_pyarrow()
+
+    schema = pq.read_schema(path)
+    metadata = schema.metadata or {}
+
+    if b"geo" in metadata:
+        data = gpd.read_parquet(
+            path,
+            columns=(
+                None if columns is None else ["dem", "precinct", "geometry", *columns]
+            ),
+            bbox=bbox,
+        )
+        if bbox is not None:
+            inside = data.geometry.x.between(
+                bbox[0], bbox[2]
+            ) & data.geometry.y.between(bbox[1], bbox[3])
+            data = data[inside]
+        geometry = data.geometry
+        return VoterPoints(
+            geometry.x.to_numpy(),
+            geometry.y.to_numpy(),
+            data["dem"].to_numpy(),
+            precinct=data["precinct"].to_numpy() if "precinct" in data else None,
+            crs=data.crs,
+            columns={
+                name: data[name].to_numpy()
+                for name in data.columns
+                if name not in ("dem", "precinct", geometry.name)
+            },
+        )
+
+    filters = None
+    if bbox is not None:
+        min_x, min_y, max_x, max_y = bbox
+        filters = [
+            ("x", ">=", min_x),
+            ("x", "<=", max_x),
+            ("y", ">=", min_y),
+            ("y", "<=", max_y),
+        ]
+    if columns is not None:
+        columns = ["x", "y", "dem", "precinct", *columns]
+
+    table = pq.read_table(path, columns=columns, filters=filters)
+    arrays = {name: table[name].to_numpy() for name in table.column_names}
+    crs = json.loads(metadata.get(_METADATA_KEY, b"{}")).get("crs")
+
+    return VoterPoints(
+        arrays.pop("x"),
+        arrays.pop("y"),
+        arrays.pop("dem"),
+        precinct=arrays.pop("precinct", None),
+        crs=crs,
+        columns=arrays,
+    )
@@ -0,0 +1,252 @@
+"""Scoring many districting plans against one set of voter points."""
+
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .partisan_dislocation import _assign_points, _group_means, _resolve_n_jobs
+from .voter_points import VoterPoints
+
+# Upper bound on (plans x voters) entries materialized at once when
+# scoring assignment vectors.
+_MAX_BLOCK_ENTRIES = 20_000_000
+
+# Voter points and column names used by plan-scoring worker processes.
+_worker_state = None
+
+
+def _summarize(dislocation, assigned):
+    "Summary statistics of per-voter dislocation, one row per plan"
+    n_assigned = assigned.sum(axis=-1)
+    dislocation = np.where(assigned, dislocation, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "mean_dislocation": dislocation.sum(axis=-1) / n_assigned,
+            "mean_abs_dislocation": np.abs(dislocation).sum(axis=-1) / n_assigned,
+            "rms_dislocation": np.sqrt((dislocation**2).sum(axis=-1) / n_assigned),
+            "n_unassigned": assigned.shape[-1] - n_assigned,
+        }
+
+
+def _score_assignment_block(codes, n_districts, precinct, dem, knn):
+    """
+    Scores a block of plans given as (n_plans, n_precincts) arrays of
+    district codes in range(n_districts[i]).
+
+    Plans are offset into one shared range of district ids so every
+    plan's district shares come out of a single bincount.
+    """
+    offsets = np.concatenate([[0], np.cumsum(n_districts)[:-1]])
+    voter_codes = codes[:, precinct] + offsets[:, np.newaxis]
+
+    flat = voter_codes.ravel()
+    total = int(np.sum(n_districts))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        shares = np.bincount(
+            flat, weights=np.tile(dem, len(codes)), minlength=total
+        ) / np.bincount(flat, minlength=total)
+
+    dislocation = shares[voter_codes] - knn
+    return _summarize(dislocation, np.ones_like(dislocation, dtype=bool))
+
+
+def _init_worker(path, columns):
+    "Memory-maps the saved voter points once per worker process"
+    global _worker_state
+    _worker_state = (VoterPoints.load(path), columns)
+
+
+def _score_in_worker(plans):
+    voter_points, columns = _worker_state
+    return _score_plans(voter_points, plans, **columns)
+
+
+def _concatenate(results):
+    "Joins dicts of per-plan statistics from consecutive chunks of plans"
+    return {name: np.concatenate([r[name] for r in results]) for name in results[0]}
+
+
+def _score_in_pool(path, plans, columns, n_jobs):
+    "Scores chunks of plans in worker processes sharing the saved voters"
+    bounds = np.linspace(0, len(plans), min(4 * n_jobs, len(plans)) + 1).astype(int)
+    chunks = [plans[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    with ProcessPoolExecutor(
+        max_workers=n_jobs, initializer=_init_worker, initargs=(path, columns)
+    ) as pool:
+        return _concatenate(list(pool.map(_score_in_worker, chunks)))
+
+
+def score_plans(
+    voter_points,
+    plans,
+    knn_column="knn_shr_dem",
+    dem_column="dem",
+    precinct_column="precinct",
+    n_jobs=1,
+):
+    """
+    Summary dislocation statistics for many districting plans evaluated
+    against the same voter points.
+
+    Everything that does not change between plans (coordinates, kNN
+    scores, the spatial sort used for point-in-polygon tests) is computed
+    once. Plans given as precinct assignments need no geometry at all and
+    are scored in vectorized blocks.
+
+    Returns a :class:`pandas.DataFrame` with one row per plan and columns
+    `mean_dislocation`, `mean_abs_dislocation`, `rms_dislocation` and
+    `n_unassigned` (voters outside every district, which are excluded
+    from the statistics).
+
+    :param voter_points: :class:`geopandas.GeoDataFrame` or :class:`VoterPoints`.
+          Voter points with kNN scores, e.g. from :func:`calculate_voter_knn`,
+          or the path of a directory written by :meth:`VoterPoints.save`.
+    :param plans: Either a list of :class:`geopandas.GeoDataFrame` of
+          district polygons, or a 2-D array-like with one row per plan
+          giving the district of each precinct, in the order of the
+          precinct GeoDataFrame the voter points were generated from.
+    :param knn_column: (default="knn_shr_dem")
+          Column of `voter_points` with kNN scores
+    :param dem_column: (default="dem")
+          Column with voter attribute to be averaged (usually "dem").
+    :param precinct_column: (default="precinct")
+          Column with each voter's precinct position, for GeoDataFrame
+          voter points scored against precinct assignments.
+    :param n_jobs: (default=1)
+          Number of processes scoring plans. Workers memory-map the voter
+          points from disk instead of receiving a copy; voter points not
+          given as a path are saved to a temporary directory first.
+          -1 uses all cores.
+    """
+
+    import pandas as pd
+
+    if isinstance(voter_points, (str, os.PathLike)):
+        path = voter_points
+        voter_points = VoterPoints.load(path)
+    else:
+        path = None
+
+    n_jobs = min(_resolve_n_jobs(n_jobs), len(plans))
+    if n_jobs > 1:
+        if hasattr(plans[0], "geometry"):
+            plans = list(plans)
+        else:
+            plans = np.asarray(plans)
+
+        if path is not None:
+            columns = dict(
+                knn_column=knn_column,
+                dem_column=dem_column,
+                precinct_column=precinct_column,
+            )
+            return pd.DataFrame(_score_in_pool(path, plans, columns, n_jobs))
+
+        # Save just the arrays the workers need.
+        if isinstance(voter_points, VoterPoints):
+            xs, ys = voter_points.x, voter_points.y
+        else:
+            xs = voter_points.geometry.x.to_numpy()
+            ys = voter_points.geometry.y.to_numpy()
+        precinct = (
+            voter_points[precinct_column] if precinct_column in voter_points else None
+        )
+        compact = VoterPoints(
+            xs,
+            ys,
+            np.zeros(len(xs), dtype="int8"),
+            precinct=precinct,
+            crs=voter_points.crs,
+            columns={
+                "dem_values": np.asarray(voter_points[dem_column], dtype="float64"),
+                "knn_values": np.asarray(voter_points[knn_column], dtype="float64"),
+            },
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            compact.save(tmp)
+            return pd.DataFrame(
+                _score_in_pool(
+                    tmp,
+                    plans,
+                    dict(knn_column="knn_values", dem_column="dem_values"),
+                    n_jobs,
+                )
+            )
+
+    return pd.DataFrame(
+        _score_plans(voter_points, plans, knn_column, dem_column, precinct_column)
+    )
+
+
+def _score_plans(
+    voter_points,
+    plans,
+    knn_column="knn_shr_dem",
+    dem_column="dem",
+    precinct_column="precinct",
+):
+    """
+    Body of :func:`score_plans` for one process. Returns a dict of
+    per-plan statistics, so worker processes never need pandas.
+    """
+    dem = np.asarray(voter_points[dem_column], dtype="float64")
+    knn = np.asarray(voter_points[knn_column], dtype="float64")
+
+    if isinstance(voter_points, VoterPoints):
+        xs, ys = voter_points.x, voter_points.y
+    else:
+        xs = voter_points.geometry.x.to_numpy()
+        ys = voter_points.geometry.y.to_numpy()
+
+    # District polygons
+    if len(plans) > 0 and hasattr(plans[0], "geometry"):
+        order = np.argsort(xs, kind="stable")
+        rows = []
+        for districts in plans:
+            districts = districts.to_crs(voter_points.crs)
+            assignment = _assign_points(
+                xs, ys, districts.geometry.to_numpy(), order=order
+            )
+            assigned = assignment >= 0
+            shares = _group_means(assignment[assigned], dem[assigned], len(districts))
+            dislocation = np.where(assigned, shares[assignment], np.nan) - knn
+            rows.append(_summarize(dislocation, assigned))
+
+        return {name: np.array([row[name] for row in rows]) for name in rows[0]}
+
+    # Precinct assignment vectors
+    plans = np.asarray(plans)
+    if plans.ndim != 2:
+        raise ValueError(
+            "plans must be a list of district GeoDataFrames or a 2-D array "
+            "with one row of precinct assignments per plan."
+        )
+
+    precinct = np.asarray(voter_points[precinct_column])
+    if (precinct < 0).any() or (precinct >= plans.shape[1]).any():
+        raise ValueError(
+            "Voter precinct positions do not match the number of precincts in plans."
+        )
+
+    codes = np.empty(plans.shape, dtype="int64")
+    n_districts = np.empty(len(plans), dtype="int64")
+    for i, plan in enumerate(plans):
+        labels, codes[i] = np.unique(plan, return_inverse=True)
+        n_districts[i] = len(labels)
+
+    block = max(_MAX_BLOCK_ENTRIES // max(len(dem), 1), 1)
+    results = [
+        _score_assignment_block(
+            codes[start : start + block],
+            n_districts[start : start + block],
+            precinct,
+            dem,
+            knn,
+        )
+        for start in range(0, len(plans), block)
+    ]
+
+    return _concatenate(results)
@@ -0,0 +1,320 @@
+"""Dislocation results that can be updated after small edits."""
+
+import numpy as np
+import shapely
+from scipy.spatial import cKDTree
+
+from .partisan_dislocation import (
+    _assign_points,
+    _check_inputs,
+    _generate_points,
+    _group_means,
+    _knn_sums,
+    _party_indicator,
+    _precinct_point_counts,
+    _sample_precincts,
+    _seed_entropy,
+)
+from .voter_points import VoterPoints
+
+
+def _changed_counts_rng(entropy, position):
+    "Stream used to redraw the point counts of an edited precinct"
+    return np.random.default_rng(
+        np.random.SeedSequence(entropy, spawn_key=(2, int(position)))
+    )
+
+
+class IncrementalDislocation:
+    """
+    Voter points, kNN scores and district assignments that can be updated
+    in place when a few precincts or district boundaries change, without
+    rerunning the whole pipeline.
+
+    The constructor runs the full pipeline once. :meth:`update_precincts`
+    then regenerates points only in edited precincts and recomputes kNN
+    scores only for new voters and for voters whose stored distance to
+    their k-th neighbor reaches a removed or added point.
+    :meth:`update_districts` reassigns only voters that are in, or could
+    move into, an edited district. :meth:`voter_points` returns the
+    current result.
+
+    Points of unedited precincts never change. Edited precincts draw their
+    point counts from their own random stream, so after an update the
+    points are a valid draw for the edited inputs but not the same draw
+    a fresh run with the same seed would give.
+
+    :param precincts: :class:`geopandas.GeoDataFrame`
+          Polygon shapefile with vote totals.
+    :param districts: :class:`geopandas.GeoDataFrame`.
+          GeoDataFrame of electoral district polygons.
+    :param k: Num nearest neighbors to consider.
+    :param p: (default=0.01)
+          Sampling parameter passed to :func:`random_points_in_polygon`.
+    :param dem_vote_count: (default="dem")
+          Name of column with Democratic vote counts per precinct.
+    :param repub_vote_count: (default="rep")
+          Name of column with Republican vote counts per precinct.
+    :param uniform_swing_to_dems: (default=0)
+          Swing in expected vote share for dems.
+    :param random_seed: (default=None)
+          Seed passed to :class:`numpy.random.SeedSequence`.
+    :param district_id_col: (default=None)
+          Column with district identifier to include in voter data.
+    :param workers: (default=1)
+          Number of threads used to query the kNN tree.
+    :param chunk_size: (default=None)
+          Number of voters queried at a time. By default sized from k,
+          as in :func:`calculate_voter_knn`.
+    """
+
+    def __init__(
+        self,
+        precincts,
+        districts,
+        k,
+        p=0.01,
+        dem_vote_count="dem",
+        repub_vote_count="rep",
+        uniform_swing_to_dems=0,
+        random_seed=None,
+        district_id_col=None,
+        workers=1,
+        chunk_size=None,
+    ):
+        _check_inputs(precincts, uniform_swing_to_dems)
+
+        self.k = k
+        self.p = p
+        self.dem_vote_count = dem_vote_count
+        self.repub_vote_count = repub_vote_count
+        self.uniform_swing_to_dems = uniform_swing_to_dems
+        self.district_id_col = district_id_col
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.crs = precincts.crs
+        self._entropy = _seed_entropy(random_seed)
+
+        self.precincts = precincts.reset_index(drop=True)
+        self.districts = districts.to_crs(self.crs).reset_index(drop=True)
+
+        self.x, self.y, self.dem, self.precinct = _generate_points(
+            self.precincts.geometry.to_numpy(),
+            self.precincts[dem_vote_count].to_numpy(),
+            self.precincts[repub_vote_count].to_numpy(),
+            p,
+            uniform_swing_to_dems,
+            self._entropy,
+        )
+        self.knn_sums = np.empty(len(self.x))
+        self.knn_radius = np.empty(len(self.x))
+        self._update_knn(np.arange(len(self.x)))
+        self.assignment = _assign_points(
+            self.x, self.y, self.districts.geometry.to_numpy()
+        )
+
+        # Number of voters touched by the latest update, by step.
+        self.last_update = {}
+
+    def __repr__(self):
+        return (
+            f"<IncrementalDislocation: {len(self.x)} voters, "
+            f"{len(self.precincts)} precincts, {len(self.districts)} districts>"
+        )
+
+    def _update_knn(self, rows):
+        "Recomputes kNN sums and radii of the voters at rows"
+        if self.k >= len(self.x):
+            raise ValueError("k must be smaller than the number of voter points.")
+
+        tree = cKDTree(np.column_stack([self.x, self.y]))
+        self.knn_sums[rows], self.knn_radius[rows] = _knn_sums(
+            tree,
+            self.dem.astype("float64"),
+            self.k,
+            rows=rows,
+            workers=self.workers,
+            chunk_size=self.chunk_size,
+            return_distance=True,
+        )
+
+    def update_precincts(self, precincts, changed=None):
+        """
+        Replaces the precincts with an edited version and updates the
+        result. Returns self.
+
+        :param precincts: :class:`geopandas.GeoDataFrame`
+              All precincts, in the same order as before, with edited
+              geometries or vote counts.
+        :param changed: (default=None)
+              Positions of the edited precincts. By default, precincts
+              whose geometry or vote counts differ are detected.
+        """
+        precincts = precincts.to_crs(self.crs).reset_index(drop=True)
+        if len(precincts) != len(self.precincts):
+            raise ValueError("precincts must have the same rows as before.")
+
+        dem_votes = precincts[self.dem_vote_count].to_numpy()
+        rep_votes = precincts[self.repub_vote_count].to_numpy()
+        geometries = precincts.geometry.to_numpy()
+
+        if changed is None:
+            changed = np.flatnonzero(
+                ~shapely.equals_exact(
+                    geometries, self.precincts.geometry.to_numpy(), tolerance=0
+                )
+                | (dem_votes != self.precincts[self.dem_vote_count].to_numpy())
+                | (rep_votes != self.precincts[self.repub_vote_count].to_numpy())
+            )
+        changed = np.unique(np.asarray(changed, dtype="int64"))
+        self.precincts = precincts
+
+        # New points for the edited precincts, dems ahead of repubs.
+        counts = np.array(
+            [
+                _precinct_point_counts(
+                    dem_votes[[position]],
+                    rep_votes[[position]],
+                    self.p,
+                    self.uniform_swing_to_dems,
+                    _changed_counts_rng(self._entropy, position),
+                )
+                for position in changed
+            ],
+            dtype="int64",
+        ).reshape(-1, 2)
+        points_per_precinct = counts.sum(axis=1)
+        has_points = points_per_precinct > 0
+        new_x, new_y, _ = _sample_precincts(
+            geometries[changed[has_points]],
+            changed[has_points],
+            points_per_precinct[has_points],
+            self._entropy,
+        )
+        new_dem = _party_indicator(counts[:, 0], counts[:, 1])
+        new_precinct = np.repeat(changed.astype("int32"), points_per_precinct)
+
+        removed = np.isin(self.precinct, changed)
+        moved_x = np.concatenate([self.x[removed], new_x])
+        moved_y = np.concatenate([self.y[removed], new_y])
+
+        # Keep voters laid out precinct by precinct.
+        kept = ~removed
+        precinct = np.concatenate([self.precinct[kept], new_precinct])
+        order = np.argsort(precinct, kind="stable")
+        is_new = np.concatenate(
+            [np.zeros(kept.sum(), dtype=bool), np.ones(len(new_x), dtype=bool)]
+        )[order]
+
+        def merge(values, new_values):
+            return np.concatenate([values[kept], new_values])[order]
+
+        self.x = merge(self.x, new_x)
+        self.y = merge(self.y, new_y)
+        self.dem = merge(self.dem, new_dem)
+        self.precinct = precinct[order]
+        self.knn_sums = merge(self.knn_sums, np.full(len(new_x), np.nan))
+        self.knn_radius = merge(self.knn_radius, np.full(len(new_x), np.nan))
+        self.assignment = merge(self.assignment, np.full(len(new_x), -1))
+
+        # Only voters whose k-th neighbor is at least as far away as the
+        # nearest removed or added point can have different neighbors.
+        stale = is_new.copy()
+        if len(moved_x) > 0 and (~is_new).any():
+            distance, _ = cKDTree(np.column_stack([moved_x, moved_y])).query(
+                np.column_stack([self.x[~is_new], self.y[~is_new]]),
+                distance_upper_bound=np.nanmax(self.knn_radius) * (1 + 1e-9),
+                workers=self.workers,
+            )
+            stale[~is_new] = distance <= self.knn_radius[~is_new]
+
+        self._update_knn(np.flatnonzero(stale))
+        self.assignment[is_new] = _assign_points(
+            self.x[is_new], self.y[is_new], self.districts.geometry.to_numpy()
+        )
+
+        self.last_update = {
+            "precincts": len(changed),
+            "points_regenerated": len(new_x),
+            "knn_recomputed": int(stale.sum()),
+            "reassigned": int(is_new.sum()),
+        }
+        return self
+
+    def update_districts(self, districts, changed=None):
+        """
+        Replaces the districts with an edited version and updates the
+        result. Returns self.
+
+        :param districts: :class:`geopandas.GeoDataFrame`
+              All districts, in the same order as before, with edited
+              geometries.
+        :param changed: (default=None)
+              Positions of the edited districts. By default, districts
+              whose geometry differs are detected.
+        """
+        districts = districts.to_crs(self.crs).reset_index(drop=True)
+        geometries = districts.geometry.to_numpy()
+
+        if len(districts) != len(self.districts):
+            changed = np.arange(len(districts))
+        elif changed is None:
+            changed = np.flatnonzero(
+                ~shapely.equals_exact(
+                    geometries, self.districts.geometry.to_numpy(), tolerance=0
+                )
+            )
+        changed = np.asarray(changed, dtype="int64")
+
+        # Voters that may change district: those in an edited district,
+        # those in no district, and those inside an edited district's
+        # new bounding box.
+        stale = np.isin(self.assignment, changed) | (self.assignment < 0)
+        for min_x, min_y, max_x, max_y in shapely.bounds(geometries[changed]):
+            stale |= (
+                (self.x >= min_x)
+                & (self.x <= max_x)
+                & (self.y >= min_y)
+                & (self.y <= max_y)
+            )
+
+        self.districts = districts
+        self.assignment[stale] = _assign_points(
+            self.x[stale], self.y[stale], geometries
+        )
+
+        self.last_update = {"districts": len(changed), "reassigned": int(stale.sum())}
+        return self
+
+    def voter_points(self):
+        """
+        Current result as :class:`VoterPoints` with the columns of
+        :func:`calculate_dislocation`, plus `knn_radius` (distance to each
+        voter's k-th neighbor). Voters outside every district are dropped.
+        """
+        assigned = self.assignment >= 0
+        assignment = self.assignment[assigned]
+        dem = self.dem[assigned].astype("float64")
+
+        district_share = _group_means(assignment, dem, len(self.districts))
+        knn_share = self.knn_sums[assigned] / self.k
+
+        columns = {
+            "knn_shr_dem": knn_share,
+            "knn_radius": self.knn_radius[assigned],
+            "district_dem_share": district_share[assignment],
+            "partisan_dislocation": district_share[assignment] - knn_share,
+        }
+        if self.district_id_col is not None:
+            columns[self.district_id_col] = self.districts[
+                self.district_id_col
+            ].to_numpy()[assignment]
+
+        return VoterPoints(
+            self.x[assigned],
+            self.y[assigned],
+            self.dem[assigned],
+            precinct=self.precinct[assigned],
+            crs=self.crs,
+            columns=columns,
+        )
@@ -1,36 +1,381 @@
 # import libraries
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-from scipy.spatial import cKDTree
-import geopandas as gpd
-import pandas as pd
-from shapely.geometry import Point
 
+# SciPy, shapely and pandas are imported inside the functions that use
+# them, so importing this module (as every worker process does) costs
+# only NumPy, and array-only work never loads geopandas or shapely.
+
+from .profiling import _active_report, _stage
+from .voter_points import VoterPoints
+
+# Upper bound on candidates drawn per batch in rejection sampling.
+_MAX_BATCH = 1_000_000
+
+
+def _make_random_points(number, polygon, rng):
+    """
+    Generates number of uniformly distributed points in polygon.
+
+    Candidates are drawn in batches sized by the ratio of the polygon's
+    area to its bounding box area and tested for containment in bulk,
+    topping up until the quota is met. Returns arrays of x and y
+    coordinates, and the number of candidates drawn and of those that
+    fell inside the polygon.
+    """
+    import shapely
+
+    xs = np.empty(number, dtype="float64")
+    ys = np.empty(number, dtype="float64")
+
+    if number == 0:
+        return xs, ys, 0, 0
+
+    if polygon.is_empty:
+        raise ValueError(
+            "Could not generate a random point in one of your precincts."
+            " Check for zero-area precincts or invalid geometries."
+        )
 
-def _make_random_points(number, polygon):
-    "Generates number of uniformly distributed points in polygon"
-    points = []
     min_x, min_y, max_x, max_y = polygon.bounds
+    bbox_area = (max_x - min_x) * (max_y - min_y)
+
+    # Expected share of candidates that land in the polygon. Invalid
+    # (e.g. self-intersecting) geometries can report zero area, in which
+    # case we just draw batches the size of the quota.
+    if bbox_area > 0 and polygon.area > 0:
+        acceptance = min(polygon.area / bbox_area, 1)
+    else:
+        acceptance = 1
+
+    shapely.prepare(polygon)
 
     i = 0
     attempt = 0
+    drawn = 0
+    accepted = 0
 
     while i < number:
-        point = Point(np.random.uniform(min_x, max_x), np.random.uniform(min_y, max_y))
+        # Oversample slightly so one batch usually fills the quota.
+        remaining = number - i
+        batch = min(int(np.ceil(remaining / acceptance * 1.1)) + 10, _MAX_BATCH)
+
+        cand_x = rng.uniform(min_x, max_x, batch)
+        cand_y = rng.uniform(min_y, max_y, batch)
+        drawn += batch
 
         # If its in polygon, keep. Otherwise we keep going.
-        if polygon.contains(point):
-            points.append(point)
-            i += 1
-            attempt = 0
+        inside = shapely.contains_xy(polygon, cand_x, cand_y)
+        hits = np.flatnonzero(inside)
+        accepted += len(hits)
+        hits = hits[:remaining]
+
+        xs[i : i + len(hits)] = cand_x[hits]
+        ys[i : i + len(hits)] = cand_y[hits]
+        i += len(hits)
 
-        # Count how many times we've tried for this point
-        attempt += 1
+        # Count how many candidates we've tried since the last hit
+        if len(hits) > 0:
+            attempt = 0
+        else:
+            attempt += batch
         if attempt > 10000:
             raise ValueError(
                 "Could not generate a random point in one of your precincts."
                 " Check for zero-area precincts or invalid geometries."
             )
-    return points
+    return xs, ys, drawn, accepted
+
+
+def _make_random_points_triangulated(number, polygon, rng, stratified=False):
+    """
+    Generates number of uniformly distributed points in polygon without
+    rejection.
+
+    The polygon is split into triangles by a constrained Delaunay
+    triangulation (which respects holes and multiple parts). Each point
+    picks a triangle with probability proportional to its area and a
+    uniform position inside it from two uniform draws. Every candidate is
+    used, so the cost per point does not depend on the polygon's shape.
+    With `stratified`, the i-th point picks its triangle from the i-th of
+    `number` equal slices of the total area, so even a few points spread
+    across the whole polygon. Returns the same values as
+    `_make_random_points`.
+    """
+    import shapely
+
+    xs = np.empty(number, dtype="float64")
+    ys = np.empty(number, dtype="float64")
+
+    if number == 0:
+        return xs, ys, 0, 0
+
+    if not hasattr(shapely, "constrained_delaunay_triangles"):
+        raise ImportError('method="triangulation" requires shapely >= 2.1.')
+
+    triangles = None
+    if not polygon.is_empty and polygon.area > 0:
+        try:
+            triangles = shapely.get_parts(
+                shapely.constrained_delaunay_triangles(polygon)
+            )
+        except shapely.errors.GEOSException:
+            pass
+
+    # Corner coordinates, shape (n_triangles, 3, 2)
+    corners = (
+        shapely.get_coordinates(triangles).reshape(-1, 4, 2)[:, :3]
+        if triangles is not None
+        else np.empty((0, 3, 2))
+    )
+    edge_1 = corners[:, 1] - corners[:, 0]
+    edge_2 = corners[:, 2] - corners[:, 0]
+    areas = np.abs(edge_1[:, 0] * edge_2[:, 1] - edge_1[:, 1] * edge_2[:, 0])
+
+    if len(areas) == 0 or areas.sum() == 0:
+        raise ValueError(
+            "Could not generate a random point in one of your precincts."
+            " Check for zero-area precincts or invalid geometries."
+        )
+
+    cumulative = np.cumsum(areas)
+    if stratified:
+        uniform = (np.arange(number) + rng.random(number)) / number
+    else:
+        uniform = rng.random(number)
+    chosen = np.searchsorted(cumulative, uniform * cumulative[-1])
+    chosen = np.minimum(chosen, len(areas) - 1)
+
+    # Uniform in the parallelogram, folded back into the triangle.
+    u, v = rng.random(number), rng.random(number)
+    outside = u + v > 1
+    u[outside], v[outside] = 1 - u[outside], 1 - v[outside]
+
+    points = (
+        corners[chosen, 0]
+        + u[:, np.newaxis] * edge_1[chosen]
+        + v[:, np.newaxis] * edge_2[chosen]
+    )
+    xs[:], ys[:] = points[:, 0], points[:, 1]
+    return xs, ys, number, number
+
+
+def _make_stratified_points(number, polygon, rng):
+    "Triangulation sampler with stratified triangle picks"
+    return _make_random_points_triangulated(number, polygon, rng, stratified=True)
+
+
+# Point placement functions by `method` of random_points_in_polygon (and
+# "stratified" for weighted_points_in_polygon)
+_SAMPLERS = {
+    "rejection": _make_random_points,
+    "triangulation": _make_random_points_triangulated,
+    "stratified": _make_stratified_points,
+}
+
+
+def _resolve_n_jobs(n_jobs):
+    "Turns an n_jobs argument (-1 for all cores) into a process count"
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(os.cpu_count() + 1 + n_jobs, 1)
+    return max(int(n_jobs), 1)
+
+
+def _seed_entropy(random_seed):
+    """
+    Root entropy for all random streams of one run.
+
+    Every precinct gets its own stream spawned from this entropy and its
+    position in the precinct frame, so results do not depend on how
+    precincts are split across processes and any subset of precincts can
+    be regenerated on its own.
+    """
+    return np.random.SeedSequence(random_seed).entropy
+
+
+def _counts_rng(entropy):
+    "Stream used to draw the number of points in each precinct"
+    return np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(0,)))
+
+
+def _precinct_rng(entropy, position):
+    "Stream used to place the points of the precinct at `position`"
+    return np.random.default_rng(
+        np.random.SeedSequence(entropy, spawn_key=(1, int(position)))
+    )
+
+
+def _precinct_point_counts(dem_votes, rep_votes, p, uniform_swing_to_dems, rng):
+    """
+    Draws the number of representative dem and repub voters in each
+    precinct from arrays of vote counts.
+    """
+    dem_votes = np.asarray(dem_votes).astype("int64")
+    rep_votes = np.asarray(rep_votes).astype("int64")
+    voters = dem_votes + rep_votes
+
+    swung_dem_share = np.full(len(voters), 0.5)
+    has_voters = voters != 0
+    swung_dem_share[has_voters] = (
+        dem_votes[has_voters] / voters[has_voters] + uniform_swing_to_dems
+    )
+
+    # Num votes from which to draw after swing
+    exact_dem = swung_dem_share * voters
+    dem_votes = exact_dem.astype("int64")
+    rep_votes = ((1 - swung_dem_share) * voters).astype("int64")
+
+    # Split integer residual probabilistically:
+    residual = voters - (dem_votes + rep_votes)
+    extra_dem = rng.binomial(residual, np.clip(exact_dem - dem_votes, 0, 1))
+    dem_votes = dem_votes + extra_dem
+    rep_votes = rep_votes + (residual - extra_dem)
+    assert (voters == dem_votes + rep_votes).all()
+
+    # Number of representative voters of each party per precinct
+    dem_points = rng.binomial(dem_votes, p)
+    rep_points = rng.binomial(rep_votes, p)
+
+    return dem_points, rep_points
+
+
+def _check_inputs(precincts, uniform_swing_to_dems):
+    "Raises ValueError for unprojected precincts or a swing not given as a share"
+    # Make sure projected!
+    if precincts.crs is None:
+        raise ValueError("Precincts must have a defined CRS")
+
+    # Check people don't get confused by uniform swing.
+    if uniform_swing_to_dems < -1 or uniform_swing_to_dems > 1:
+        raise ValueError("Uniform swing should be in SHARES and lie between -1 and 1.")
+
+
+def _party_indicator(dem_points, rep_points):
+    """
+    int8 party of each voter point, for points laid out precinct by
+    precinct with each precinct's dems ahead of its repubs.
+    """
+    return np.repeat(
+        np.tile(np.array([1, 0], dtype="int8"), len(dem_points)),
+        np.column_stack([dem_points, rep_points]).ravel(),
+    )
+
+
+def _sample_precincts(geometries, positions, counts, entropy, method="rejection"):
+    """
+    Places counts[j] points in geometries[j] for each j, using the stream
+    of the precinct at positions[j] and the sampler named by `method`.
+    Returns concatenated x and y arrays and an (n, 2) array of candidates
+    drawn and accepted per precinct.
+    """
+    sampler = _SAMPLERS[method]
+    total = int(np.sum(counts))
+    xs = np.empty(total, dtype="float64")
+    ys = np.empty(total, dtype="float64")
+    candidates = np.zeros((len(counts), 2), dtype="int64")
+
+    start = 0
+    for j, (geometry, position, count) in enumerate(zip(geometries, positions, counts)):
+        stop = start + count
+        xs[start:stop], ys[start:stop], drawn, accepted = sampler(
+            count, geometry, _precinct_rng(entropy, position)
+        )
+        candidates[j] = drawn, accepted
+        start = stop
+
+    return xs, ys, candidates
+
+
+def _shard(weights, n_shards):
+    """
+    Splits range(len(weights)) into at most n_shards contiguous blocks of
+    roughly equal total weight. Returns a list of (start, stop) pairs.
+    """
+    cumulative = np.cumsum(weights)
+    if len(cumulative) == 0 or cumulative[-1] == 0:
+        return [(0, len(weights))] if len(weights) else []
+
+    targets = cumulative[-1] * np.arange(1, n_shards) / n_shards
+    cuts = np.searchsorted(cumulative, targets, side="right")
+    bounds = np.unique(np.concatenate([[0], cuts, [len(weights)]]))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _generate_points(
+    geometries,
+    dem_votes,
+    rep_votes,
+    p,
+    uniform_swing_to_dems,
+    entropy,
+    n_jobs=1,
+    method="rejection",
+):
+    """
+    Core of random_points_in_polygon on plain arrays. Returns x, y, dem
+    and precinct position arrays for all voter points.
+    """
+    function = "random_points_in_polygon"
+
+    with _stage(function, "point_counts", rows=len(dem_votes)):
+        dem_points, rep_points = _precinct_point_counts(
+            dem_votes, rep_votes, p, uniform_swing_to_dems, _counts_rng(entropy)
+        )
+    points_per_precinct = dem_points + rep_points
+
+    # Preallocate output. Points are laid out precinct by precinct,
+    # with each precinct's dems ahead of its repubs.
+    offsets = np.concatenate([[0], np.cumsum(points_per_precinct)])
+    xs = np.empty(offsets[-1], dtype="float64")
+    ys = np.empty(offsets[-1], dtype="float64")
+    dem = _party_indicator(dem_points, rep_points)
+
+    positions = np.flatnonzero(points_per_precinct)
+    counts = points_per_precinct[positions]
+
+    n_jobs = _resolve_n_jobs(n_jobs)
+    candidates = np.zeros((len(counts), 2), dtype="int64")
+
+    with _stage(function, f"{method}_sampling", rows=len(xs)):
+        if n_jobs == 1:
+            xs[:], ys[:], candidates[:] = _sample_precincts(
+                geometries[positions], positions, counts, entropy, method
+            )
+        else:
+            # Shard precincts into contiguous blocks of similar point
+            # counts; each shard fills a contiguous slice of the output.
+            shards = _shard(counts, n_jobs * 4)
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                results = pool.map(
+                    _sample_precincts,
+                    [geometries[positions[a:b]] for a, b in shards],
+                    [positions[a:b] for a, b in shards],
+                    [counts[a:b] for a, b in shards],
+                    [entropy] * len(shards),
+                    [method] * len(shards),
+                )
+                for (a, b), (shard_xs, shard_ys, shard_candidates) in zip(
+                    shards, results
+                ):
+                    start = offsets[positions[a]]
+                    stop = offsets[positions[b - 1] + 1]
+                    xs[start:stop], ys[start:stop] = shard_xs, shard_ys
+                    candidates[a:b] = shard_candidates
+
+    report = _active_report.get()
+    if report is not None:
+        report._record_acceptance(len(geometries), positions, candidates)
+
+    precinct = np.repeat(
+        np.arange(len(points_per_precinct), dtype="int32"), points_per_precinct
+    )
+
+    return xs, ys, dem, precinct
 
 
 def random_points_in_polygon(
@@ -40,6 +385,10 @@ def random_points_in_polygon(
     repub_vote_count="rep",
     uniform_swing_to_dems=0,
     random_seed=None,
+    n_jobs=1,
+    as_voter_points=False,
+    precinct_id_col=None,
+    method="rejection",
 ):
     """
     :param precincts: :class:`geopandas.GeoDataFrame`
@@ -57,193 +406,872 @@ def random_points_in_polygon(
               A value of 0.05 would move a 45% dem 55%
               repub vote share to 50% / 50%.
     :param random_seed: (default=None)
-              Random state or seed passed to numpy.
+              Seed passed to :class:`numpy.random.SeedSequence`. Each
+              precinct draws from its own stream spawned from it.
+    :param n_jobs: (default=1)
+              Number of processes used to place points. -1 uses all
+              cores. Results do not depend on this setting.
+    :param as_voter_points: (default=False)
+              Return a :class:`VoterPoints` instead of a GeoDataFrame.
+              This skips building shapely geometries entirely and keeps
+              each voter's precinct of origin.
+    :param precinct_id_col: (default=None)
+              Column of `precincts` with a precinct identifier. If given,
+              each voter point gets a column of the same name with the
+              identifier of the precinct it was drawn in.
+    :param method: (default="rejection")
+              How points are placed within precincts. "rejection" draws
+              candidates in the bounding box and keeps those inside.
+              "triangulation" triangulates each precinct and samples
+              triangles by area, which is exactly uniform with no
+              rejected candidates and much faster for thin, concave or
+              multipart precincts (requires shapely >= 2.1). The two
+              methods give different points for the same seed.
 
     """
 
-    # Make sure projected!
-    if precincts.crs is None:
-        raise ValueError("Precincts must have a defined CRS")
+    _check_inputs(precincts, uniform_swing_to_dems)
 
-    # Set seed if passed.
-    if random_seed is not None:
-        np.random.seed(random_seed)
+    if method not in ("rejection", "triangulation"):
+        raise ValueError('method must be "rejection" or "triangulation".')
 
-    # Check people don't get confused by uniform swing.
-    if uniform_swing_to_dems < -1 or uniform_swing_to_dems > 1:
-        raise ValueError("Uniform swing should be in SHARES and lie between -1 and 1.")
+    precinct_points = _generate_points(
+        precincts.geometry.to_numpy(),
+        precincts[dem_vote_count].to_numpy(),
+        precincts[repub_vote_count].to_numpy(),
+        p,
+        uniform_swing_to_dems,
+        _seed_entropy(random_seed),
+        n_jobs,
+        method,
+    )
+    xs, ys, dem, precinct = precinct_points
 
-    # Make master dataframe
-    gf = gpd.GeoDataFrame(columns=["dem", "geometry"])
-
-    for index, row in precincts.iterrows():
-        # Get num seats for each
-        voters = int(row[dem_vote_count]) + int(row[repub_vote_count])
-        if voters != 0:
-            dem_share = int(row[dem_vote_count]) / voters
-            swung_dem_share = dem_share + uniform_swing_to_dems
-        if voters == 0:
-            swung_dem_share = 0.5
-
-        # Num votes from which to draw after swing
-        votes = {
-            dem_vote_count: int(swung_dem_share * voters),
-            repub_vote_count: int((1 - swung_dem_share) * voters),
-        }
+    columns = {}
+    if precinct_id_col is not None:
+        columns[precinct_id_col] = precincts[precinct_id_col].to_numpy()[precinct]
+
+    # Make sure using original CRS
+    voters = VoterPoints(
+        xs, ys, dem, precinct=precinct, crs=precincts.crs, columns=columns
+    )
+
+    if as_voter_points:
+        return voters
+    with _stage("random_points_in_polygon", "build_geodataframe", rows=len(voters)):
+        return voters.to_geodataframe()
+
+
+def weighted_points_in_polygon(
+    precincts,
+    p=0.01,
+    voters_per_point=10,
+    dem_vote_count="dem",
+    repub_vote_count="rep",
+    uniform_swing_to_dems=0,
+    random_seed=None,
+    as_voter_points=False,
+    precinct_id_col=None,
+    weight_column="weight",
+):
+    """
+    Represents each precinct by a few weighted points instead of one
+    point per sampled voter, so dense areas need far fewer points.
+
+    Each precinct with votes gets ceil(votes * p / voters_per_point)
+    points, placed by stratified sampling over a triangulation of the
+    precinct (see `method="triangulation"` of
+    :func:`random_points_in_polygon`) so they spread over its whole area.
+    With shapely < 2.1, which cannot triangulate polygons, points are
+    placed by rejection sampling instead. Every point carries a weight (the number of sampled voters it stands
+    for, votes * p / points, in `weight_column`) and a fractional `dem`
+    value, the precinct's Democratic share after swing. Point counts and
+    weights involve no randomness; only positions do.
+
+    Pass `weight_column` to :func:`calculate_voter_knn`,
+    :func:`calculate_dislocation` and :func:`aggregate_dislocation` to
+    use the weights. With the same `p`, `k` then means the same number of
+    sampled voters as with :func:`random_points_in_polygon`.
+
+    :param precincts: :class:`geopandas.GeoDataFrame`
+                      This is a polygon shapefile with vote totals.
+    :param p: (default=0.01)
+              Sampling parameter, as in :func:`random_points_in_polygon`.
+    :param voters_per_point: (default=10)
+              Number of sampled voters each point stands for, at most.
+    :param dem_vote_count: (default="dem")
+              Name of column with Democratic vote counts per precinct.
+    :param repub_vote_count: (default="rep")
+              Name of column with Republican vote counts per precinct.
+    :param uniform_swing_to_dems: (default=0)
+              Swing in expected vote share for dems.
+    :param random_seed: (default=None)
+              Seed passed to :class:`numpy.random.SeedSequence`.
+    :param as_voter_points: (default=False)
+              Return a :class:`VoterPoints` instead of a GeoDataFrame.
+    :param precinct_id_col: (default=None)
+              Column of `precincts` with a precinct identifier to copy to
+              each point.
+    :param weight_column: (default="weight")
+              Name of the output column holding point weights.
+    """
+
+    _check_inputs(precincts, uniform_swing_to_dems)
+
+    if voters_per_point <= 0:
+        raise ValueError("voters_per_point must be positive.")
 
-        # Split integer residual probabilistically:
-        residual_dem = (votes[dem_vote_count] + votes[repub_vote_count]) - voters
-        if residual_dem != 0:
-            dem_prob = votes[dem_vote_count] - int(votes[dem_vote_count])
-            extra_dem = np.random.binomial(1, dem_prob)
-            if extra_dem == 1:
-                votes[dem_vote_count] = votes[dem_vote_count] + 1
-            if extra_dem == 0:
-                votes[repub_vote_count] = votes[repub_vote_count] + 1
-        assert voters == votes[repub_vote_count] + votes[dem_vote_count]
-
-        # Start adding seats
-        for party in [dem_vote_count, repub_vote_count]:
-            points_to_add = np.random.binomial(votes[party], p)
-            points = _make_random_points(points_to_add, row.geometry)
-
-            new_points = gpd.GeoDataFrame(
-                columns=["dem", "geometry"], dtype="object", index=range(points_to_add)
+    import shapely
+
+    function = "weighted_points_in_polygon"
+    if hasattr(shapely, "constrained_delaunay_triangles"):
+        method = "stratified"
+    else:
+        method = "rejection"
+
+    dem_votes = np.asarray(precincts[dem_vote_count], dtype="float64")
+    votes = dem_votes + np.asarray(precincts[repub_vote_count], dtype="float64")
+
+    with _stage(function, "point_counts", rows=len(votes)):
+        has_voters = votes > 0
+        dem_share = np.full(len(votes), 0.5)
+        dem_share[has_voters] = np.clip(
+            dem_votes[has_voters] / votes[has_voters] + uniform_swing_to_dems, 0, 1
+        )
+
+        represented = votes * p
+        points_per_precinct = np.where(
+            has_voters, np.ceil(represented / voters_per_point), 0
+        ).astype("int64")
+        positions = np.flatnonzero(points_per_precinct)
+        counts = points_per_precinct[positions]
+
+    with _stage(function, f"{method}_sampling", rows=int(counts.sum())):
+        xs, ys, _ = _sample_precincts(
+            precincts.geometry.to_numpy()[positions],
+            positions,
+            counts,
+            _seed_entropy(random_seed),
+            method,
+        )
+
+    precinct = np.repeat(positions.astype("int32"), counts)
+    columns = {weight_column: np.repeat(represented[positions] / counts, counts)}
+    if precinct_id_col is not None:
+        columns[precinct_id_col] = precincts[precinct_id_col].to_numpy()[precinct]
+
+    voters = VoterPoints(
+        xs,
+        ys,
+        dem_share[precinct],
+        precinct=precinct,
+        crs=precincts.crs,
+        columns=columns,
+    )
+
+    if as_voter_points:
+        return voters
+    with _stage(function, "build_geodataframe", rows=len(voters)):
+        return voters.to_geodataframe()
+
+
+def _drop_self(ii, self_index):
+    """
+    Removes each point from its own neighbor list.
+
+    Takes the (n, k+1) index matrix returned by `cKDTree.query` for the
+    tree rows in `self_index` and returns the (n, k) matrix of true
+    neighbors, in order of distance. Self is usually in column 0, but with
+    exact duplicate coordinates it can land anywhere or fall off the list
+    entirely; in the latter case all k+1 neighbors are at distance zero,
+    so dropping the last one is equivalent.
+    """
+    n, k_plus_one = ii.shape
+    keep = ii != np.asarray(self_index)[:, np.newaxis]
+
+    missing_self = keep.all(axis=1)
+    keep[missing_self, -1] = False
+
+    # Each row now has exactly k True entries, so boolean indexing
+    # (which walks rows in order) reshapes cleanly.
+    return ii[keep].reshape(n, k_plus_one - 1)
+
+
+# Upper bound on (voters x neighbors) entries of the distance and index
+# arrays returned by one kNN query.
+_MAX_QUERY_ENTRIES = 10_000_000
+
+
+def _query_rows(n_neighbors, chunk_size=None):
+    "Rows per kNN query: chunk_size if given, else as many as fit the budget"
+    if chunk_size is None:
+        chunk_size = _MAX_QUERY_ENTRIES // (n_neighbors + 1)
+    return max(int(chunk_size), 1)
+
+
+def _knn_sums(
+    tree, values, k, rows=None, workers=1, chunk_size=None, return_distance=False
+):
+    """
+    Sums `values` over the k nearest neighbors (excluding self) of the
+    points at `rows` of the tree's data (default all of them).
+
+    `k` may also be a list of neighborhood sizes. The tree is then queried
+    once at the largest k and the sums for every k are read off a
+    cumulative sum over the distance-sorted neighbors, returned as an
+    (n, len(k)) array.
+
+    Queries run in blocks of `chunk_size` rows (by default as many as
+    keep the (chunk, k+1) distance and index arrays within
+    `_MAX_QUERY_ENTRIES` entries). Each row's result
+    depends only on that row's query, so the output is identical for any
+    chunk size or worker count. With `return_distance`, also returns the
+    distance to each point's k-th (largest k-th) neighbor.
+    """
+    ks = np.atleast_1d(k).astype("int64")
+    max_k = int(ks.max())
+
+    if rows is None:
+        rows = np.arange(tree.n)
+    n = len(rows)
+    chunk_size = _query_rows(max_k, chunk_size)
+
+    sums = np.empty((n, len(ks)), dtype="float64")
+    kth_distance = np.empty(n, dtype="float64")
+
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        block = rows[start:stop]
+
+        # Note this will pull the point itself, which we don't want.
+        # So do k+1, then remove "self" later.
+        dd, ii = tree.query(tree.data[block], k=max_k + 1, workers=workers)
+
+        # Self is at distance zero, so the last column is always the
+        # distance to the k-th true neighbor.
+        kth_distance[start:stop] = dd[:, -1]
+        del dd
+
+        neighbors = _drop_self(ii, block)
+        if len(ks) == 1:
+            sums[start:stop, 0] = values[neighbors].sum(axis=1)
+        else:
+            cumulative = np.cumsum(values[neighbors], axis=1)
+            sums[start:stop] = cumulative[:, ks - 1]
+
+    if np.ndim(k) == 0:
+        sums = sums[:, 0]
+
+    if return_distance:
+        return sums, kth_distance
+    return sums
+
+
+def _weighted_knn_sums(tree, values, weights, k, workers=1, chunk_size=None):
+    """
+    Weighted counterpart of `_knn_sums` for points standing for `weights`
+    voters each, with `values` the share of each point's voters to sum.
+
+    Neighbors (excluding self) are taken in order of distance until their
+    weights add up to k; the last one counts only for the part of its
+    weight still needed. The tree is first queried for enough neighbors
+    to reach k at the median weight, and rows that fall short are queried
+    again with twice as many until they reach k or run out of points
+    (in which case the share over all points is used). `k` may be a list,
+    as in `_knn_sums`.
+    """
+    ks = np.atleast_1d(k).astype("float64")
+    max_k = ks.max()
+    weights = np.asarray(weights, dtype="float64")
+    weighted_values = values * weights
+
+    if (weights <= 0).any():
+        raise ValueError("Weights must be positive.")
+
+    n = tree.n
+    rows = np.arange(n)
+    first_query = min(int(np.ceil(2 * max_k / np.median(weights))), n - 1)
+    chunk_size = _query_rows(first_query, chunk_size)
+
+    sums = np.empty((n, len(ks)), dtype="float64")
+    for start in range(0, n, chunk_size):
+        pending = rows[start : start + chunk_size]
+        n_neighbors = first_query
+        while len(pending):
+            _, ii = tree.query(tree.data[pending], k=n_neighbors + 1, workers=workers)
+            neighbors = _drop_self(ii, pending)
+            del ii
+
+            reached = np.cumsum(weights[neighbors], axis=1)
+            short = reached[:, -1] < max_k
+            done = ~short | (n_neighbors == n - 1)
+
+            block = neighbors[done]
+            cumulative = reached[done]
+            totals = np.cumsum(weighted_values[block], axis=1)
+            for i, size in enumerate(ks):
+                # Neighbors fully inside the target, then part of the next.
+                full = (cumulative < size).sum(axis=1)
+                last = np.minimum(full, cumulative.shape[1] - 1)
+                row = np.arange(len(block))
+                weight_before = np.where(full > 0, cumulative[row, full - 1], 0)
+                value_before = np.where(full > 0, totals[row, full - 1], 0)
+                partial = (
+                    np.clip(size - weight_before, 0, None) * values[block[row, last]]
+                )
+                sums[pending[done], i] = np.where(
+                    full < cumulative.shape[1],
+                    value_before + partial,
+                    # All points together weigh less than the target.
+                    totals[:, -1] * size / cumulative[:, -1],
+                )
+
+            pending = pending[~done]
+            n_neighbors = min(2 * n_neighbors, n - 1)
+
+    if np.ndim(k) == 0:
+        sums = sums[:, 0]
+    return sums
+
+
+# Target relative error |m - k| / max(m, k) of the grid kNN approximation
+# (at least one voter off), and the most counts spent per voter reaching it.
+_GRID_TOLERANCE = 0.01
+_GRID_MAX_COUNTS = 10
+
+
+def _grid_radii(coords, k):
+    """
+    Estimates for each point the radius of the disk holding it and about
+    k other points, from voter counts on a regular grid.
+
+    The grid has about k / 4 points per cell on average. For each
+    occupied cell, the smallest square window of cells around it holding
+    k + 1 points is found by bisection on a summed-area table, and the
+    radius follows from the density inside that window.
+    """
+    n = len(coords)
+    mins = coords.min(axis=0)
+    spans = coords.max(axis=0) - mins
+
+    cell = np.sqrt(spans[0] * spans[1] * (k + 1) / (4 * n))
+    if not cell > 0:
+        # Points on a line or all at one spot.
+        cell = max(spans.max() * (k + 1) / n, 1.0)
+
+    shape = (spans // cell).astype("int64") + 1
+    cells = ((coords - mins) // cell).astype("int64")
+    flat = np.ravel_multi_index((cells[:, 0], cells[:, 1]), shape)
+    occupied, inverse = np.unique(flat, return_inverse=True)
+    ci, cj = np.unravel_index(occupied, shape)
+
+    table = np.zeros((shape[0] + 1, shape[1] + 1), dtype="int64")
+    table[1:, 1:] = np.bincount(flat, minlength=shape[0] * shape[1]).reshape(shape)
+    table = table.cumsum(axis=0).cumsum(axis=1)
+
+    def window(width):
+        "Points in and area of the window of half-width `width` cells"
+        i0, i1 = np.maximum(ci - width, 0), np.minimum(ci + width + 1, shape[0])
+        j0, j1 = np.maximum(cj - width, 0), np.minimum(cj + width + 1, shape[1])
+        count = table[i1, j1] - table[i0, j1] - table[i1, j0] + table[i0, j0]
+        return count, (i1 - i0) * (j1 - j0) * cell**2
+
+    # Smallest half-width whose window holds k + 1 points.
+    low = np.zeros(len(occupied), dtype="int64")
+    high = np.full(len(occupied), int(shape.max()))
+    while (low < high).any():
+        middle = (low + high) // 2
+        enough = window(middle)[0] >= k + 1
+        high = np.where(enough, middle, high)
+        low = np.where(enough, low, middle + 1)
+
+    count, area = window(low)
+    return np.sqrt((k + 1) * area / (np.pi * count))[inverse]
+
+
+def _next_radius(radius, counts, k, low, low_counts, high, high_counts):
+    """
+    Next radius to count in the search for a disk holding k points, given
+    the current radius and count and the closest radii found so far with
+    too few (low) and too many (high) points (0 and inf if none yet).
+    """
+    # Assume the density is constant near the current radius ...
+    guess = radius * np.sqrt(k / np.maximum(counts, 1))
+
+    # ... unless the answer is bracketed: then interpolate the count in
+    # area between the brackets, staying clear of the ends so the bracket
+    # shrinks by at least a tenth every time.
+    bracketed = (low > 0) & np.isfinite(high)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        interpolated = np.sqrt(
+            low**2 + (k - low_counts) * (high**2 - low**2) / (high_counts - low_counts)
+        )
+        margin = 0.1 * (high - low)
+        interpolated = np.clip(interpolated, low + margin, high - margin)
+    guess = np.where(bracketed, interpolated, guess)
+
+    # With one bracket only, never step back past it.
+    guess = np.where(~bracketed & (guess >= high), high / 2, guess)
+    return np.where(~bracketed & (guess <= low), 2 * low, guess)
+
+
+def _grid_knn_sums(coords, values, k, workers=1, chunk_size=None):
+    """
+    Approximate kNN sums of 0/1 `values` that never materializes
+    neighbor lists.
+
+    Each point gets a starting radius from :func:`_grid_radii`, and the
+    number of points (m) and of points with value 1 within it are counted
+    with :meth:`scipy.spatial.cKDTree.query_ball_point`
+    (`return_length=True`) on a tree of all points and a tree of the
+    value-1 points. Radii whose count is off by more than
+    `_GRID_TOLERANCE` are searched further, counting only those points
+    again, up to `_GRID_MAX_COUNTS` times. The few points still off
+    after that (e.g. among many duplicate points) get an exact kNN query.
+
+    Since the points within the radius are exactly the m nearest
+    neighbors, sums / m is the exact m-nearest-neighbor share, which
+    differs from the k-nearest share by at most |m - k| / max(m, k),
+    which never exceeds max(`_GRID_TOLERANCE`, 1 / k). Returns
+    (sums, m, bound), where sums are scaled to k neighbors.
+    """
+    from scipy.spatial import cKDTree
+
+    if not np.isin(values, (0, 1)).all():
+        raise ValueError('method="grid" requires a target column of 0s and 1s.')
+
+    tree = cKDTree(coords)
+    target_tree = cKDTree(coords[values == 1])
+    radius = _grid_radii(coords, k)
+
+    n = len(coords)
+    # Counts take O(1) memory per point, so only an explicit chunk_size
+    # splits them.
+    count_rows = n if chunk_size is None else max(int(chunk_size), 1)
+
+    counts = np.empty(n, dtype="int64")
+    targets = np.empty(n, dtype="float64")
+
+    def count(rows):
+        for start in range(0, len(rows), count_rows):
+            block = rows[start : start + count_rows]
+            points, block_radius = coords[block], radius[block]
+            # Both counts include the point itself.
+            counts[block] = (
+                tree.query_ball_point(
+                    points, block_radius, return_length=True, workers=workers
+                )
+                - 1
+            )
+            targets[block] = (
+                target_tree.query_ball_point(
+                    points, block_radius, return_length=True, workers=workers
+                )
+                - values[block]
             )
 
-            # Set dem values for points
-            if party == dem_vote_count:
-                d_value = 1
-            else:
-                d_value = 0
+    low, low_counts = np.zeros(n), np.zeros(n)
+    high, high_counts = np.full(n, np.inf), np.zeros(n)
+    tolerance = max(_GRID_TOLERANCE, 1 / k)
 
-            new_points["dem"] = d_value
+    rows = np.arange(n)
+    for _ in range(_GRID_MAX_COUNTS):
+        count(rows)
 
-            for i, point in enumerate(points):
-                new_points.iloc[i, 1] = point
+        row_counts = counts[rows]
+        below, above = row_counts < k, row_counts > k
+        low[rows[below]] = radius[rows[below]]
+        low_counts[rows[below]] = row_counts[below]
+        high[rows[above]] = radius[rows[above]]
+        high_counts[rows[above]] = row_counts[above]
 
-            gf = pd.concat([gf, new_points])
+        error = np.abs(row_counts - k) / np.maximum(row_counts, k)
+        rows = rows[error > tolerance]
+        if len(rows) == 0:
+            break
+        radius[rows] = _next_radius(
+            radius[rows],
+            counts[rows],
+            k,
+            low[rows],
+            low_counts[rows],
+            high[rows],
+            high_counts[rows],
+        )
 
-    gf["dem"] = gf["dem"].astype("int64")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sums = k * targets / counts
 
-    # Make sure using original CRS
-    gf = gf.set_crs(precincts.crs)
-    gf = gf.reset_index(drop=True)
+    # Radius searches that did not converge fall back to an exact query.
+    if len(rows) > 0:
+        sums[rows] = _knn_sums(
+            tree, values, k, rows=rows, workers=workers, chunk_size=chunk_size
+        )
+        counts[rows] = k
 
-    return gf
+    bound = np.abs(counts - k) / np.maximum(counts, k)
+    return sums, counts, bound
 
 
-def calculate_voter_knn(voter_points, k, target_column="dem"):
+def calculate_voter_knn(
+    voter_points,
+    k,
+    target_column="dem",
+    workers=1,
+    chunk_size=None,
+    method="exact",
+    weight_column=None,
+):
     """
     Calculation composition of nearest neigbhors.
 
-    :param voter_points: :class:`geopandas.GeoDataFrame`.
-          GeoDataFrame of voter points
+    :param voter_points: :class:`geopandas.GeoDataFrame` or :class:`VoterPoints`.
+          Voter points. The result is of the same type.
     :param k: Num nearest neighbors to consider.
+          May be a list of several values, in which case the tree is
+          queried once at the largest and one `knn_shr_<target>_k<k>`
+          column is added per value.
     :param target_column: Feature to average across nearest neighbors.
+    :param workers: (default=1)
+          Number of threads used to query the tree. -1 uses all cores.
+          Results do not depend on this setting.
+    :param chunk_size: (default=None)
+          Number of voters queried at a time, bounding the memory used
+          for the (chunk_size, k+1) neighbor arrays. By default as many
+          as keep those arrays within 10 million entries (160 MB).
+    :param method: (default="exact")
+          "exact" queries the k nearest neighbors of every voter. "grid"
+          approximates them for a 0/1 target column without building
+          neighbor arrays, using O(n) memory whatever k is: each voter's
+          k-th-neighbor radius is estimated from a density grid and the
+          voters and target voters within it are counted. The share
+          reported is then the exact share among the m voters inside that
+          radius, so it differs from the exact kNN share by at most
+          |m - k| / max(m, k). This bound is added per voter as
+          `knn_err_<target>` (`knn_err_<target>_k<k>` for several k) and
+          is at most max(0.01, 1/k): voters whose radius search does not
+          get there are queried exactly.
+    :param weight_column: (default=None)
+          Column with the number of voters each point stands for, as
+          written by :func:`weighted_points_in_polygon`. Neighbors are
+          then added in order of distance until their weights reach k,
+          counting the last one only in part, and the share is the
+          weighted mean of `target_column` over them. Only with
+          `method="exact"`.
     """
+    from scipy.spatial import cKDTree
 
-    voter_points = voter_points.copy()
-    voter_points = voter_points.reset_index(drop=True)
-    voter_points[f"knn_shr_{target_column}"] = np.nan
+    if method not in ("exact", "grid"):
+        raise ValueError('method must be "exact" or "grid".')
 
-    tree = cKDTree(list(zip(voter_points["geometry"].x, voter_points["geometry"].y)))
+    ks = np.atleast_1d(k)
+    if len(ks) == 0 or (ks < 1).any():
+        raise ValueError("k must be a positive integer or a list of them.")
+    if weight_column is not None:
+        if method != "exact":
+            raise ValueError('weight_column requires method="exact".')
+        if len(voter_points) < 2:
+            raise ValueError("At least two voter points are needed.")
+    elif ks.max() >= len(voter_points):
+        raise ValueError("k must be smaller than the number of voter points.")
 
-    # Note this will pull the point itself, which we don't want.
-    # So do k+1, then remove "self" later.
-    dd, ii = tree.query(
-        list(zip(voter_points["geometry"].x, voter_points["geometry"].y)), k=k + 1
-    )
+    if isinstance(voter_points, VoterPoints):
+        coords = voter_points.coords()
+    else:
+        voter_points = voter_points.copy()
+        voter_points = voter_points.reset_index(drop=True)
+        coords = np.column_stack(
+            [voter_points["geometry"].x, voter_points["geometry"].y]
+        ).astype("float64", order="C")
 
-    for index, row in voter_points.iterrows():
+    values = np.asarray(voter_points[target_column], dtype="float64")
 
-        # Extract self.
-        neighbors = [i for i in ii[index] if i != index]
-        if not len(neighbors) < len(ii[index]):
-            raise ValueError(
-                "You should never get this error. If you do, please post an issue on the github"
-                " repository for this package at www.github.com/nickeubank/partisan_dislocation"
-            )
+    if method == "grid":
+        columns = {}
+        with _stage("calculate_voter_knn", "grid_count", rows=len(coords)):
+            for size in ks:
+                sums, _, bound = _grid_knn_sums(
+                    coords, values, int(size), workers=workers, chunk_size=chunk_size
+                )
+                suffix = "" if np.ndim(k) == 0 else f"_k{size}"
+                columns[f"knn_shr_{target_column}{suffix}"] = sums / size
+                columns[f"knn_err_{target_column}{suffix}"] = bound
+    else:
+        with _stage("calculate_voter_knn", "tree_build", rows=len(coords)):
+            tree = cKDTree(coords)
+        with _stage("calculate_voter_knn", "tree_query", rows=len(coords)):
+            if weight_column is not None:
+                sums = _weighted_knn_sums(
+                    tree,
+                    values,
+                    voter_points[weight_column],
+                    k,
+                    workers=workers,
+                    chunk_size=chunk_size,
+                )
+            else:
+                sums = _knn_sums(
+                    tree, values, k, workers=workers, chunk_size=chunk_size
+                )
 
-        voter_points.at[index, f"knn_shr_{target_column}"] = (
-            voter_points[target_column].iloc[neighbors].sum() / k
-        )
+        if np.ndim(k) == 0:
+            columns = {f"knn_shr_{target_column}": sums / k}
+        else:
+            columns = {
+                f"knn_shr_{target_column}_k{size}": sums[:, i] / size
+                for i, size in enumerate(ks)
+            }
 
+    if isinstance(voter_points, VoterPoints):
+        return voter_points.with_columns(**columns)
+
+    for name, shares in columns.items():
+        voter_points[name] = shares
     return voter_points
 
 
+def _assign_points(xs, ys, geometries, order=None):
+    """
+    Index of the polygon in `geometries` containing each point, or -1 if
+    none does. Points on a boundary count as inside, and points on a
+    shared boundary go to the lowest index.
+
+    Points are sorted by x once, so each polygon only tests the points in
+    its bounding box, against a prepared geometry and without building
+    any shapely points. Callers assigning the same points repeatedly can
+    pass `order`, the result of `np.argsort(xs)`, to skip the sort.
+    """
+    import shapely
+
+    xs = np.asarray(xs, dtype="float64")
+    ys = np.asarray(ys, dtype="float64")
+
+    if order is None:
+        order = np.argsort(xs, kind="stable")
+    sorted_xs = xs[order]
+    assignment = np.full(len(xs), -1, dtype="int64")
+
+    for i, geometry in enumerate(geometries):
+        if geometry is None or geometry.is_empty:
+            continue
+        shapely.prepare(geometry)
+        min_x, min_y, max_x, max_y = geometry.bounds
+
+        start = np.searchsorted(sorted_xs, min_x, side="left")
+        stop = np.searchsorted(sorted_xs, max_x, side="right")
+        candidates = order[start:stop]
+        candidates = candidates[
+            (ys[candidates] >= min_y)
+            & (ys[candidates] <= max_y)
+            & (assignment[candidates] < 0)
+        ]
+
+        inside = shapely.intersects_xy(geometry, xs[candidates], ys[candidates])
+        assignment[candidates[inside]] = i
+
+    return assignment
+
+
+def _group_means(ids, values, n_groups, weights=None):
+    """
+    Mean (weighted by `weights`, if given) of values for each id in
+    range(n_groups); NaN for empty groups
+    """
+    if weights is not None:
+        values = values * weights
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.bincount(ids, weights=values, minlength=n_groups) / np.bincount(
+            ids, weights=weights, minlength=n_groups
+        )
+
+
+def assign_districts(voter_points, districts):
+    """
+    Position of the district containing each voter, or -1 for voters
+    outside every district.
+
+    :param voter_points: :class:`geopandas.GeoDataFrame` or :class:`VoterPoints`.
+          Voter points.
+    :param districts: :class:`geopandas.GeoDataFrame`.
+          GeoDataFrame of electoral district polygons. Positions refer to
+          rows of this GeoDataFrame.
+    """
+    districts = districts.to_crs(voter_points.crs)
+
+    if isinstance(voter_points, VoterPoints):
+        xs, ys = voter_points.x, voter_points.y
+    else:
+        xs, ys = voter_points.geometry.x.to_numpy(), voter_points.geometry.y.to_numpy()
+
+    return _assign_points(xs, ys, districts.geometry.to_numpy())
+
+
+def _precinct_assignment(voter_points, precinct_districts, precinct_id_col):
+    """
+    District position of each voter from a Series mapping precincts to
+    districts, plus the district labels those positions refer to.
+    """
+    import pandas as pd
+
+    codes, labels = pd.factorize(precinct_districts)
+
+    if precinct_id_col is None:
+        if not isinstance(voter_points, VoterPoints):
+            raise ValueError(
+                "precinct_id_col is required to assign GeoDataFrame voter "
+                "points with a precinct-to-district Series."
+            )
+        # Positions in the precinct frame index straight into the Series.
+        precinct = voter_points.precinct
+        if (precinct < 0).any() or (precinct >= len(codes)).any():
+            raise ValueError(
+                "Voter precinct positions do not match the length of the "
+                "precinct-to-district Series."
+            )
+        return codes[precinct], labels
+
+    # Look each distinct precinct id up once, then gather.
+    voter_precinct, precinct_ids = pd.factorize(
+        np.asarray(voter_points[precinct_id_col])
+    )
+    positions = precinct_districts.index.get_indexer(precinct_ids)
+    precinct_codes = np.where(positions >= 0, codes[positions], -1)
+    return precinct_codes[voter_precinct], labels
+
+
 def calculate_dislocation(
     voter_points,
     districts,
     knn_column="knn_shr_dem",
     dem_column="dem",
     district_id_col=None,
+    unassigned="drop",
+    precinct_id_col=None,
+    weight_column=None,
 ):
     """
     Calculation difference between knn dem share
     and dem share of assigned district
 
-    :param voter_points: :class:`geopandas.GeoDataFrame`.
-          GeoDataFrame of voter points.
-    :param districts: :class:`geopandas.GeoDataFrame`.
-          GeoDataFrame of electoral district polygons.
+    :param voter_points: :class:`geopandas.GeoDataFrame` or :class:`VoterPoints`.
+          Voter points. The result is of the same type.
+    :param districts: :class:`geopandas.GeoDataFrame` or :class:`pandas.Series`.
+          GeoDataFrame of electoral district polygons, or a Series
+          mapping precincts (index) to districts (values). With a Series
+          no geometry is used: voters are assigned through the precinct
+          they were drawn in.
     :param knn_column: (default="knn_shr_dem")
           Column of `voter_points` with kNN scores
     :param dem_column: (default="dem")
           Column with voter attribute to be averaged (usually "dem").
     :param district_id_col: (default=None)
           Column with district identifier to include in voter data.
-          Optional.
+          Optional. With a Series of districts, this is the name of the
+          output column holding the Series values.
+    :param unassigned: (default="drop")
+          What to do with voters that fall outside every district (e.g. in
+          gaps between district polygons). "drop" removes them with a
+          warning, "keep" keeps them with missing district values, and
+          "raise" raises a ValueError.
+    :param precinct_id_col: (default=None)
+          With a Series of districts, the column of `voter_points` with
+          precinct identifiers matching the Series index (see
+          `precinct_id_col` in :func:`random_points_in_polygon`). May be
+          omitted for :class:`VoterPoints`, in which case the Series is
+          matched to precincts by position.
+    :param weight_column: (default=None)
+          Column with the number of voters each point stands for (see
+          :func:`weighted_points_in_polygon`). District shares are then
+          weighted means.
     """
+    import pandas as pd
 
-    # Put both geodataframes in common projection
-    districts = districts.to_crs(voter_points.crs)
+    if unassigned not in ("drop", "keep", "raise"):
+        raise ValueError('unassigned must be one of "drop", "keep" or "raise".')
 
-    # Add new district index column
-    new_id = "partisan_dislocation_district_id"
-    if new_id in districts.columns:
-        raise ValueError(
-            f"District GeoDataFrame may not have column " f"named {new_id}"
-        )
+    with _stage("calculate_dislocation", "district_assignment", len(voter_points)):
+        if isinstance(districts, pd.Series):
+            assignment, district_labels = _precinct_assignment(
+                voter_points, districts, precinct_id_col
+            )
+        else:
+            # Put both geodataframes in common projection
+            districts = districts.to_crs(voter_points.crs).reset_index(drop=True)
+            assignment = assign_districts(voter_points, districts)
+            district_labels = (
+                districts[district_id_col] if district_id_col is not None else None
+            )
 
-    to_keep = ["geometry"]
+    n_districts = len(districts) if district_labels is None else len(district_labels)
 
-    # Add in district name if wanted
-    if district_id_col is not None:
-        to_keep.append(district_id_col)
+    is_assigned = assignment >= 0
+    n_unassigned = len(assignment) - is_assigned.sum()
+    if n_unassigned > 0:
+        message = f"{n_unassigned} voter points do not fall in any district."
+        if unassigned == "raise":
+            raise ValueError(message)
+        if unassigned == "drop":
+            warnings.warn(message + " They have been dropped.")
+
+    # Calculate democrat share for each district
+    with _stage("calculate_dislocation", "district_shares", len(voter_points)):
+        values = np.asarray(voter_points[dem_column], dtype="float64")
+        weights = None
+        if weight_column is not None:
+            weights = np.asarray(voter_points[weight_column], dtype="float64")
+            weights = weights[is_assigned]
+        district_share = _group_means(
+            assignment[is_assigned], values[is_assigned], n_districts, weights
+        )
+        voter_share = np.where(is_assigned, district_share[assignment], np.nan)
 
-    districts = districts[to_keep].reset_index(drop=True)
+        # Calculate dislocation score
+        columns = {
+            f"district_{dem_column}_share": voter_share,
+            "partisan_dislocation": voter_share
+            - np.asarray(voter_points[knn_column], dtype="float64"),
+        }
 
-    districts[new_id] = districts.index
-    assert districts[new_id].is_unique
+    with _stage("calculate_dislocation", "build_output", int(is_assigned.sum())):
+        # Add in district name if wanted
+        if district_id_col is not None:
+            columns[district_id_col] = (
+                pd.Series(district_labels).reset_index(drop=True).reindex(assignment)
+            ).to_numpy()
 
-    # Calculate district dem share
-    dislocation = gpd.sjoin(voter_points, districts, how="inner")
+        if unassigned == "drop":
+            columns = {name: values[is_assigned] for name, values in columns.items()}
 
-    # Calculate democrat share for each district
-    dislocation[f"district_{dem_column}_share"] = dislocation.groupby([new_id])[
-        [dem_column]
-    ].transform(np.mean)
+        if isinstance(voter_points, VoterPoints):
+            if unassigned == "drop":
+                voter_points = voter_points.subset(is_assigned)
+            return voter_points.with_columns(**columns)
 
-    # Calculate dislocation score
-    dislocation["partisan_dislocation"] = (
-        dislocation[f"district_{dem_column}_share"] - dislocation[knn_column]
-    )
+        geometry = voter_points.geometry.name
+        kept = [dem_column, knn_column, geometry]
+        if weight_column is not None:
+            kept.insert(2, weight_column)
+        dislocation = voter_points[kept]
+        if unassigned == "drop":
+            dislocation = dislocation[is_assigned]
+        dislocation = dislocation.assign(**columns)
 
-    # clean
-    clean_cols = [
-        dem_column,
-        knn_column,
-        f"district_{dem_column}_share",
-        "partisan_dislocation",
-        "geometry",
-    ]
+        # clean
+        clean_cols = [
+            dem_column,
+            knn_column,
+            f"district_{dem_column}_share",
+            "partisan_dislocation",
+            geometry,
+        ]
+        if weight_column is not None:
+            clean_cols.insert(2, weight_column)
 
-    # Add in district name if wanted
-    if district_id_col is not None:
-        clean_cols.append(district_id_col)
+        # Add in district name if wanted
+        if district_id_col is not None:
+            clean_cols.append(district_id_col)
 
-    dislocation = dislocation[clean_cols]
+        dislocation = dislocation[clean_cols]
 
-    # final dataframe with dislocation score calculated for each voter
-    return dislocation
+        # final dataframe with dislocation score calculated for each voter
+        return dislocation
@@ -0,0 +1,172 @@
+"""Optional stage-level timing and memory instrumentation."""
+
+import contextlib
+import contextvars
+import logging
+import sys
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger("partisan_dislocation")
+
+# Report collecting stages in the current context, if any.
+_active_report = contextvars.ContextVar("partisan_dislocation_report", default=None)
+
+
+def _peak_rss():
+    "Peak resident set size of this process in bytes, or None if unknown"
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageTiming:
+    """
+    One timed stage of a pipeline function.
+
+    :param name: Stage name, e.g. "tree_query".
+    :param function: Public function the stage ran in.
+    :param seconds: Wall time.
+    :param rows: Number of rows (voters or precincts) processed, or None.
+    :param peak_rss: Peak resident set size of the process in bytes when
+          the stage finished, or None where unavailable.
+    """
+
+    def __init__(self, name, function, seconds, rows=None, peak_rss=None):
+        self.name = name
+        self.function = function
+        self.seconds = seconds
+        self.rows = rows
+        self.peak_rss = peak_rss
+
+    def __repr__(self):
+        return (
+            f"<StageTiming: {self.function}.{self.name} {self.seconds:.3f}s, "
+            f"{self.rows} rows>"
+        )
+
+
+class ProfileReport:
+    """
+    Stages recorded while a :func:`profile` context was active.
+
+    `stages` lists :class:`StageTiming` in the order they finished, and
+    `acceptance_rates` holds, for the latest point generation, the share
+    of rejection-sampling candidates that fell inside each precinct
+    (indexed by precinct position; NaN for precincts without points).
+    """
+
+    def __init__(self, log=False):
+        self.stages = []
+        self.acceptance_rates = None
+        self.log = log
+
+    def __repr__(self):
+        return (
+            f"<ProfileReport: {len(self.stages)} stages, {self.total_seconds():.3f}s>"
+        )
+
+    def total_seconds(self):
+        return sum(stage.seconds for stage in self.stages)
+
+    def to_dataframe(self):
+        "One row per stage with function, stage, seconds, rows and peak_rss"
+        import pandas as pd
+
+        return pd.DataFrame(
+            {
+                "function": [stage.function for stage in self.stages],
+                "stage": [stage.name for stage in self.stages],
+                "seconds": [stage.seconds for stage in self.stages],
+                "rows": [stage.rows for stage in self.stages],
+                "peak_rss": [stage.peak_rss for stage in self.stages],
+            }
+        )
+
+    def _record(self, stage):
+        self.stages.append(stage)
+        if self.log:
+            peak = (
+                "unknown"
+                if stage.peak_rss is None
+                else f"{stage.peak_rss / 2**20:.0f} MiB"
+            )
+            logger.info(
+                "%s.%s: %.3fs, %s rows, peak RSS %s",
+                stage.function,
+                stage.name,
+                stage.seconds,
+                stage.rows,
+                peak,
+            )
+
+    def _record_acceptance(self, n_precincts, positions, candidates):
+        "Stores accepted / drawn candidates for the precincts at positions"
+        import pandas as pd
+
+        rates = np.full(n_precincts, np.nan)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rates[positions] = candidates[:, 1] / candidates[:, 0]
+        self.acceptance_rates = pd.Series(rates, name="acceptance_rate")
+        if self.log and len(positions) > 0:
+            logger.info(
+                "random_points_in_polygon: acceptance rate min %.3f, median %.3f",
+                np.nanmin(rates),
+                np.nanmedian(rates),
+            )
+
+
+@contextlib.contextmanager
+def profile(log=False):
+    """
+    Context manager recording per-stage wall time, rows processed and
+    peak memory of :func:`random_points_in_polygon`,
+    :func:`calculate_voter_knn` and :func:`calculate_dislocation` calls
+    made inside it. Yields a :class:`ProfileReport`::
+
+        with profile() as report:
+            voters = random_points_in_polygon(precincts, p=0.01)
+            ...
+        print(report.to_dataframe())
+
+    Outside a profile context the instrumentation costs nothing.
+
+    :param log: (default=False)
+          Also emit each stage through the `partisan_dislocation` logger
+          at INFO level.
+    """
+    report = ProfileReport(log=log)
+    token = _active_report.set(report)
+    try:
+        yield report
+    finally:
+        _active_report.reset(token)
+
+
+@contextlib.contextmanager
+def _stage(function, name, rows=None):
+    "Times the enclosed block as one stage of `function` if a profile is active"
+    report = _active_report.get()
+    if report is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    yield
+    report._record(
+        StageTiming(
+            name,
+            function,
+            time.perf_counter() - start,
+            rows=rows,
+            peak_rss=_peak_rss(),
+        )
+    )
@@ -0,0 +1,360 @@
+"""Monte Carlo replication of the full dislocation pipeline."""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .partisan_dislocation import (
+    _assign_points,
+    _check_inputs,
+    _generate_points,
+    _group_means,
+    _knn_sums,
+    _resolve_n_jobs,
+)
+
+# Inputs shared by every draw, set once per process.
+_draw_inputs = None
+
+
+class _RunningMoments:
+    """
+    Welford accumulator for the mean and variance of arrays observed one
+    draw at a time. NaN entries (e.g. a precinct with no voters in some
+    draw) are skipped element by element.
+    """
+
+    def __init__(self, shape):
+        self.count = np.zeros(shape, dtype="int64")
+        self.mean = np.zeros(shape, dtype="float64")
+        self.m2 = np.zeros(shape, dtype="float64")
+
+    def update(self, values):
+        valid = ~np.isnan(values)
+        self.count += valid
+        delta = np.where(valid, values - self.mean, 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.mean += np.where(valid, delta / self.count, 0)
+        self.m2 += np.where(valid, delta * (values - self.mean), 0)
+
+    def variance(self):
+        "Sample variance; NaN where fewer than two draws were observed"
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 1, self.m2 / (self.count - 1), np.nan)
+
+
+class _RunningQuantile:
+    """
+    P-square estimator (Jain and Chlamtac, 1985) of quantile `q` of arrays
+    observed one draw at a time, keeping five markers per element instead
+    of every draw. Exact up to five observations. NaN entries are skipped
+    element by element.
+    """
+
+    def __init__(self, shape, q):
+        self.shape = shape
+        size = int(np.prod(shape))
+        self.count = np.zeros(size, dtype="int64")
+        self.heights = np.full((size, 5), np.nan)
+        self.positions = np.tile(np.arange(1.0, 6.0), (size, 1))
+        self.desired = np.tile([1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5.0], (size, 1))
+        self.increments = np.array([0, q / 2, q, (1 + q) / 2, 1])
+        self.q = q
+
+    def update(self, values):
+        values = np.ravel(values)
+        valid = ~np.isnan(values)
+
+        # The first five observations are stored, then sorted into markers.
+        filling = np.flatnonzero(valid & (self.count < 5))
+        self.heights[filling, self.count[filling]] = values[filling]
+        updating = np.flatnonzero(valid & (self.count >= 5))
+        self.count += valid
+        full = filling[self.count[filling] == 5]
+        self.heights[full] = np.sort(self.heights[full], axis=1)
+
+        if len(updating) == 0:
+            return
+        x = values[updating]
+        heights = self.heights[updating]
+        positions = self.positions[updating]
+
+        # Extend the extreme markers, then shift markers above x.
+        heights[:, 0] = np.minimum(heights[:, 0], x)
+        heights[:, 4] = np.maximum(heights[:, 4], x)
+        cell = np.clip((x[:, None] >= heights[:, 1:4]).sum(axis=1), 0, 3)
+        positions += np.arange(5) > cell[:, None]
+        desired = self.desired[updating] + self.increments
+
+        # Move the middle markers towards their desired positions.
+        for i in range(1, 4):
+            offset = desired[:, i] - positions[:, i]
+            move = ((offset >= 1) & (positions[:, i + 1] - positions[:, i] > 1)) | (
+                (offset <= -1) & (positions[:, i - 1] - positions[:, i] < -1)
+            )
+            d = np.sign(offset[move])
+            h = heights[move, i - 1 : i + 2]
+            n = positions[move, i - 1 : i + 2]
+            parabolic = h[:, 1] + d / (n[:, 2] - n[:, 0]) * (
+                (n[:, 1] - n[:, 0] + d) * (h[:, 2] - h[:, 1]) / (n[:, 2] - n[:, 1])
+                + (n[:, 2] - n[:, 1] - d) * (h[:, 1] - h[:, 0]) / (n[:, 1] - n[:, 0])
+            )
+            step = (d > 0).astype(int) * 2
+            linear = h[:, 1] + d * (h[np.arange(len(d)), step] - h[:, 1]) / (
+                n[np.arange(len(d)), step] - n[:, 1]
+            )
+            heights[move, i] = np.where(
+                (h[:, 0] < parabolic) & (parabolic < h[:, 2]), parabolic, linear
+            )
+            positions[move, i] += d
+
+        self.heights[updating] = heights
+        self.positions[updating] = positions
+        self.desired[updating] = desired
+
+    def quantile(self):
+        "Estimated quantile; NaN where no draws were observed"
+        result = self.heights[:, 2].copy()
+        # Up to five draws, the markers are still the sorted draws.
+        few = np.flatnonzero((self.count > 0) & (self.count <= 5))
+        for count in np.unique(self.count[few]):
+            rows = few[self.count[few] == count]
+            result[rows] = np.quantile(self.heights[rows, :count], self.q, axis=1)
+        result[self.count == 0] = np.nan
+        return result.reshape(self.shape)
+
+
+def _init_draws(
+    precinct_geometries,
+    dem_votes,
+    rep_votes,
+    district_geometries,
+    p,
+    uniform_swing_to_dems,
+    k,
+    workers,
+    chunk_size,
+):
+    "Stores the inputs shared by all draws in this process"
+    global _draw_inputs
+    _draw_inputs = dict(
+        precinct_geometries=precinct_geometries,
+        dem_votes=dem_votes,
+        rep_votes=rep_votes,
+        district_geometries=district_geometries,
+        p=p,
+        uniform_swing_to_dems=uniform_swing_to_dems,
+        k=k,
+        workers=workers,
+        chunk_size=chunk_size,
+    )
+
+
+def _run_draw(entropy):
+    """
+    One draw of points, kNN and dislocation. Returns per-district and
+    per-precinct mean and mean absolute dislocation.
+    """
+    inputs = _draw_inputs
+    n_precincts = len(inputs["precinct_geometries"])
+    n_districts = len(inputs["district_geometries"])
+
+    xs, ys, dem, precinct = _generate_points(
+        inputs["precinct_geometries"],
+        inputs["dem_votes"],
+        inputs["rep_votes"],
+        inputs["p"],
+        inputs["uniform_swing_to_dems"],
+        entropy,
+    )
+    dem = dem.astype("float64")
+    k = inputs["k"]
+    if k >= len(xs):
+        raise ValueError("k must be smaller than the number of voter points.")
+
+    tree = cKDTree(np.column_stack([xs, ys]))
+    knn = (
+        _knn_sums(
+            tree,
+            dem,
+            k,
+            workers=inputs["workers"],
+            chunk_size=inputs["chunk_size"],
+        )
+        / k
+    )
+
+    assignment = _assign_points(xs, ys, inputs["district_geometries"])
+    assigned = assignment >= 0
+    assignment, precinct = assignment[assigned], precinct[assigned]
+    dislocation = (
+        _group_means(assignment, dem[assigned], n_districts)[assignment] - knn[assigned]
+    )
+
+    return {
+        "district": np.stack(
+            [
+                _group_means(assignment, dislocation, n_districts),
+                _group_means(assignment, np.abs(dislocation), n_districts),
+            ]
+        ),
+        "precinct": np.stack(
+            [
+                _group_means(precinct, dislocation, n_precincts),
+                _group_means(precinct, np.abs(dislocation), n_precincts),
+            ]
+        ),
+    }
+
+
+def _summary_frame(units, id_col, moments, quantiles):
+    "GeoDataFrame of per-unit summaries across draws"
+    keep = [units.geometry.name] if id_col is None else [id_col, units.geometry.name]
+    summary = units[keep].copy()
+
+    variance = moments.variance()
+    for i, stat in enumerate(["mean_dislocation", "mean_abs_dislocation"]):
+        summary[f"{stat}_mean"] = np.where(
+            moments.count[i] > 0, moments.mean[i], np.nan
+        )
+        summary[f"{stat}_var"] = variance[i]
+        for estimator in quantiles:
+            summary[f"{stat}_q{estimator.q * 100:g}"] = estimator.quantile()[i]
+
+    summary["n_draws"] = moments.count[0]
+    return summary
+
+
+def replicate_dislocation(
+    precincts,
+    districts,
+    k,
+    n_draws,
+    p=0.01,
+    dem_vote_count="dem",
+    repub_vote_count="rep",
+    uniform_swing_to_dems=0,
+    random_seed=None,
+    district_id_col=None,
+    precinct_id_col=None,
+    quantiles=None,
+    n_jobs=1,
+    workers=1,
+    chunk_size=None,
+):
+    """
+    Runs `n_draws` independent draws of the full point, kNN and
+    dislocation pipeline and summarizes how per-district and per-precinct
+    dislocation vary across draws.
+
+    Each draw uses its own random stream spawned from `random_seed`, so
+    results are reproducible and do not depend on `n_jobs`. Precinct and
+    district geometries are projected and prepared once per process and
+    reused by every draw. Means and variances are accumulated with
+    Welford's algorithm and quantiles with the P-square estimator, so
+    memory does not grow with the number of draws. Quantiles are exact
+    for up to five draws and estimates beyond that.
+
+    Returns a tuple of two :class:`geopandas.GeoDataFrame`: one row per
+    district and one row per precinct. For each of `mean_dislocation`
+    (average signed dislocation of the unit's voters in a draw) and
+    `mean_abs_dislocation`, they hold `<stat>_mean` and `<stat>_var`
+    across draws and `<stat>_q<percent>` for each requested quantile, plus
+    `n_draws`, the number of draws in which the unit had voters.
+
+    :param precincts: :class:`geopandas.GeoDataFrame`
+          Polygon shapefile with vote totals.
+    :param districts: :class:`geopandas.GeoDataFrame`.
+          GeoDataFrame of electoral district polygons.
+    :param k: Num nearest neighbors to consider.
+    :param n_draws: Number of Monte Carlo draws.
+    :param p: (default=0.01)
+          Sampling parameter passed to :func:`random_points_in_polygon`.
+    :param dem_vote_count: (default="dem")
+          Name of column with Democratic vote counts per precinct.
+    :param repub_vote_count: (default="rep")
+          Name of column with Republican vote counts per precinct.
+    :param uniform_swing_to_dems: (default=0)
+          Swing in expected vote share for dems.
+    :param random_seed: (default=None)
+          Seed passed to :class:`numpy.random.SeedSequence`.
+    :param district_id_col: (default=None)
+          Column of `districts` to include in the district summary.
+    :param precinct_id_col: (default=None)
+          Column of `precincts` to include in the precinct summary.
+    :param quantiles: (default=None)
+          List of quantiles (between 0 and 1) to report across draws.
+    :param n_jobs: (default=1)
+          Number of processes running draws. -1 uses all cores.
+    :param workers: (default=1)
+          Number of threads used to query the kNN tree within each draw.
+    :param chunk_size: (default=None)
+          Number of voters queried at a time. By default sized from k,
+          as in :func:`calculate_voter_knn`.
+    """
+
+    _check_inputs(precincts, uniform_swing_to_dems)
+
+    quantiles = list(quantiles) if quantiles is not None else []
+    districts = districts.to_crs(precincts.crs).reset_index(drop=True)
+    precincts = precincts.reset_index(drop=True)
+
+    init_args = (
+        precincts.geometry.to_numpy(),
+        precincts[dem_vote_count].to_numpy(),
+        precincts[repub_vote_count].to_numpy(),
+        districts.geometry.to_numpy(),
+        p,
+        uniform_swing_to_dems,
+        k,
+        workers,
+        chunk_size,
+    )
+
+    # Independent stream for each draw
+    draw_entropy = [
+        child.generate_state(4)
+        for child in np.random.SeedSequence(random_seed).spawn(n_draws)
+    ]
+
+    district_moments = _RunningMoments((2, len(districts)))
+    precinct_moments = _RunningMoments((2, len(precincts)))
+    district_quantiles = [_RunningQuantile((2, len(districts)), q) for q in quantiles]
+    precinct_quantiles = [_RunningQuantile((2, len(precincts)), q) for q in quantiles]
+
+    def accumulate(results):
+        for result in results:
+            district_moments.update(result["district"])
+            precinct_moments.update(result["precinct"])
+            for estimator in district_quantiles:
+                estimator.update(result["district"])
+            for estimator in precinct_quantiles:
+                estimator.update(result["precinct"])
+
+    n_jobs = _resolve_n_jobs(n_jobs)
+    if n_jobs == 1:
+        _init_draws(*init_args)
+        accumulate(map(_run_draw, draw_entropy))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=n_jobs, initializer=_init_draws, initargs=init_args
+        ) as pool:
+            # map yields in submission order, so accumulation order (and
+            # therefore every floating point result) matches the serial run.
+            accumulate(pool.map(_run_draw, draw_entropy))
+
+    return (
+        _summary_frame(
+            districts,
+            district_id_col,
+            district_moments,
+            district_quantiles,
+        ),
+        _summary_frame(
+            precincts,
+            precinct_id_col,
+            precinct_moments,
+            precinct_quantiles,
+        ),
+    )
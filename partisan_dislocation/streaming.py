@@ -0,0 +1,316 @@
+"""Tiled dislocation pipeline that never holds all voter points at once."""
+
+import warnings
+
+import numpy as np
+import geopandas as gpd
+import shapely
+from scipy.spatial import cKDTree
+
+from .partisan_dislocation import (
+    _assign_points,
+    _check_inputs,
+    _counts_rng,
+    _knn_sums,
+    _party_indicator,
+    _precinct_point_counts,
+    _sample_precincts,
+    _seed_entropy,
+)
+
+# Default number of expected voter points per tile.
+_POINTS_PER_TILE = 1_000_000
+
+
+class _RegionSampler:
+    """
+    Regenerates the voter points of any rectangular region.
+
+    Point counts are drawn once for every precinct. Because each precinct
+    places its points with its own random stream, the points generated for
+    a region are exactly the points `random_points_in_polygon` would have
+    produced there with the same seed.
+    """
+
+    def __init__(
+        self,
+        precincts,
+        p,
+        dem_vote_count,
+        repub_vote_count,
+        uniform_swing_to_dems,
+        random_seed,
+    ):
+        self.entropy = _seed_entropy(random_seed)
+        self.dem_points, self.rep_points = _precinct_point_counts(
+            precincts[dem_vote_count].to_numpy(),
+            precincts[repub_vote_count].to_numpy(),
+            p,
+            uniform_swing_to_dems,
+            _counts_rng(self.entropy),
+        )
+        self.geometries = precincts.geometry.to_numpy()
+        self.tree = shapely.STRtree(self.geometries)
+        self.total_points = int(self.dem_points.sum() + self.rep_points.sum())
+
+    def points_in(self, bounds):
+        "Coordinates and party of all voter points inside bounds"
+        min_x, min_y, max_x, max_y = bounds
+
+        positions = np.sort(self.tree.query(shapely.box(*bounds)))
+        dem_points = self.dem_points[positions]
+        rep_points = self.rep_points[positions]
+        counts = dem_points + rep_points
+        has_points = counts > 0
+        positions, counts = positions[has_points], counts[has_points]
+
+        xs, ys, _ = _sample_precincts(
+            self.geometries[positions], positions, counts, self.entropy
+        )
+        dem = _party_indicator(dem_points[has_points], rep_points[has_points])
+
+        inside = (xs >= min_x) & (xs <= max_x) & (ys >= min_y) & (ys <= max_y)
+        return xs[inside], ys[inside], dem[inside]
+
+
+def _tile_index(values, origin, tile_size, n_tiles):
+    "Tile each coordinate falls in along one axis"
+    index = np.floor((values - origin) / tile_size).astype("int64")
+    return np.clip(index, 0, n_tiles - 1)
+
+
+def iter_dislocation_tiles(
+    precincts,
+    districts,
+    k,
+    p=0.01,
+    dem_vote_count="dem",
+    repub_vote_count="rep",
+    uniform_swing_to_dems=0,
+    random_seed=None,
+    district_id_col=None,
+    tile_size=None,
+    workers=1,
+    chunk_size=None,
+    unassigned="drop",
+):
+    """
+    Generates voter points, kNN scores and dislocation one spatial tile at
+    a time, yielding a :class:`geopandas.GeoDataFrame` per tile with the
+    same columns as :func:`calculate_dislocation`.
+
+    Results match running :func:`random_points_in_polygon`,
+    :func:`calculate_voter_knn` and :func:`calculate_dislocation` on the
+    whole state with the same seed. kNN scores are computed against a halo
+    of neighboring points around each tile that is widened until it
+    provably contains every voter's k nearest neighbors. District shares
+    are accumulated in a first pass over the tiles, so points are generated
+    twice, but peak memory scales with tile size rather than with the
+    total number of voters.
+
+    :param precincts: :class:`geopandas.GeoDataFrame`
+          Polygon shapefile with vote totals.
+    :param districts: :class:`geopandas.GeoDataFrame`.
+          GeoDataFrame of electoral district polygons.
+    :param k: Num nearest neighbors to consider.
+    :param p: (default=0.01)
+          Sampling parameter passed to :func:`random_points_in_polygon`.
+    :param dem_vote_count: (default="dem")
+          Name of column with Democratic vote counts per precinct.
+    :param repub_vote_count: (default="rep")
+          Name of column with Republican vote counts per precinct.
+    :param uniform_swing_to_dems: (default=0)
+          Swing in expected vote share for dems.
+    :param random_seed: (default=None)
+          Seed passed to :class:`numpy.random.SeedSequence`.
+    :param district_id_col: (default=None)
+          Column with district identifier to include in voter data.
+          Optional.
+    :param tile_size: (default=None)
+          Side length of square tiles in CRS units. By default chosen so
+          each tile holds about one million voter points.
+    :param workers: (default=1)
+          Number of threads used to query the kNN tree.
+    :param chunk_size: (default=None)
+          Number of voters queried at a time. By default sized from k,
+          as in :func:`calculate_voter_knn`.
+    :param unassigned: (default="drop")
+          What to do with voters that fall outside every district, as in
+          :func:`calculate_dislocation`. "drop" removes them with a
+          warning, "keep" keeps them with missing district values, and
+          "raise" raises a ValueError. Voters are counted in the first
+          pass, so the warning or error comes before the first tile.
+    """
+
+    _check_inputs(precincts, uniform_swing_to_dems)
+
+    if unassigned not in ("drop", "keep", "raise"):
+        raise ValueError('unassigned must be one of "drop", "keep" or "raise".')
+
+    sampler = _RegionSampler(
+        precincts,
+        p,
+        dem_vote_count,
+        repub_vote_count,
+        uniform_swing_to_dems,
+        random_seed,
+    )
+
+    min_x, min_y, max_x, max_y = precincts.total_bounds
+    width = max(max_x - min_x, np.finfo("float64").tiny)
+    height = max(max_y - min_y, np.finfo("float64").tiny)
+    density = max(sampler.total_points, 1) / (width * height)
+
+    if tile_size is None:
+        tile_size = np.sqrt(_POINTS_PER_TILE / density)
+    n_tiles_x = max(int(np.ceil(width / tile_size)), 1)
+    n_tiles_y = max(int(np.ceil(height / tile_size)), 1)
+
+    # Start with twice the radius expected to hold k neighbors.
+    initial_halo = 2 * np.sqrt(k / (np.pi * density))
+
+    districts = districts.to_crs(precincts.crs).reset_index(drop=True)
+    district_geometries = districts.geometry.to_numpy()
+
+    def tiles():
+        for ix in range(n_tiles_x):
+            for iy in range(n_tiles_y):
+                x0 = min_x + ix * tile_size
+                y0 = min_y + iy * tile_size
+                yield ix, iy, (x0, y0, x0 + tile_size, y0 + tile_size)
+
+    def owned(xs, ys, ix, iy):
+        return (_tile_index(xs, min_x, tile_size, n_tiles_x) == ix) & (
+            _tile_index(ys, min_y, tile_size, n_tiles_y) == iy
+        )
+
+    # First pass: dem share of each district.
+    dem_totals = np.zeros(len(districts), dtype="float64")
+    voter_totals = np.zeros(len(districts), dtype="float64")
+    n_unassigned = 0
+
+    for ix, iy, bounds in tiles():
+        # Pad slightly so points on tile edges are never missed.
+        pad = tile_size * 1e-6
+        xs, ys, dem = sampler.points_in(
+            (bounds[0] - pad, bounds[1] - pad, bounds[2] + pad, bounds[3] + pad)
+        )
+        mine = owned(xs, ys, ix, iy)
+        assignment = _assign_points(xs[mine], ys[mine], district_geometries)
+        assigned = assignment >= 0
+        dem_totals += np.bincount(
+            assignment[assigned],
+            weights=dem[mine][assigned],
+            minlength=len(districts),
+        )
+        voter_totals += np.bincount(assignment[assigned], minlength=len(districts))
+        n_unassigned += len(assignment) - assigned.sum()
+
+    if n_unassigned > 0:
+        message = f"{n_unassigned} voter points do not fall in any district."
+        if unassigned == "raise":
+            raise ValueError(message)
+        if unassigned == "drop":
+            warnings.warn(message + " They have been dropped.")
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        district_share = dem_totals / voter_totals
+
+    # Second pass: kNN with halo, then dislocation.
+    for ix, iy, bounds in tiles():
+        halo = initial_halo
+
+        while True:
+            region = (
+                bounds[0] - halo,
+                bounds[1] - halo,
+                bounds[2] + halo,
+                bounds[3] + halo,
+            )
+            xs, ys, dem = sampler.points_in(region)
+            rows = np.flatnonzero(owned(xs, ys, ix, iy))
+            covers_all = (
+                region[0] <= min_x
+                and region[1] <= min_y
+                and region[2] >= max_x
+                and region[3] >= max_y
+            )
+
+            if len(rows) == 0:
+                break
+
+            if len(xs) <= k:
+                if covers_all:
+                    raise ValueError(
+                        "k must be smaller than the number of voter points."
+                    )
+                halo *= 2
+                continue
+
+            tree = cKDTree(np.column_stack([xs, ys]))
+            sums, kth_distance = _knn_sums(
+                tree,
+                dem.astype("float64"),
+                k,
+                rows=rows,
+                workers=workers,
+                chunk_size=chunk_size,
+                return_distance=True,
+            )
+
+            # Any point outside the region is at least this far away, so
+            # neighbors found closer than this are the true neighbors.
+            # Region edges beyond the data extent have nothing behind them.
+            px, py = xs[rows], ys[rows]
+            margin = np.full(len(rows), np.inf)
+            if region[0] > min_x:
+                margin = np.minimum(margin, px - region[0])
+            if region[1] > min_y:
+                margin = np.minimum(margin, py - region[1])
+            if region[2] < max_x:
+                margin = np.minimum(margin, region[2] - px)
+            if region[3] < max_y:
+                margin = np.minimum(margin, region[3] - py)
+
+            if (kth_distance <= margin).all():
+                break
+            halo *= 2
+
+        if len(rows) == 0:
+            continue
+
+        xs, ys, dem = xs[rows], ys[rows], dem[rows]
+        assignment = _assign_points(xs, ys, district_geometries)
+        if unassigned == "drop":
+            assigned = assignment >= 0
+            xs, ys, dem = xs[assigned], ys[assigned], dem[assigned]
+            sums, assignment = sums[assigned], assignment[assigned]
+
+        tile = gpd.GeoDataFrame(
+            {
+                "dem": dem.astype("int64"),
+                "knn_shr_dem": sums / k,
+                "district_dem_share": np.where(
+                    assignment >= 0, district_share[assignment], np.nan
+                ),
+            },
+            geometry=gpd.points_from_xy(xs, ys),
+            crs=precincts.crs,
+        )
+        tile["partisan_dislocation"] = tile["district_dem_share"] - tile["knn_shr_dem"]
+        tile = tile[
+            [
+                "dem",
+                "knn_shr_dem",
+                "district_dem_share",
+                "partisan_dislocation",
+                "geometry",
+            ]
+        ]
+
+        if district_id_col is not None:
+            tile[district_id_col] = (
+                districts[district_id_col].reindex(assignment).to_numpy()
+            )
+
+        yield tile
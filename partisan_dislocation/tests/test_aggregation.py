@@ -0,0 +1,121 @@
+import unittest
+import numpy as np
+from shapely.geometry import box
+import geopandas as gpd
+from partisan_dislocation import random_points_in_polygon
+from partisan_dislocation import calculate_voter_knn
+from partisan_dislocation import calculate_dislocation
+from partisan_dislocation import aggregate_dislocation
+
+
+class TestAggregateDislocation(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        self.precincts = gpd.GeoDataFrame(
+            {
+                "name": [f"p{i}" for i in range(9)],
+                "dem": rng.integers(0, 60, 9),
+                "rep": rng.integers(0, 60, 9),
+                "geometry": [
+                    box(i, j, i + 1, j + 1) for i in range(3) for j in range(3)
+                ],
+            },
+            crs="esri:102010",
+        )
+        self.districts = gpd.GeoDataFrame(
+            {
+                "district": ["A", "B", "C"],
+                "geometry": [box(0, 0, 1, 3), box(1, 0, 3, 2), box(1, 2, 3, 3)],
+            },
+            crs="esri:102010",
+        )
+        points = random_points_in_polygon(
+            self.precincts, p=0.6, random_seed=8, as_voter_points=True
+        )
+        self.voters = calculate_dislocation(
+            calculate_voter_knn(points, k=6),
+            self.districts,
+            district_id_col="district",
+        )
+        self.gdf = self.voters.to_geodataframe(precinct_column="precinct")
+
+    def expected(self, by):
+        grouped = self.gdf.groupby(by)["partisan_dislocation"]
+        return grouped.mean(), grouped.apply(lambda d: d.abs().mean())
+
+    def test_districts_by_label(self):
+        result = aggregate_dislocation(
+            self.gdf, self.districts, unit_column="district", unit_id_col="district"
+        )
+        mean, mean_abs = self.expected("district")
+        np.testing.assert_allclose(
+            result["mean_dislocation"], mean.loc[["A", "B", "C"]]
+        )
+        np.testing.assert_allclose(
+            result["mean_abs_dislocation"], mean_abs.loc[["A", "B", "C"]]
+        )
+        self.assertEqual(result["n_voters"].sum(), len(self.gdf))
+        self.assertEqual(list(result.columns[:2]), ["district", "geometry"])
+
+    def test_districts_by_location(self):
+        by_label = aggregate_dislocation(
+            self.voters, self.districts, unit_column="district", unit_id_col="district"
+        )
+        by_location = aggregate_dislocation(self.voters, self.districts)
+        np.testing.assert_allclose(
+            by_label["mean_dislocation"], by_location["mean_dislocation"]
+        )
+
+    def test_precincts_by_position(self):
+        result = aggregate_dislocation(
+            self.voters, self.precincts, unit_column="precinct"
+        )
+        mean, _ = self.expected("precinct")
+        np.testing.assert_allclose(
+            result["mean_dislocation"].iloc[mean.index], mean.to_numpy()
+        )
+        dem_share = self.gdf.groupby("precinct")["dem"].mean()
+        np.testing.assert_allclose(
+            result["dem_share"].iloc[dem_share.index], dem_share.to_numpy()
+        )
+
+    def test_empty_units(self):
+        precincts = self.precincts.copy()
+        precincts.loc[4, ["dem", "rep"]] = 0
+        points = random_points_in_polygon(
+            precincts, p=0.6, random_seed=8, as_voter_points=True
+        )
+        voters = calculate_dislocation(calculate_voter_knn(points, k=6), self.districts)
+        result = aggregate_dislocation(voters, precincts, unit_column="precinct")
+        self.assertEqual(result["n_voters"].iloc[4], 0)
+        self.assertTrue(np.isnan(result["mean_dislocation"].iloc[4]))
+
+    def test_weighted(self):
+        weight = np.arange(len(self.voters)) % 3 + 1.0
+        voters = self.voters.with_columns(weight=weight)
+        result = aggregate_dislocation(
+            voters,
+            self.districts,
+            unit_column="district",
+            unit_id_col="district",
+            weight_column="weight",
+        )
+
+        in_a = voters["district"] == "A"
+        self.assertAlmostEqual(result["n_voters"].iloc[0], weight[in_a].sum())
+        self.assertAlmostEqual(
+            result["dem_share"].iloc[0],
+            np.average(voters.dem[in_a], weights=weight[in_a]),
+        )
+        self.assertAlmostEqual(
+            result["mean_dislocation"].iloc[0],
+            np.average(voters["partisan_dislocation"][in_a], weights=weight[in_a]),
+        )
+
+    def test_bad_positions(self):
+        with self.assertRaises(ValueError):
+            aggregate_dislocation(self.voters, self.districts, unit_column="precinct")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import numpy as np
+import shapely
+from shapely.geometry import MultiPolygon, Polygon, box
+import geopandas as gpd
+from partisan_dislocation import precinct_dislocation
+from partisan_dislocation.analytic import _DiskOverlap
+
+
+class TestPrecinctDislocation(unittest.TestCase):
+    def setUp(self):
+        # Dem precincts on the left half, repub on the right.
+        n = 6
+        dem = np.array([80 if i < n // 2 else 20 for i in range(n) for j in range(n)])
+        self.precincts = gpd.GeoDataFrame(
+            {
+                "name": [f"p{i}" for i in range(n * n)],
+                "dem": dem,
+                "rep": 100 - dem,
+                "geometry": [
+                    box(i, j, i + 1, j + 1) for i in range(n) for j in range(n)
+                ],
+            },
+            crs="esri:102010",
+        )
+        self.districts = gpd.GeoDataFrame(
+            {"district": ["L", "R"], "geometry": [box(0, 0, 3, 6), box(3, 0, 6, 6)]},
+            crs="esri:102010",
+        )
+
+    def test_uniform_share(self):
+        precincts = self.precincts.assign(dem=30, rep=70)
+        result = precinct_dislocation(
+            precincts, self.districts, k=20, p=0.5, method="analytic"
+        )
+        np.testing.assert_allclose(result["knn_shr_dem"], 0.3)
+        np.testing.assert_allclose(result["district_dem_share"], 0.3)
+        np.testing.assert_allclose(result["partisan_dislocation"], 0, atol=1e-12)
+
+    def test_radius_holds_target_voters(self):
+        # 100 voters per unit square: k / p = 100 voters needs area 1.
+        result = precinct_dislocation(
+            self.precincts, self.districts, k=50, p=0.5, method="analytic"
+        )
+        center = result.index[(result.geometry.centroid.x == 2.5)][2]
+        self.assertAlmostEqual(result.loc[center, "knn_radius"], 1 / np.sqrt(np.pi), 2)
+
+    def test_matches_sampling(self):
+        kwargs = dict(k=30, p=1, precinct_id_col="name", district_id_col="district")
+        analytic = precinct_dislocation(
+            self.precincts, self.districts, method="analytic", **kwargs
+        )
+        sampled = precinct_dislocation(
+            self.precincts, self.districts, random_seed=1, **kwargs
+        )
+        self.assertEqual(list(analytic["district"]), list(sampled["district"]))
+        self.assertIn("knn_radius", analytic.columns)
+        self.assertIn("n_voters", sampled.columns)
+
+        np.testing.assert_allclose(
+            analytic["district_dem_share"], sampled["district_dem_share"], atol=0.02
+        )
+        np.testing.assert_allclose(
+            analytic["knn_shr_dem"], sampled["knn_shr_dem"], atol=0.1
+        )
+        # Interior precincts see only their own side.
+        np.testing.assert_allclose(
+            analytic["knn_shr_dem"].iloc[[0, 35]], [0.8, 0.2], atol=1e-6
+        )
+
+    def test_disk_overlap_areas(self):
+        geometries = np.array(
+            [
+                Polygon(
+                    [(0, 0), (3, 0), (3, 2), (1, 3), (0, 2)],
+                    holes=[[(1, 1), (1.5, 1), (1.5, 1.5), (1, 1.5)]],
+                ),
+                MultiPolygon([box(4, 0, 5, 1), box(5.5, 0, 6, 2)]),
+                Polygon([(0, 5), (2, 5), (2, 7), (0, 7)][::-1]),
+            ]
+        )
+        rng = np.random.default_rng(0)
+        x, y = rng.uniform(-1, 7, 30), rng.uniform(-1, 8, 30)
+        radius = rng.uniform(0.1, 3, 30)
+
+        disk, polygon, areas = _DiskOverlap(geometries).areas(x, y, radius)
+        disks = shapely.buffer(
+            shapely.points(x[disk], y[disk]), radius[disk], quad_segs=512
+        )
+        expected = shapely.area(shapely.intersection(disks, geometries[polygon]))
+        np.testing.assert_allclose(areas, expected, atol=1e-4)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            precinct_dislocation(self.precincts, self.districts, k=5, method="exact")
+        with self.assertRaises(ValueError):
+            precinct_dislocation(
+                self.precincts, self.districts, k=5000, p=1, method="analytic"
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from shapely.geometry import box
+import geopandas as gpd
+from partisan_dislocation import random_points_in_polygon
+from partisan_dislocation import calculate_voter_knn
+from partisan_dislocation import VoterCache, cached_voter_knn
+
+
+class TestVoterCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = VoterCache(self.tmp.name)
+        self.precincts = gpd.GeoDataFrame(
+            {
+                "dem": [30, 10, 25, 40],
+                "rep": [20, 35, 25, 5],
+                "geometry": [
+                    box(i, j, i + 1, j + 1) for i in range(2) for j in range(2)
+                ],
+            },
+            crs="esri:102010",
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_matches_uncached(self):
+        expected = calculate_voter_knn(
+            random_points_in_polygon(
+                self.precincts, p=0.5, random_seed=3, as_voter_points=True
+            ),
+            k=5,
+        )
+        for _ in range(2):
+            voters = cached_voter_knn(
+                self.precincts, k=5, p=0.5, random_seed=3, cache=self.cache
+            )
+            np.testing.assert_array_equal(voters.x, expected.x)
+            np.testing.assert_array_equal(voters.precinct, expected.precinct)
+            np.testing.assert_array_equal(
+                voters["knn_shr_dem"], expected["knn_shr_dem"]
+            )
+            self.assertEqual(voters.crs, self.precincts.crs)
+        self.assertEqual(len(os.listdir(self.tmp.name)), 1)
+
+    def test_key_changes_with_inputs(self):
+        cached_voter_knn(self.precincts, k=5, p=0.5, random_seed=3, cache=self.cache)
+        cached_voter_knn(self.precincts, k=6, p=0.5, random_seed=3, cache=self.cache)
+        edited = self.precincts.copy()
+        edited.loc[0, "dem"] = 31
+        cached_voter_knn(edited, k=5, p=0.5, random_seed=3, cache=self.cache)
+        self.assertEqual(len(os.listdir(self.tmp.name)), 3)
+
+    def test_no_seed_not_cached(self):
+        cached_voter_knn(self.precincts, k=5, p=0.5, cache=self.cache)
+        self.assertEqual(self.cache.size(), 0)
+
+    def test_disable_and_clear(self):
+        cached_voter_knn(self.precincts, k=5, p=0.5, random_seed=3, cache=False)
+        disabled = VoterCache(self.tmp.name, enabled=False)
+        cached_voter_knn(self.precincts, k=5, p=0.5, random_seed=3, cache=disabled)
+        self.assertEqual(self.cache.size(), 0)
+
+        cached_voter_knn(self.precincts, k=5, p=0.5, random_seed=3, cache=self.cache)
+        self.assertGreater(self.cache.size(), 0)
+        self.cache.clear()
+        self.assertEqual(self.cache.size(), 0)
+
+    def test_eviction(self):
+        cached_voter_knn(self.precincts, k=5, p=0.5, random_seed=1, cache=self.cache)
+        one_entry = self.cache.size()
+
+        small = VoterCache(self.tmp.name, max_bytes=int(1.5 * one_entry))
+        cached_voter_knn(self.precincts, k=5, p=0.5, random_seed=2, cache=small)
+        self.assertLessEqual(small.size(), 1.5 * one_entry)
+        self.assertEqual(len(os.listdir(self.tmp.name)), 1)
+
+    def test_read_only_cache_hit(self):
+        expected = cached_voter_knn(
+            self.precincts, k=5, p=0.5, random_seed=3, cache=self.cache
+        )
+        with mock.patch("os.utime", side_effect=PermissionError):
+            voters = cached_voter_knn(
+                self.precincts, k=5, p=0.5, random_seed=3, cache=self.cache
+            )
+        np.testing.assert_array_equal(voters["knn_shr_dem"], expected["knn_shr_dem"])
+
+
+if __name__ == "__main__":
+    unittest.main()
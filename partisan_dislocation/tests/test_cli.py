@@ -0,0 +1,231 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+import geopandas as gpd
+from partisan_dislocation import VoterPoints, read_voter_points, write_precincts
+from partisan_dislocation.cli import main, run
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class TestCLI(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+        # Two states side by side, each a 4 x 4 grid of precincts.
+        cells = [(i, j) for i in range(8) for j in range(4)]
+        dem = np.array([70 if i % 4 < 2 else 30 for i, j in cells])
+        precincts = gpd.GeoDataFrame(
+            {
+                "STATE": ["01" if i < 4 else "02" for i, j in cells],
+                "dem": dem,
+                "rep": 100 - dem,
+                "geometry": [box(i, j, i + 1, j + 1) for i, j in cells],
+            },
+            crs="esri:102010",
+        )
+        congress = gpd.GeoDataFrame(
+            {
+                "STATEFP": ["01", "01", "02", "02"],
+                "geometry": [
+                    box(0, 0, 2, 4),
+                    box(2, 0, 4, 4),
+                    box(4, 0, 6, 4),
+                    box(6, 0, 8, 4),
+                ],
+            },
+            crs="esri:102010",
+        )
+        senate = gpd.GeoDataFrame(
+            {
+                "STATEFP": ["01", "02"],
+                "geometry": [box(0, 0, 4, 4), box(4, 0, 8, 4)],
+            },
+            crs="esri:102010",
+        )
+
+        self.precinct_file = self.path("precincts.gpkg")
+        precincts.to_file(self.precinct_file)
+        self.precincts = precincts
+        self.district_files = {
+            "USCongress": self.path("congress.gpkg"),
+            "StateUpperChamber": self.path("senate.gpkg"),
+        }
+        congress.to_file(self.district_files["USCongress"])
+        senate.to_file(self.district_files["StateUpperChamber"])
+        self.output = self.path("output")
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def run_all(self, **kwargs):
+        return run(
+            self.precinct_file,
+            self.district_files,
+            self.output,
+            k=5,
+            p=0.2,
+            random_seed=1,
+            district_state_column="STATEFP",
+            **kwargs,
+        )
+
+    def test_outputs(self):
+        self.assertEqual(self.run_all(n_jobs=2), [])
+
+        for chamber, n_districts in (("USCongress", 2), ("StateUpperChamber", 1)):
+            for state in ("01", "02"):
+                voters = VoterPoints.load(
+                    os.path.join(self.output, chamber, f"{state}_voters")
+                )
+                self.assertIn("partisan_dislocation", voters.columns)
+                summary = pd.read_csv(
+                    os.path.join(self.output, chamber, f"{state}_districts.csv")
+                )
+                self.assertEqual(len(summary), n_districts)
+                self.assertEqual(summary["n_voters"].sum(), len(voters))
+
+        # Both chambers share one set of voters per state.
+        congress = VoterPoints.load(
+            os.path.join(self.output, "USCongress", "01_voters")
+        )
+        senate = VoterPoints.load(
+            os.path.join(self.output, "StateUpperChamber", "01_voters")
+        )
+        np.testing.assert_array_equal(congress.x, senate.x)
+        np.testing.assert_array_equal(congress["knn_shr_dem"], senate["knn_shr_dem"])
+        self.assertTrue(set(np.unique(congress["district"])) <= {0, 1})
+
+    def test_resume(self):
+        self.run_all()
+        summary = os.path.join(self.output, "USCongress", "01_districts.csv")
+        voters = os.path.join(self.output, "USCongress", "01_voters")
+        os.remove(summary)
+        before = os.path.getmtime(
+            os.path.join(self.output, "USCongress", "02_districts.csv")
+        )
+
+        self.assertEqual(self.run_all(resume=True), [])
+        self.assertTrue(os.path.exists(summary))
+        self.assertEqual(
+            os.path.getmtime(
+                os.path.join(self.output, "USCongress", "02_districts.csv")
+            ),
+            before,
+        )
+        self.assertTrue(os.path.isfile(os.path.join(voters, "meta.json")))
+
+    def test_resume_with_other_parameters(self):
+        self.run_all()
+        summary = os.path.join(self.output, "USCongress", "01_districts.csv")
+        before = os.path.getmtime(summary)
+        voters = VoterPoints.load(os.path.join(self.output, "_voters", "01"), None)
+
+        def rerun():
+            return run(
+                self.precinct_file,
+                self.district_files,
+                self.output,
+                k=5,
+                p=0.2,
+                random_seed=2,
+                district_state_column="STATEFP",
+                resume=True,
+            )
+
+        # A different seed makes every saved output stale.
+        self.assertEqual(rerun(), [])
+        redone = VoterPoints.load(os.path.join(self.output, "_voters", "01"))
+        self.assertFalse(np.array_equal(voters.x, redone.x))
+        self.assertNotEqual(os.path.getmtime(summary), before)
+
+        # Resuming with the same parameters keeps everything.
+        before = os.path.getmtime(summary)
+        self.assertEqual(rerun(), [])
+        self.assertEqual(os.path.getmtime(summary), before)
+
+    def test_state_draw_does_not_depend_on_other_states(self):
+        self.run_all(states=["02"])
+        alone = VoterPoints.load(os.path.join(self.output, "_voters", "02"), None)
+        self.assertFalse(os.path.exists(os.path.join(self.output, "_voters", "01")))
+
+        self.run_all()
+        together = VoterPoints.load(os.path.join(self.output, "_voters", "02"))
+        np.testing.assert_array_equal(alone.x, together.x)
+
+    def test_failure_is_reported(self):
+        failures = run(
+            self.precinct_file,
+            self.district_files,
+            self.output,
+            k=5,
+            p=0.2,
+            dem_vote_count="missing",
+            district_state_column="STATEFP",
+        )
+        self.assertEqual(len(failures), 2)
+
+    @unittest.skipUnless(pyarrow is not None, "pyarrow is not installed")
+    def test_parquet(self):
+        self.precinct_file = self.path("precincts.parquet")
+        write_precincts(self.precincts, self.precinct_file, sort_by="STATE")
+        self.assertEqual(self.run_all(states=["02"], output_format="parquet"), [])
+
+        voters = read_voter_points(
+            os.path.join(self.output, "USCongress", "02_voters.parquet")
+        )
+        self.assertTrue((voters.x >= 4).all())
+        self.assertIn("partisan_dislocation", voters.columns)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.output, "USCongress", "02_districts.csv"))
+        )
+
+    @unittest.skipUnless(pyarrow is not None, "pyarrow is not installed")
+    def test_parquet_integer_states(self):
+        precincts = self.precincts.assign(STATE=self.precincts["STATE"].astype(int))
+        self.precinct_file = self.path("precincts.parquet")
+        write_precincts(precincts, self.precinct_file, sort_by="STATE")
+        for chamber, path in self.district_files.items():
+            districts = gpd.read_file(path)
+            districts["STATEFP"] = districts["STATEFP"].astype(int)
+            self.district_files[chamber] = self.path(f"{chamber}.parquet")
+            districts.to_parquet(self.district_files[chamber])
+
+        self.assertEqual(self.run_all(states=["02"]), [])
+        voters = VoterPoints.load(os.path.join(self.output, "USCongress", "2_voters"))
+        self.assertTrue((voters.x >= 4).all())
+        self.assertFalse(os.path.exists(os.path.join(self.output, "_voters", "1")))
+
+    def test_main(self):
+        argv = [
+            self.precinct_file,
+            f"USCongress={self.district_files['USCongress']}",
+            "-o",
+            self.output,
+            "-k",
+            "5",
+            "-p",
+            "0.2",
+            "--seed",
+            "1",
+            "--district-state-column",
+            "STATEFP",
+            "--states",
+            "01",
+            "-q",
+        ]
+        self.assertEqual(main(argv), 0)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.output, "USCongress", "01_districts.csv"))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
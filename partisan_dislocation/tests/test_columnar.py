@@ -0,0 +1,137 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from shapely.geometry import box
+import geopandas as gpd
+from partisan_dislocation import (
+    VoterPoints,
+    read_precincts,
+    write_precincts,
+    read_voter_points,
+    write_voter_points,
+)
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+@unittest.skipUnless(pq is not None, "pyarrow is not installed")
+class TestColumnar(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+        # Two "states" of 20 x 20 precincts side by side.
+        cells = [(i, j) for i in range(40) for j in range(20)]
+        self.precincts = gpd.GeoDataFrame(
+            {
+                "STATE": ["01" if i < 20 else "02" for i, j in cells],
+                "dem": np.arange(len(cells)),
+                "rep": 1000 - np.arange(len(cells)),
+                "geometry": [box(i, j, i + 1, j + 1) for i, j in cells],
+            },
+            crs="esri:102010",
+        ).sample(frac=1, random_state=0)
+
+        rng = np.random.default_rng(0)
+        n = 10_000
+        self.voters = VoterPoints(
+            np.sort(rng.uniform(0, 40, n)),
+            rng.uniform(0, 20, n),
+            rng.integers(0, 2, n),
+            precinct=rng.integers(0, 800, n),
+            crs="esri:102010",
+            columns={"partisan_dislocation": rng.normal(size=n)},
+        )
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_precincts_round_trip(self):
+        path = self.path("precincts.parquet")
+        write_precincts(self.precincts, path, sort_by="STATE", row_group_size=100)
+
+        result = read_precincts(path)
+        self.assertEqual(len(result), len(self.precincts))
+        self.assertEqual(result.crs, self.precincts.crs)
+        self.assertEqual(sorted(result["dem"]), sorted(self.precincts["dem"]))
+
+        # Rows are grouped by state, so row groups do not mix states.
+        self.assertTrue((result["STATE"].iloc[:400] == "01").all())
+
+    def test_precincts_bbox_skips_row_groups(self):
+        path = self.path("precincts.parquet")
+        write_precincts(self.precincts, path, sort_by="STATE", row_group_size=100)
+
+        result = read_precincts(path, bbox=(0.5, 0.5, 3.5, 3.5), columns=["dem"])
+        self.assertEqual(len(result), 16)
+        self.assertEqual(list(result.columns[:1]), ["dem"])
+
+        state = read_precincts(path, filters=[("STATE", "==", "02")], crs="epsg:4326")
+        self.assertEqual(len(state), 400)
+        self.assertEqual(state.crs, "epsg:4326")
+
+    def test_precincts_from_other_formats(self):
+        path = self.path("precincts.gpkg")
+        self.precincts.to_file(path)
+        result = read_precincts(path, bbox=(0.5, 0.5, 3.5, 3.5))
+        self.assertEqual(len(result), 16)
+
+    def test_voter_points_xy(self):
+        path = self.path("voters.parquet")
+        write_voter_points(self.voters, path, row_group_size=1000)
+
+        # Plain float columns, no geometry.
+        schema = pq.read_schema(path)
+        self.assertEqual(str(schema.field("x").type), "double")
+        self.assertNotIn(b"geo", schema.metadata)
+
+        result = read_voter_points(path)
+        np.testing.assert_array_equal(result.x, self.voters.x)
+        np.testing.assert_array_equal(result.dem, self.voters.dem)
+        np.testing.assert_array_equal(result.precinct, self.voters.precinct)
+        np.testing.assert_array_equal(
+            result["partisan_dislocation"], self.voters["partisan_dislocation"]
+        )
+        self.assertIn("102010", str(result.crs))
+
+        bbox = (10, 5, 12, 8)
+        inside = (
+            (self.voters.x >= 10)
+            & (self.voters.x <= 12)
+            & (self.voters.y >= 5)
+            & (self.voters.y <= 8)
+        )
+        clipped = read_voter_points(path, bbox=bbox, columns=[])
+        self.assertEqual(len(clipped), inside.sum())
+        self.assertEqual(list(clipped.columns), [])
+
+    def test_voter_points_wkb(self):
+        path = self.path("voters.parquet")
+        write_voter_points(self.voters.to_geodataframe(), path, geometry="wkb")
+        self.assertIn(b"geo", pq.read_schema(path).metadata)
+
+        result = read_voter_points(path, bbox=(10, 5, 12, 8))
+        self.assertTrue(((result.x >= 10) & (result.x <= 12)).all())
+        self.assertIn("partisan_dislocation", result.columns)
+        self.assertEqual(result.dem.dtype, np.int8)
+
+    def test_voter_points_geodataframe_precincts(self):
+        df = self.voters.to_geodataframe(precinct_column="precinct")
+        for geometry in ["xy", "wkb"]:
+            path = self.path(f"voters_{geometry}.parquet")
+            write_voter_points(df, path, geometry=geometry)
+            result = read_voter_points(path)
+            np.testing.assert_array_equal(result.precinct, self.voters.precinct)
+            self.assertNotIn("precinct", result.columns)
+
+    def test_bad_geometry(self):
+        with self.assertRaises(ValueError):
+            write_voter_points(self.voters, self.path("v.parquet"), geometry="wkt")
+
+
+if __name__ == "__main__":
+    unittest.main()
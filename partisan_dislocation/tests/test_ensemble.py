@@ -0,0 +1,95 @@
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+import geopandas as gpd
+from partisan_dislocation import random_points_in_polygon
+from partisan_dislocation import calculate_voter_knn
+from partisan_dislocation import calculate_dislocation
+from partisan_dislocation import score_plans
+
+
+class TestScorePlans(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.precincts = gpd.GeoDataFrame(
+            {
+                "dem": rng.integers(0, 60, 9),
+                "rep": rng.integers(0, 60, 9),
+                "geometry": [
+                    box(i, j, i + 1, j + 1) for i in range(3) for j in range(3)
+                ],
+            },
+            crs="esri:102010",
+        )
+        points = random_points_in_polygon(
+            self.precincts, p=0.7, random_seed=2, as_voter_points=True
+        )
+        self.voters = calculate_voter_knn(points, k=10)
+
+        # Plans as precinct assignments and as the matching polygons.
+        self.assignments = np.array(
+            [
+                [0, 0, 0, 1, 1, 1, 2, 2, 2],
+                [0, 1, 2, 0, 1, 2, 0, 1, 2],
+                [5, 5, 5, 5, 7, 7, 7, 7, 7],
+            ]
+        )
+        self.plans = [
+            self.precincts.dissolve(by=pd.Series(plan)).reset_index(drop=True)
+            for plan in self.assignments
+        ]
+
+    def test_polygon_plans_match_calculate_dislocation(self):
+        scores = score_plans(self.voters, self.plans)
+        assert len(scores) == 3
+        for plan, row in zip(self.plans, scores.itertuples()):
+            dislocation = calculate_dislocation(self.voters, plan)
+            values = dislocation["partisan_dislocation"]
+            self.assertAlmostEqual(row.mean_dislocation, values.mean())
+            self.assertAlmostEqual(row.mean_abs_dislocation, np.abs(values).mean())
+            assert row.n_unassigned == 0
+
+    def test_assignment_plans_match_polygon_plans(self):
+        pd.testing.assert_frame_equal(
+            score_plans(self.voters, self.assignments),
+            score_plans(self.voters, self.plans),
+        )
+
+    def test_assignment_plans_geodataframe_voters(self):
+        voters = self.voters.to_geodataframe(precinct_column="precinct")
+        pd.testing.assert_frame_equal(
+            score_plans(voters, self.assignments),
+            score_plans(self.voters, self.assignments),
+        )
+
+    def test_process_pool(self):
+        for plans in (self.plans, self.assignments):
+            pd.testing.assert_frame_equal(
+                score_plans(self.voters, plans, n_jobs=2),
+                score_plans(self.voters, plans),
+            )
+
+        voters = self.voters.to_geodataframe(precinct_column="precinct")
+        pd.testing.assert_frame_equal(
+            score_plans(voters, self.assignments, n_jobs=2),
+            score_plans(voters, self.assignments),
+        )
+
+    def test_saved_voter_points(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.voters.save(tmp)
+            expected = score_plans(self.voters, self.assignments)
+            pd.testing.assert_frame_equal(score_plans(tmp, self.assignments), expected)
+            pd.testing.assert_frame_equal(
+                score_plans(tmp, self.assignments, n_jobs=2), expected
+            )
+
+    def test_wrong_number_of_precincts(self):
+        with self.assertRaises(ValueError):
+            score_plans(self.voters, self.assignments[:, :4])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import subprocess
+import sys
+import unittest
+
+GEOMETRY_MODULES = ["geopandas", "shapely"]
+
+
+def _loaded(code, modules):
+    "Modules of `modules` imported after running `code` in a fresh interpreter"
+    check = f"import sys; print(*[m for m in {modules!r} if m in sys.modules])"
+    result = subprocess.run(
+        [sys.executable, "-c", f"{code}\n{check}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.split()
+
+
+class TestLazyImports(unittest.TestCase):
+    def test_import_package(self):
+        loaded = _loaded(
+            "import partisan_dislocation",
+            [*GEOMETRY_MODULES, "pandas", "scipy"],
+        )
+        self.assertEqual(loaded, [])
+
+    def test_import_core_module(self):
+        loaded = _loaded(
+            "import partisan_dislocation.partisan_dislocation",
+            [*GEOMETRY_MODULES, "pandas", "scipy"],
+        )
+        self.assertEqual(loaded, [])
+
+    def test_array_path(self):
+        code = """
+import numpy as np
+import partisan_dislocation as pdn
+
+rng = np.random.default_rng(0)
+voters = pdn.VoterPoints(
+    rng.random(500), rng.random(500), rng.integers(0, 2, 500),
+    precinct=np.repeat(np.arange(50), 10),
+)
+voters = pdn.calculate_voter_knn(voters, 10)
+voters = pdn.calculate_voter_knn(voters, 10, method="grid")
+pdn.score_plans(voters, [np.arange(50) // 25, np.arange(50) % 2])
+"""
+        self.assertEqual(_loaded(code, GEOMETRY_MODULES), [])
+
+    def test_public_names(self):
+        import partisan_dislocation as pdn
+
+        for name in pdn.__all__:
+            self.assertTrue(hasattr(pdn, name), name)
+        self.assertIn("VoterPoints", dir(pdn))
+        with self.assertRaises(AttributeError):
+            pdn.not_a_function
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+import numpy as np
+from shapely.geometry import box
+import geopandas as gpd
+from scipy.spatial import cKDTree
+from partisan_dislocation import IncrementalDislocation, assign_districts
+
+
+class TestIncrementalDislocation(unittest.TestCase):
+    def setUp(self):
+        n = 8
+        dem = np.array([70 if i < n // 2 else 30 for i in range(n) for j in range(n)])
+        self.precincts = gpd.GeoDataFrame(
+            {
+                "dem": dem,
+                "rep": 100 - dem,
+                "geometry": [
+                    box(i, j, i + 1, j + 1) for i in range(n) for j in range(n)
+                ],
+            },
+            crs="esri:102010",
+        )
+        self.districts = gpd.GeoDataFrame(
+            {"district": ["A", "B"], "geometry": [box(0, 0, 4, 8), box(4, 0, 8, 8)]},
+            crs="esri:102010",
+        )
+        self.k = 10
+        self.result = IncrementalDislocation(
+            self.precincts,
+            self.districts,
+            k=self.k,
+            p=0.2,
+            random_seed=3,
+            district_id_col="district",
+        )
+
+    def check_matches_full(self, result):
+        # kNN sums, radii and assignments equal a full recomputation on
+        # the same points.
+        coords = np.column_stack([result.x, result.y])
+        dd, ii = cKDTree(coords).query(coords, k=self.k + 1)
+        np.testing.assert_allclose(result.knn_radius, dd[:, -1])
+        np.testing.assert_allclose(
+            result.knn_sums, result.dem[ii].sum(axis=1) - result.dem
+        )
+
+        voters = gpd.GeoDataFrame(
+            geometry=gpd.points_from_xy(result.x, result.y), crs=result.crs
+        )
+        np.testing.assert_array_equal(
+            result.assignment, assign_districts(voters, result.districts)
+        )
+
+    def test_initial_result(self):
+        self.check_matches_full(self.result)
+        voters = self.result.voter_points()
+        self.assertEqual(
+            set(voters.columns),
+            {
+                "knn_shr_dem",
+                "knn_radius",
+                "district_dem_share",
+                "partisan_dislocation",
+                "district",
+            },
+        )
+        np.testing.assert_allclose(
+            voters["partisan_dislocation"],
+            voters["district_dem_share"] - voters["knn_shr_dem"],
+        )
+
+    def test_update_precincts(self):
+        before_x = self.result.x.copy()
+        before_precinct = self.result.precinct.copy()
+
+        edited = self.precincts.copy()
+        edited.loc[10, "dem"] = 5
+        edited.loc[10, "rep"] = 195
+        self.result.update_precincts(edited)
+        self.check_matches_full(self.result)
+
+        # Only precinct 10 was redrawn, and voters stay in precinct order.
+        untouched = before_precinct != 10
+        np.testing.assert_array_equal(
+            self.result.x[self.result.precinct != 10], before_x[untouched]
+        )
+        self.assertTrue((np.diff(self.result.precinct) >= 0).all())
+        self.assertEqual(self.result.last_update["precincts"], 1)
+        self.assertLess(self.result.last_update["knn_recomputed"], len(self.result.x))
+
+        self.assertEqual(
+            self.result.update_precincts(edited).last_update["precincts"], 0
+        )
+
+    def test_update_geometry(self):
+        edited = self.precincts.copy()
+        edited.loc[0, "geometry"] = box(0, 0, 0.5, 0.5)
+        self.result.update_precincts(edited)
+        self.check_matches_full(self.result)
+        at_zero = self.result.precinct == 0
+        self.assertTrue((self.result.x[at_zero] <= 0.5).all())
+
+    def test_update_districts(self):
+        edited = self.districts.copy()
+        edited.loc[0, "geometry"] = box(0, 0, 5, 8)
+        edited.loc[1, "geometry"] = box(5, 0, 8, 8)
+        self.result.update_districts(edited)
+        self.check_matches_full(self.result)
+
+        # Shrinking one district leaves the other district's far side alone.
+        edited.loc[1, "geometry"] = box(5, 0, 8, 7)
+        self.result.update_districts(edited)
+        self.check_matches_full(self.result)
+        self.assertEqual(self.result.last_update["districts"], 1)
+        self.assertLess(self.result.last_update["reassigned"], len(self.result.x))
+        self.assertLess(len(self.result.voter_points()), len(self.result.x))
+
+    def test_rejects_new_rows(self):
+        with self.assertRaises(ValueError):
+            self.result.update_precincts(self.precincts.iloc[:-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,17 @@
 import unittest
+from unittest import mock
+import numpy as np
 import pandas as pd
-from shapely.geometry import Polygon
+from shapely.geometry import MultiPolygon, Polygon
 from shapely.geometry import Point
 import geopandas as gpd
+import shapely
 from partisan_dislocation import random_points_in_polygon
+from partisan_dislocation import weighted_points_in_polygon
 from partisan_dislocation import calculate_voter_knn
 from partisan_dislocation import calculate_dislocation
+from partisan_dislocation import assign_districts
+import partisan_dislocation.partisan_dislocation as core
 
 
 class TestPartisanDislocation(unittest.TestCase):
@@ -41,6 +47,24 @@ class TestPartisanDislocation(unittest.TestCase):
         result2 = random_points_in_polygon(df, p=0.5, random_seed=47)
         pd.testing.assert_frame_equal(result1, result2)
 
+    def test_random_points_in_polygon_parallel_seed(self):
+        df = gpd.GeoDataFrame(
+            {
+                "dem": [30, 10, 0, 25],
+                "rep": [10, 30, 20, 25],
+                "geometry": [
+                    Polygon([(0, 0), (1, 1), (0, 1)]),
+                    Polygon([(1, 0), (2, 1), (1, 1)]),
+                    Polygon([(2, 0), (3, 1), (2, 1)]),
+                    Polygon([(3, 0), (4, 1), (3, 1)]),
+                ],
+            },
+            crs="esri:102010",
+        )
+        serial = random_points_in_polygon(df, p=0.5, random_seed=47)
+        parallel = random_points_in_polygon(df, p=0.5, random_seed=47, n_jobs=2)
+        pd.testing.assert_frame_equal(serial, parallel)
+
     def test_uniformswing(self):
         df = gpd.GeoDataFrame(
             {
@@ -139,6 +163,78 @@ class TestPartisanDislocation(unittest.TestCase):
         benchmark = pd.Series([1, 1, 0, 0, 0, 0], name="dem")
         pd.testing.assert_series_equal(result["dem"], benchmark)
 
+    def test_random_points_in_polygon_concave(self):
+        polygon = Polygon([(0, 0), (10, 0), (10, 10), (9, 10), (9, 1), (0, 1)])
+        df = gpd.GeoDataFrame(
+            {"dem": [300], "rep": [200], "geometry": [polygon]},
+            crs="esri:102010",
+        )
+        result = random_points_in_polygon(df, p=1, random_seed=3)
+        assert len(result) == 500
+        assert result.within(polygon).all()
+
+    def test_random_points_in_polygon_triangulation(self):
+        ring = Polygon(
+            [(0, 0), (4, 0), (4, 4), (0, 4)],
+            holes=[[(1, 1), (3, 1), (3, 3), (1, 3)]],
+        )
+        multipart = MultiPolygon(
+            [
+                Polygon([(5, 0), (6, 0), (6, 1), (5, 1)]),
+                Polygon([(8, 0), (9, 0), (9, 3)]),
+            ]
+        )
+        df = gpd.GeoDataFrame(
+            {"dem": [3000, 500], "rep": [1000, 500], "geometry": [ring, multipart]},
+            crs="esri:102010",
+        )
+        result = random_points_in_polygon(
+            df, p=1, random_seed=3, method="triangulation", as_voter_points=True
+        )
+        assert len(result) == 5000
+        points = gpd.points_from_xy(result.x, result.y)
+        assert points[:4000].within(ring).all()
+        assert points[4000:].within(multipart).all()
+
+        # Parts of the multipolygon are hit in proportion to their area.
+        share_in_square = (result.x[4000:] < 7).mean()
+        assert abs(share_in_square - 1 / 2.5) < 0.05
+
+        # Same seed, same points, in parallel too.
+        again = random_points_in_polygon(
+            df,
+            p=1,
+            random_seed=3,
+            method="triangulation",
+            n_jobs=2,
+            as_voter_points=True,
+        )
+        np.testing.assert_array_equal(result.x, again.x)
+
+        with self.assertRaises(ValueError):
+            random_points_in_polygon(df, p=1, method="grid")
+
+    def test_random_points_in_polygon_schema(self):
+        df = gpd.GeoDataFrame(
+            {
+                "dem": [3, 0, 2],
+                "rep": [1, 0, 4],
+                "geometry": [
+                    Polygon([(0, 0), (1, 1), (0, 1)]),
+                    Polygon([(0, 0), (1, 1), (0, 1)]),
+                    Polygon([(2, 2), (3, 3), (2, 3)]),
+                ],
+            },
+            crs="esri:102010",
+        )
+        result = random_points_in_polygon(df, p=1)
+        assert list(result.columns) == ["dem", "geometry"]
+        assert result.crs == df.crs
+        pd.testing.assert_index_equal(result.index, pd.RangeIndex(10))
+        pd.testing.assert_series_equal(
+            result["dem"], pd.Series([1, 1, 1, 0, 1, 1, 0, 0, 0, 0], name="dem")
+        )
+
     def test_calculate_voter_knn_simple_test(self):
         df = gpd.GeoDataFrame(
             {
@@ -209,6 +305,238 @@ class TestPartisanDislocation(unittest.TestCase):
             pd.Series([0.5, 1, 0, 0.5, 0.5, 0], name="knn_shr_dem"),
         )
 
+    def test_calculation_of_knn_duplicate_points(self):
+        df = gpd.GeoDataFrame(
+            {
+                "dem": [1, 1, 1, 0, 0, 0],
+                "geometry": [
+                    Point(0, 0),
+                    Point(0, 0),
+                    Point(0, 0),
+                    Point(10, 0),
+                    Point(11, 0),
+                    Point(12, 0),
+                ],
+            },
+            crs="esri:102010",
+        )
+        pd.testing.assert_series_equal(
+            calculate_voter_knn(df, k=2)["knn_shr_dem"],
+            pd.Series([1.0, 1, 1, 0, 0, 0], name="knn_shr_dem"),
+        )
+
+    def test_calculation_of_knn_workers_and_chunks(self):
+        df = gpd.GeoDataFrame(
+            {
+                "dem": [1, 0, 1, 0, 0, 1, 1, 0],
+                "geometry": [
+                    Polygon([(0, 0), (4, 0), (4, 4), (0, 4)]),
+                    Polygon([(4, 0), (8, 0), (8, 4), (4, 4)]),
+                    Polygon([(0, 4), (4, 4), (4, 8), (0, 8)]),
+                    Polygon([(4, 4), (8, 4), (8, 8), (4, 8)]),
+                    Polygon([(8, 0), (12, 0), (12, 4), (8, 4)]),
+                    Polygon([(8, 4), (12, 4), (12, 8), (8, 8)]),
+                    Polygon([(0, 8), (6, 8), (6, 12), (0, 12)]),
+                    Polygon([(6, 8), (12, 8), (12, 12), (6, 12)]),
+                ],
+            },
+            crs="esri:102010",
+        )
+        df["rep"] = 1 - df["dem"]
+        df[["dem", "rep"]] *= 200
+        points = random_points_in_polygon(df, p=0.5, random_seed=12)
+
+        serial = calculate_voter_knn(points, k=25, chunk_size=len(points))
+        parallel = calculate_voter_knn(points, k=25, workers=2, chunk_size=37)
+        pd.testing.assert_frame_equal(serial, parallel)
+
+        # By default blocks are sized from k and the entry budget.
+        self.assertEqual(core._query_rows(25), core._MAX_QUERY_ENTRIES // 26)
+        with mock.patch.object(core, "_MAX_QUERY_ENTRIES", 26 * 10):
+            self.assertEqual(core._query_rows(25), 10)
+            pd.testing.assert_frame_equal(calculate_voter_knn(points, k=25), serial)
+
+    def test_calculation_of_knn_multiple_k(self):
+        df = gpd.GeoDataFrame(
+            {
+                "dem": [1, 0, 1, 0, 0, 1],
+                "geometry": [
+                    Point(-3, 0),
+                    Point(-2.2, 0),
+                    Point(-0.9, 0),
+                    Point(0, 0),
+                    Point(1.3, 0),
+                    Point(2, 0),
+                ],
+            },
+            crs="esri:102010",
+        )
+        result = calculate_voter_knn(df, k=[1, 2, 4])
+        assert list(result.columns) == [
+            "dem",
+            "geometry",
+            "knn_shr_dem_k1",
+            "knn_shr_dem_k2",
+            "knn_shr_dem_k4",
+        ]
+        for k in [1, 2, 4]:
+            pd.testing.assert_series_equal(
+                result[f"knn_shr_dem_k{k}"],
+                calculate_voter_knn(df, k=k)["knn_shr_dem"],
+                check_names=False,
+            )
+
+    def test_calculation_of_knn_grid(self):
+        rng = np.random.default_rng(0)
+        n = 5000
+        x = rng.normal(size=n) * np.where(rng.random(n) < 0.5, 1, 5)
+        df = gpd.GeoDataFrame(
+            {"dem": ((x > 0) & (rng.random(n) < 0.7)).astype(int)},
+            geometry=gpd.points_from_xy(x, rng.normal(size=n)),
+            crs="esri:102010",
+        )
+        exact = calculate_voter_knn(df, k=[20, 200])
+        grid = calculate_voter_knn(df, k=[20, 200], method="grid")
+
+        for k in [20, 200]:
+            # The error never exceeds the reported bound, which the radius
+            # search keeps at max(0.01, 1 / k).
+            error = np.abs(grid[f"knn_shr_dem_k{k}"] - exact[f"knn_shr_dem_k{k}"])
+            bound = grid[f"knn_err_dem_k{k}"]
+            assert (error <= bound + 1e-12).all()
+            assert bound.max() <= max(0.01, 1 / k) + 1e-12
+
+        with self.assertRaises(ValueError):
+            calculate_voter_knn(df.assign(dem=0.5), k=20, method="grid")
+
+        # Duplicate points defeat the radius search; those voters are
+        # queried exactly instead.
+        clustered = pd.concat([df, df.iloc[:1].loc[[0] * 500]], ignore_index=True)
+        grid = calculate_voter_knn(clustered, k=200, method="grid")
+        assert grid["knn_shr_dem"].notna().all()
+        assert grid["knn_err_dem"].max() <= 0.01 + 1e-12
+        with self.assertRaises(ValueError):
+            calculate_voter_knn(df, k=20, method="approximate")
+
+    def test_weighted_points_in_polygon(self):
+        df = gpd.GeoDataFrame(
+            {
+                "dem": [300, 0, 40],
+                "rep": [100, 0, 160],
+                "geometry": [
+                    Polygon([(0, 0), (2, 0), (2, 2), (0, 2)]),
+                    Polygon([(2, 0), (3, 0), (3, 1)]),
+                    Polygon([(-1, -1), (0, -1), (0, 0), (-1, 0)]),
+                ],
+            },
+            crs="esri:102010",
+        )
+        result = weighted_points_in_polygon(
+            df, p=0.5, voters_per_point=30, random_seed=1, as_voter_points=True
+        )
+
+        # 200 and 100 sampled voters, in points of at most 30.
+        np.testing.assert_array_equal(
+            np.bincount(result.precinct, minlength=3), [7, 0, 4]
+        )
+        np.testing.assert_allclose(
+            np.bincount(result.precinct, weights=result["weight"]), [200, 0, 100]
+        )
+        np.testing.assert_allclose(
+            result.dem, np.where(result.precinct == 0, 0.75, 0.2)
+        )
+        first = result.precinct == 0
+        assert (result.x[first] > 0).all() and (result.x[~first] < 0).all()
+
+        again = weighted_points_in_polygon(
+            df, p=0.5, voters_per_point=30, random_seed=1
+        )
+        np.testing.assert_array_equal(again.geometry.x, result.x)
+        assert list(again.columns) == ["dem", "weight", "geometry"]
+
+        swung = weighted_points_in_polygon(
+            df, p=0.5, uniform_swing_to_dems=0.5, as_voter_points=True
+        )
+        np.testing.assert_allclose(swung.dem, np.where(swung.precinct == 0, 1, 0.7))
+
+        # Without constrained triangulation (shapely < 2.1), rejection
+        # sampling places the same point counts and weights.
+        triangulate = getattr(shapely, "constrained_delaunay_triangles", None)
+        if triangulate is not None:
+            del shapely.constrained_delaunay_triangles
+        try:
+            rejection = weighted_points_in_polygon(
+                df, p=0.5, voters_per_point=30, random_seed=1, as_voter_points=True
+            )
+        finally:
+            if triangulate is not None:
+                shapely.constrained_delaunay_triangles = triangulate
+        np.testing.assert_array_equal(rejection.precinct, result.precinct)
+        np.testing.assert_allclose(rejection["weight"], result["weight"])
+        assert (
+            gpd.points_from_xy(rejection.x, rejection.y)
+            .within(df.geometry.iloc[rejection.precinct].to_numpy())
+            .all()
+        )
+
+    def test_calculation_of_knn_weighted(self):
+        df = gpd.GeoDataFrame(
+            {
+                "dem": [1, 0, 0.5, 1],
+                "weight": [1, 2, 4, 3],
+                "geometry": [Point(0, 0), Point(1, 0), Point(3, 0), Point(6, 0)],
+            },
+            crs="esri:102010",
+        )
+        result = calculate_voter_knn(df, k=[2, 3], weight_column="weight")
+
+        # From (0, 0): 2 voters of the point at 1 (dem 0), then 1 of the
+        # 4 voters of the point at 3 (dem 0.5).
+        self.assertAlmostEqual(result["knn_shr_dem_k2"][0], 0)
+        self.assertAlmostEqual(result["knn_shr_dem_k3"][0], 0.5 / 3)
+        # From (6, 0): the point at 3 alone weighs more than 3.
+        self.assertAlmostEqual(result["knn_shr_dem_k3"][3], 0.5)
+        # Together the others of (1, 0) weigh less than 10: all are used.
+        total = calculate_voter_knn(df, k=10, weight_column="weight")
+        self.assertAlmostEqual(total["knn_shr_dem"][1], (1 + 2 + 3) / 8)
+
+        # With unit weights, the same as unweighted points.
+        rng = np.random.default_rng(0)
+        unit = gpd.GeoDataFrame(
+            {"dem": rng.integers(0, 2, 500), "weight": np.ones(500)},
+            geometry=gpd.points_from_xy(rng.random(500), rng.random(500)),
+            crs="esri:102010",
+        )
+        np.testing.assert_allclose(
+            calculate_voter_knn(unit, k=20, weight_column="weight", chunk_size=7)[
+                "knn_shr_dem"
+            ],
+            calculate_voter_knn(unit, k=20)["knn_shr_dem"],
+        )
+
+        with self.assertRaises(ValueError):
+            calculate_voter_knn(df, k=2, weight_column="weight", method="grid")
+        with self.assertRaises(ValueError):
+            calculate_voter_knn(df.assign(weight=0), k=2, weight_column="weight")
+
+    def test_calculation_of_dislocation_weighted(self):
+        df = gpd.GeoDataFrame(
+            {
+                "dem": [1, 0, 0.5],
+                "knn_shr_dem": [0.5, 0.5, 0.5],
+                "weight": [1, 2, 5],
+                "geometry": [Point(0, 0), Point(1, 0), Point(3, 0)],
+            },
+            crs="esri:102010",
+        )
+        districts = gpd.GeoDataFrame(
+            geometry=[Polygon([(-1, -1), (4, -1), (4, 1), (-1, 1)])],
+            crs="esri:102010",
+        )
+        result = calculate_dislocation(df, districts, weight_column="weight")
+        np.testing.assert_allclose(result["district_dem_share"], 3.5 / 8)
+        assert "weight" in result.columns
+
     def test_calculation_of_dislocation(self):
         df = gpd.GeoDataFrame(
             {
@@ -248,6 +576,117 @@ class TestPartisanDislocation(unittest.TestCase):
             dislocation[["district_dem_share", "partisan_dislocation"]], expected_result
         )
 
+    def test_assign_districts(self):
+        df = gpd.GeoDataFrame(
+            {"dem": [1, 0, 1], "geometry": [Point(-3, 0), Point(-1.5, 0), Point(5, 0)]},
+            crs="esri:102010",
+        )
+        districts = gpd.GeoDataFrame(
+            {
+                "geometry": [
+                    Polygon([[-3.5, -1], [-3.5, 1], [-1.5, 1], [-1.5, -1], [-3.5, -1]]),
+                    Polygon([[-1.5, 1], [-1.5, -1], [2.5, -1], [2.5, 1], [-1.5, 1]]),
+                ],
+            },
+            crs="esri:102010",
+        )
+        # Points on shared boundaries go to the first district.
+        assert list(assign_districts(df, districts)) == [0, 0, -1]
+
+    def test_unassigned_voters(self):
+        df = gpd.GeoDataFrame(
+            {
+                "dem": [1, 0, 1, 0, 0, 1],
+                "geometry": [
+                    Point(-3, 0),
+                    Point(-2, 0),
+                    Point(-1, 0),
+                    Point(0, 0),
+                    Point(1, 0),
+                    Point(2, 0),
+                ],
+            },
+            crs="esri:102010",
+        )
+        districts = gpd.GeoDataFrame(
+            {
+                "dist": ["a", "b"],
+                "geometry": [
+                    Polygon([[-3.5, -1], [-3.5, 1], [-1.5, 1], [-1.5, -1], [-3.5, -1]]),
+                    Polygon([[-1.5, 1], [-1.5, -1], [1.5, -1], [1.5, 1], [-1.5, 1]]),
+                ],
+            },
+            crs="esri:102010",
+        )
+        knns = calculate_voter_knn(df, k=2)
+
+        with self.assertWarns(UserWarning):
+            dropped = calculate_dislocation(knns, districts, district_id_col="dist")
+        pd.testing.assert_index_equal(dropped.index, pd.RangeIndex(5))
+
+        kept = calculate_dislocation(
+            knns, districts, district_id_col="dist", unassigned="keep"
+        )
+        assert len(kept) == 6
+        assert kept["partisan_dislocation"].isna().tolist() == [False] * 5 + [True]
+        assert kept["dist"].isna().tolist() == [False] * 5 + [True]
+
+        with self.assertRaises(ValueError):
+            calculate_dislocation(knns, districts, unassigned="raise")
+
+    def test_dislocation_from_precinct_assignment(self):
+        precincts = gpd.GeoDataFrame(
+            {
+                "name": ["w", "x", "y", "z"],
+                "dem": [40, 10, 25, 5],
+                "rep": [10, 40, 25, 45],
+                "geometry": [
+                    Polygon([(0, 0), (1, 0), (1, 1), (0, 1)]),
+                    Polygon([(1, 0), (2, 0), (2, 1), (1, 1)]),
+                    Polygon([(0, 1), (1, 1), (1, 2), (0, 2)]),
+                    Polygon([(1, 1), (2, 1), (2, 2), (1, 2)]),
+                ],
+            },
+            crs="esri:102010",
+        )
+        districts = gpd.GeoDataFrame(
+            {
+                "dist": ["a", "b"],
+                "geometry": [
+                    Polygon([(0, 0), (1, 0), (1, 2), (0, 2)]),
+                    Polygon([(1, 0), (2, 0), (2, 2), (1, 2)]),
+                ],
+            },
+            crs="esri:102010",
+        )
+        precinct_districts = pd.Series(["b", "a", "b", "a"], index=["x", "w", "z", "y"])
+
+        points = random_points_in_polygon(
+            precincts, p=0.5, random_seed=8, precinct_id_col="name"
+        )
+        assert list(points.columns) == ["dem", "name", "geometry"]
+
+        knns = calculate_voter_knn(points, k=5)
+        expected = calculate_dislocation(knns, districts, district_id_col="dist")
+        result = calculate_dislocation(
+            knns, precinct_districts, district_id_col="dist", precinct_id_col="name"
+        )
+        pd.testing.assert_frame_equal(result, expected)
+
+        # VoterPoints can match by precinct position instead.
+        voters = random_points_in_polygon(
+            precincts, p=0.5, random_seed=8, as_voter_points=True
+        )
+        result = calculate_dislocation(
+            calculate_voter_knn(voters, k=5),
+            pd.Series(["a", "b", "a", "b"]),
+            district_id_col="dist",
+        )
+        pd.testing.assert_frame_equal(
+            result.to_geodataframe(),
+            expected[result.to_geodataframe().columns],
+        )
+
     def test_adding_district_name(self):
         df = gpd.GeoDataFrame(
             {
@@ -379,6 +818,8 @@ class TestPartisanDislocationExceptions(unittest.TestCase):
         )
         with self.assertRaises(ValueError):
             random_points_in_polygon(df, p=1)
+        with self.assertRaises(ValueError):
+            random_points_in_polygon(df, p=1, method="triangulation")
 
     def test_no_crs(self):
         df = gpd.GeoDataFrame(
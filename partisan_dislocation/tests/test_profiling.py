@@ -0,0 +1,84 @@
+import logging
+import unittest
+import numpy as np
+from shapely.geometry import box
+import geopandas as gpd
+from partisan_dislocation import random_points_in_polygon
+from partisan_dislocation import calculate_voter_knn
+from partisan_dislocation import calculate_dislocation
+from partisan_dislocation import profile
+
+
+class TestProfile(unittest.TestCase):
+    def setUp(self):
+        self.precincts = gpd.GeoDataFrame(
+            {
+                "dem": [40, 10, 0],
+                "rep": [10, 40, 0],
+                "geometry": [box(0, 0, 1, 1), box(1, 0, 3, 1), box(3, 0, 4, 1)],
+            },
+            crs="esri:102010",
+        )
+        self.districts = gpd.GeoDataFrame(
+            {"geometry": [box(0, 0, 2, 1), box(2, 0, 4, 1)]}, crs="esri:102010"
+        )
+
+    def run_pipeline(self, **kwargs):
+        points = random_points_in_polygon(self.precincts, p=1, random_seed=2, **kwargs)
+        return calculate_dislocation(calculate_voter_knn(points, k=5), self.districts)
+
+    def test_report(self):
+        with profile() as report:
+            self.run_pipeline()
+
+        stages = report.to_dataframe()
+        self.assertEqual(
+            list(stages["stage"]),
+            [
+                "point_counts",
+                "rejection_sampling",
+                "build_geodataframe",
+                "tree_build",
+                "tree_query",
+                "district_assignment",
+                "district_shares",
+                "build_output",
+            ],
+        )
+        self.assertEqual(stages["rows"].iloc[0], 3)
+        self.assertTrue((stages["rows"].iloc[1:] == 100).all())
+        self.assertTrue((stages["seconds"] >= 0).all())
+        self.assertAlmostEqual(report.total_seconds(), stages["seconds"].sum())
+
+        # Boxes are their own bounding boxes; the empty precinct has no rate.
+        np.testing.assert_array_equal(report.acceptance_rates, [1, 1, np.nan])
+
+    def test_acceptance_rates_parallel(self):
+        precincts = self.precincts.copy()
+        precincts.loc[0, "geometry"] = box(0, 0, 1, 1).difference(box(0, 0, 0.5, 0.5))
+        self.precincts = precincts
+        with profile() as serial:
+            self.run_pipeline()
+        with profile() as parallel:
+            self.run_pipeline(n_jobs=2)
+        np.testing.assert_array_equal(
+            serial.acceptance_rates, parallel.acceptance_rates
+        )
+        self.assertLess(serial.acceptance_rates[0], 1)
+
+    def test_inactive_outside_context(self):
+        with profile() as report:
+            pass
+        self.run_pipeline()
+        self.assertEqual(report.stages, [])
+
+    def test_logging(self):
+        with self.assertLogs("partisan_dislocation", level=logging.INFO) as logs:
+            with profile(log=True):
+                self.run_pipeline()
+        self.assertTrue(any("tree_query" in line for line in logs.output))
+        self.assertTrue(any("acceptance rate" in line for line in logs.output))
+
+
+if __name__ == "__main__":
+    unittest.main()
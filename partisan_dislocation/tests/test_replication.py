@@ -0,0 +1,160 @@
+import unittest
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+import geopandas as gpd
+from partisan_dislocation import random_points_in_polygon
+from partisan_dislocation import calculate_voter_knn
+from partisan_dislocation import calculate_dislocation
+from partisan_dislocation import replicate_dislocation
+from partisan_dislocation.replication import _RunningMoments, _RunningQuantile
+
+
+class TestReplicateDislocation(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.precincts = gpd.GeoDataFrame(
+            {
+                "name": [f"p{i}" for i in range(16)],
+                "dem": rng.integers(0, 80, 16),
+                "rep": rng.integers(0, 80, 16),
+                "geometry": [
+                    box(i, j, i + 1, j + 1) for i in range(4) for j in range(4)
+                ],
+            },
+            crs="esri:102010",
+        )
+        self.districts = gpd.GeoDataFrame(
+            {"district": ["A", "B"], "geometry": [box(0, 0, 2, 4), box(2, 0, 4, 4)]},
+            crs="esri:102010",
+        )
+
+    def test_single_draw_matches_pipeline(self):
+        # One draw is the ordinary pipeline run with the draw's seed.
+        seed = np.random.SeedSequence(5).spawn(1)[0].generate_state(4)
+        points = random_points_in_polygon(
+            self.precincts, p=0.5, random_seed=seed, as_voter_points=True
+        )
+        dislocation = calculate_dislocation(
+            calculate_voter_knn(points, k=8), self.districts, district_id_col="district"
+        ).to_geodataframe(precinct_column="precinct")
+
+        district_summary, precinct_summary = replicate_dislocation(
+            self.precincts,
+            self.districts,
+            k=8,
+            n_draws=1,
+            p=0.5,
+            random_seed=5,
+            district_id_col="district",
+            precinct_id_col="name",
+        )
+
+        expected = dislocation.groupby("district")["partisan_dislocation"].mean()
+        np.testing.assert_allclose(
+            district_summary["mean_dislocation_mean"].to_numpy(),
+            expected.loc[["A", "B"]].to_numpy(),
+        )
+        self.assertTrue(district_summary["mean_dislocation_var"].isna().all())
+
+        expected = (
+            dislocation["partisan_dislocation"]
+            .abs()
+            .groupby(dislocation["precinct"])
+            .mean()
+        )
+        np.testing.assert_allclose(
+            precinct_summary["mean_abs_dislocation_mean"]
+            .iloc[expected.index]
+            .to_numpy(),
+            expected.to_numpy(),
+        )
+        self.assertEqual(list(precinct_summary["name"]), list(self.precincts["name"]))
+
+    def test_parallel_matches_serial(self):
+        kwargs = dict(k=5, n_draws=4, p=0.3, random_seed=11, quantiles=[0.1, 0.9])
+        serial = replicate_dislocation(self.precincts, self.districts, **kwargs)
+        parallel = replicate_dislocation(
+            self.precincts, self.districts, n_jobs=2, **kwargs
+        )
+        for a, b in zip(serial, parallel):
+            pd.testing.assert_frame_equal(
+                pd.DataFrame(a.drop(columns="geometry")),
+                pd.DataFrame(b.drop(columns="geometry")),
+            )
+
+    def test_columns(self):
+        district_summary, precinct_summary = replicate_dislocation(
+            self.precincts,
+            self.districts,
+            k=5,
+            n_draws=3,
+            p=0.3,
+            random_seed=1,
+            quantiles=[0.5],
+        )
+        self.assertEqual(len(district_summary), 2)
+        self.assertEqual(len(precinct_summary), 16)
+        for summary in (district_summary, precinct_summary):
+            self.assertIn("mean_dislocation_q50", summary.columns)
+            self.assertIn("mean_abs_dislocation_var", summary.columns)
+            self.assertTrue((summary["n_draws"] <= 3).all())
+        self.assertTrue((district_summary["n_draws"] == 3).all())
+
+    def test_no_crs(self):
+        with self.assertRaises(ValueError):
+            replicate_dislocation(
+                self.precincts.set_crs(None, allow_override=True),
+                self.districts,
+                k=5,
+                n_draws=2,
+            )
+
+
+class TestRunningMoments(unittest.TestCase):
+    def test_matches_numpy(self):
+        draws = np.random.default_rng(0).normal(size=(20, 2, 3))
+        draws[3, 0, 1] = np.nan
+        moments = _RunningMoments((2, 3))
+        for values in draws:
+            moments.update(values)
+
+        np.testing.assert_allclose(moments.mean, np.nanmean(draws, axis=0))
+        np.testing.assert_allclose(moments.variance(), np.nanvar(draws, axis=0, ddof=1))
+        self.assertEqual(moments.count[0, 1], 19)
+
+
+class TestRunningQuantile(unittest.TestCase):
+    def test_exact_for_few_draws(self):
+        for n_draws in [4, 5]:
+            draws = np.random.default_rng(0).normal(size=(n_draws, 2, 3))
+            draws[1, 0, 1] = np.nan
+            for q in [0.25, 0.9]:
+                estimator = _RunningQuantile((2, 3), q)
+                for values in draws:
+                    estimator.update(values)
+                np.testing.assert_allclose(
+                    estimator.quantile(), np.nanquantile(draws, q, axis=0)
+                )
+
+    def test_matches_numpy(self):
+        rng = np.random.default_rng(0)
+        draws = rng.normal(size=(2000, 50)) * rng.uniform(0.01, 0.2, 50)
+        draws[rng.random(draws.shape) < 0.1] = np.nan
+        for q in [0.05, 0.5, 0.9]:
+            estimator = _RunningQuantile((50,), q)
+            for values in draws:
+                estimator.update(values)
+            np.testing.assert_allclose(
+                estimator.quantile(), np.nanquantile(draws, q, axis=0), atol=0.02
+            )
+            self.assertEqual(estimator.count.max(), (~np.isnan(draws)).sum(0).max())
+
+    def test_no_draws(self):
+        estimator = _RunningQuantile((3,), 0.5)
+        estimator.update(np.array([np.nan, 1.0, np.nan]))
+        np.testing.assert_array_equal(estimator.quantile(), [np.nan, 1.0, np.nan])
+
+
+if __name__ == "__main__":
+    unittest.main()
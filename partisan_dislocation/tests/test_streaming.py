@@ -0,0 +1,102 @@
+import unittest
+import warnings
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+import geopandas as gpd
+from partisan_dislocation import random_points_in_polygon
+from partisan_dislocation import calculate_voter_knn
+from partisan_dislocation import calculate_dislocation
+from partisan_dislocation import iter_dislocation_tiles
+
+
+def _grid_precincts(n=4):
+    rng = np.random.default_rng(0)
+    return gpd.GeoDataFrame(
+        {
+            "dem": rng.integers(0, 150, n * n),
+            "rep": rng.integers(0, 150, n * n),
+            "geometry": [box(i, j, i + 1, j + 1) for i in range(n) for j in range(n)],
+        },
+        crs="esri:102010",
+    )
+
+
+def _sorted(df):
+    df = df.assign(x=df.geometry.x, y=df.geometry.y).sort_values(["x", "y"])
+    return pd.DataFrame(df.drop(columns="geometry")).reset_index(drop=True)
+
+
+class TestIterDislocationTiles(unittest.TestCase):
+    def test_tiles_match_global_computation(self):
+        precincts = _grid_precincts()
+        districts = gpd.GeoDataFrame(
+            {"dist": ["a", "b"], "geometry": [box(0, 0, 1.5, 4), box(1.5, 0, 4, 4)]},
+            crs="esri:102010",
+        )
+
+        points = random_points_in_polygon(precincts, p=0.5, random_seed=5)
+        knn = calculate_voter_knn(points, k=20)
+        expected = calculate_dislocation(knn, districts, district_id_col="dist")
+
+        tiles = list(
+            iter_dislocation_tiles(
+                precincts,
+                districts,
+                k=20,
+                p=0.5,
+                random_seed=5,
+                district_id_col="dist",
+                tile_size=0.7,
+            )
+        )
+        assert len(tiles) > 1
+        result = pd.concat(tiles)
+
+        pd.testing.assert_frame_equal(_sorted(result), _sorted(expected))
+
+    def test_unassigned(self):
+        precincts = _grid_precincts()
+        districts = gpd.GeoDataFrame(
+            {"dist": ["a", "b"], "geometry": [box(0, 0, 1.5, 4), box(2, 0, 4, 4)]},
+            crs="esri:102010",
+        )
+        knn = calculate_voter_knn(
+            random_points_in_polygon(precincts, p=0.5, random_seed=5), k=20
+        )
+        kwargs = dict(k=20, p=0.5, random_seed=5, district_id_col="dist", tile_size=0.7)
+
+        for unassigned in ["drop", "keep"]:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always")
+                result = pd.concat(
+                    iter_dislocation_tiles(
+                        precincts, districts, unassigned=unassigned, **kwargs
+                    )
+                )
+            # Dropping warns once for the whole state, not once per tile.
+            self.assertEqual(len(caught), int(unassigned == "drop"))
+
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                expected = calculate_dislocation(
+                    knn, districts, district_id_col="dist", unassigned=unassigned
+                )
+            pd.testing.assert_frame_equal(_sorted(result), _sorted(expected))
+        self.assertTrue(result["dist"].isna().any())
+
+        with self.assertRaises(ValueError):
+            next(
+                iter_dislocation_tiles(
+                    precincts, districts, unassigned="raise", **kwargs
+                )
+            )
+
+    def test_no_crs(self):
+        precincts = _grid_precincts().set_crs(None, allow_override=True)
+        with self.assertRaises(ValueError):
+            next(iter_dislocation_tiles(precincts, precincts, k=5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+import geopandas as gpd
+from partisan_dislocation import random_points_in_polygon
+from partisan_dislocation import calculate_voter_knn
+from partisan_dislocation import calculate_dislocation
+from partisan_dislocation import VoterPoints
+
+
+class TestVoterPoints(unittest.TestCase):
+    def setUp(self):
+        self.precincts = gpd.GeoDataFrame(
+            {
+                "dem": [40, 10, 25, 5],
+                "rep": [10, 40, 25, 45],
+                "geometry": [
+                    box(0, 0, 1, 1),
+                    box(1, 0, 2, 1),
+                    box(0, 1, 1, 2),
+                    box(1, 1, 2, 2),
+                ],
+            },
+            crs="esri:102010",
+        )
+        self.districts = gpd.GeoDataFrame(
+            {"dist": ["a", "b"], "geometry": [box(0, 0, 1.2, 2), box(1.2, 0, 2, 2)]},
+            crs="esri:102010",
+        )
+
+    def test_matches_geodataframe(self):
+        points = random_points_in_polygon(self.precincts, p=0.8, random_seed=4)
+        voters = random_points_in_polygon(
+            self.precincts, p=0.8, random_seed=4, as_voter_points=True
+        )
+        assert isinstance(voters, VoterPoints)
+        assert voters.dem.dtype == np.int8
+        assert voters.precinct.dtype == np.int32
+        pd.testing.assert_frame_equal(voters.to_geodataframe(), points)
+
+        expected = calculate_dislocation(
+            calculate_voter_knn(points, k=5), self.districts, district_id_col="dist"
+        )
+        result = calculate_dislocation(
+            calculate_voter_knn(voters, k=5), self.districts, district_id_col="dist"
+        )
+        assert isinstance(result, VoterPoints)
+        pd.testing.assert_frame_equal(
+            result.to_geodataframe(),
+            expected[result.to_geodataframe().columns].reset_index(drop=True),
+        )
+
+    def test_precinct_of_origin(self):
+        voters = random_points_in_polygon(
+            self.precincts, p=1, random_seed=4, as_voter_points=True
+        )
+        counts = np.bincount(voters.precinct, minlength=4)
+        np.testing.assert_array_equal(counts, [50, 50, 50, 50])
+        for position, geometry in enumerate(self.precincts.geometry):
+            mine = voters.precinct == position
+            assert (
+                gpd.points_from_xy(voters.x[mine], voters.y[mine])
+                .within(geometry)
+                .all()
+            )
+
+    def test_round_trip(self):
+        df = gpd.GeoDataFrame(
+            {"dem": [1, 0, 1], "score": [0.5, 0.25, 0.0]},
+            geometry=gpd.points_from_xy([0, 1, 2], [3, 4, 5]),
+            crs="esri:102010",
+        )
+        voters = VoterPoints.from_geodataframe(df)
+        np.testing.assert_array_equal(voters["score"], [0.5, 0.25, 0.0])
+        pd.testing.assert_frame_equal(voters.to_geodataframe(), df)
+
+        df["precinct"] = [2, 0, 1]
+        voters = VoterPoints.from_geodataframe(df)
+        np.testing.assert_array_equal(voters.precinct, [2, 0, 1])
+        self.assertNotIn("precinct", voters.columns)
+
+    def test_save_load(self):
+        voters = calculate_voter_knn(
+            random_points_in_polygon(
+                self.precincts, p=0.8, random_seed=4, as_voter_points=True
+            ),
+            k=[3, 5],
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            voters.save(tmp)
+            loaded = VoterPoints.load(tmp)
+            assert not loaded.x.flags.owndata
+            assert not loaded.x.flags.writeable
+            assert list(loaded.columns) == ["knn_shr_dem_k3", "knn_shr_dem_k5"]
+            np.testing.assert_array_equal(loaded.precinct, voters.precinct)
+            assert loaded.crs == self.precincts.crs
+
+            # The pipeline works directly on the read-only mapped arrays.
+            pd.testing.assert_frame_equal(
+                calculate_dislocation(
+                    loaded, self.districts, knn_column="knn_shr_dem_k5"
+                ).to_geodataframe(),
+                calculate_dislocation(
+                    voters, self.districts, knn_column="knn_shr_dem_k5"
+                ).to_geodataframe(),
+            )
+            del loaded
+
+    def test_save_load_strings(self):
+        voters = calculate_dislocation(
+            calculate_voter_knn(
+                random_points_in_polygon(
+                    self.precincts, p=0.8, random_seed=4, as_voter_points=True
+                ),
+                k=5,
+            ),
+            self.districts,
+            district_id_col="dist",
+        )
+        assert voters["dist"].dtype == object
+        with tempfile.TemporaryDirectory() as tmp:
+            voters.save(tmp)
+            for mmap_mode in ["r", None]:
+                loaded = VoterPoints.load(tmp, mmap_mode=mmap_mode)
+                np.testing.assert_array_equal(
+                    loaded["dist"], voters["dist"].astype(str)
+                )
+                del loaded
+
+    def test_length_mismatch(self):
+        with self.assertRaises(ValueError):
+            VoterPoints([0, 1], [0, 1], [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,210 @@
+"""Compact, array-backed storage for representative voter points."""
+
+import json
+import os
+
+import numpy as np
+
+
+class VoterPoints:
+    """
+    Representative voter points stored as plain NumPy arrays.
+
+    Holds float64 coordinates, an int8 party indicator (or float64
+    Democratic shares for weighted points), the int32 position
+    of each voter's precinct of origin (-1 if unknown) and any number of
+    additional per-voter columns such as kNN shares or dislocation scores.
+    This takes a fraction of the memory of a GeoDataFrame of shapely
+    points, and all three pipeline functions accept and return it directly.
+    Use :meth:`to_geodataframe` to convert at the end.
+
+    :param x: x coordinates.
+    :param y: y coordinates.
+    :param dem: 1 for Democratic voters and 0 for Republican voters.
+          Integer or boolean values are stored as int8; float values
+          (e.g. the Democratic shares of
+          :func:`weighted_points_in_polygon`) as float64.
+    :param precinct: (default=None)
+          Position of each voter's precinct in the precinct GeoDataFrame.
+    :param crs: (default=None)
+          Coordinate reference system of x and y.
+    :param columns: (default=None)
+          Dict of additional per-voter arrays.
+    """
+
+    def __init__(self, x, y, dem, precinct=None, crs=None, columns=None):
+        self.x = np.ascontiguousarray(x, dtype="float64")
+        self.y = np.ascontiguousarray(y, dtype="float64")
+        dem = np.asarray(dem)
+        self.dem = np.asarray(
+            dem, dtype="int8" if dem.dtype.kind in "biu" else "float64"
+        )
+
+        if precinct is None:
+            precinct = np.full(len(self.x), -1)
+        self.precinct = np.asarray(precinct, dtype="int32")
+
+        self.crs = crs
+        self.columns = dict(columns) if columns is not None else {}
+
+        for name, values in [
+            ("y", self.y),
+            ("dem", self.dem),
+            ("precinct", self.precinct),
+            *self.columns.items(),
+        ]:
+            if len(values) != len(self.x):
+                raise ValueError(f"Column {name} does not have one value per voter.")
+
+    def __len__(self):
+        return len(self.x)
+
+    def __contains__(self, name):
+        return name in ("x", "y", "dem", "precinct") or name in self.columns
+
+    def __getitem__(self, name):
+        if name in ("x", "y", "dem", "precinct"):
+            return getattr(self, name)
+        return self.columns[name]
+
+    def __repr__(self):
+        names = ", ".join(["x", "y", "dem", "precinct", *self.columns])
+        return f"<VoterPoints: {len(self)} voters ({names})>"
+
+    def coords(self):
+        "(n, 2) float64 array of coordinates"
+        return np.column_stack([self.x, self.y])
+
+    def with_columns(self, **columns):
+        """
+        New VoterPoints with additional (or replaced) columns. Existing
+        arrays are shared, not copied.
+        """
+        return VoterPoints(
+            self.x,
+            self.y,
+            self.dem,
+            precinct=self.precinct,
+            crs=self.crs,
+            columns={**self.columns, **columns},
+        )
+
+    def subset(self, index):
+        "New VoterPoints with only the voters selected by a mask or indices"
+        return VoterPoints(
+            self.x[index],
+            self.y[index],
+            self.dem[index],
+            precinct=self.precinct[index],
+            crs=self.crs,
+            columns={name: values[index] for name, values in self.columns.items()},
+        )
+
+    def to_geodataframe(self, precinct_column=None):
+        """
+        Converts to a :class:`geopandas.GeoDataFrame` of point geometries
+        with a `dem` column followed by any additional columns.
+
+        :param precinct_column: (default=None)
+              If given, also include precinct positions under this name.
+        """
+        import geopandas as gpd
+
+        dem = self.dem.astype("int64") if self.dem.dtype == "int8" else self.dem
+        data = {"dem": dem, **self.columns}
+        if precinct_column is not None:
+            data[precinct_column] = self.precinct
+
+        return gpd.GeoDataFrame(
+            data, geometry=gpd.points_from_xy(self.x, self.y), crs=self.crs
+        )
+
+    def save(self, path):
+        """
+        Writes the arrays to directory `path` as one `.npy` file each, plus
+        a `meta.json` with the CRS and column names. Reload with
+        :meth:`load`.
+
+        Object columns (e.g. string precinct or district ids) are stored
+        as fixed-width strings, since object arrays can't be memory-mapped.
+        """
+        os.makedirs(path, exist_ok=True)
+
+        arrays = {"x": self.x, "y": self.y, "dem": self.dem, "precinct": self.precinct}
+        for i, values in enumerate(self.columns.values()):
+            values = np.asarray(values)
+            if values.dtype == object:
+                values = values.astype(str)
+            arrays[f"column_{i}"] = values
+        for name, values in arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), values)
+
+        meta = {
+            "crs": self.crs.to_wkt() if hasattr(self.crs, "to_wkt") else self.crs,
+            "columns": list(self.columns),
+        }
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        Reads VoterPoints written by :meth:`save`.
+
+        By default the arrays are memory-mapped read-only rather than
+        read, so loading is instant and processes loading the same
+        directory share one copy of the data through the page cache.
+
+        :param mmap_mode: (default="r")
+              Passed to :func:`numpy.load`. None reads the arrays into
+              memory.
+        """
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+
+        def load(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+
+        return cls(
+            load("x"),
+            load("y"),
+            load("dem"),
+            precinct=load("precinct"),
+            crs=meta["crs"],
+            columns={
+                name: load(f"column_{i}") for i, name in enumerate(meta["columns"])
+            },
+        )
+
+    @classmethod
+    def from_geodataframe(
+        cls, voter_points, dem_column="dem", precinct_column="precinct"
+    ):
+        """
+        Builds VoterPoints from a GeoDataFrame of point geometries. Columns
+        other than `dem_column`, `precinct_column` and geometry are kept as
+        additional columns.
+
+        :param dem_column: (default="dem")
+              Column with the party indicator.
+        :param precinct_column: (default="precinct")
+              Column with precinct positions, if present (e.g. from
+              ``to_geodataframe(precinct_column="precinct")``).
+        """
+        geometry = voter_points.geometry
+        columns = {
+            name: voter_points[name].to_numpy()
+            for name in voter_points.columns
+            if name not in (dem_column, precinct_column, geometry.name)
+        }
+        precinct = None
+        if precinct_column in voter_points:
+            precinct = voter_points[precinct_column].to_numpy()
+        return cls(
+            geometry.x.to_numpy(),
+            geometry.y.to_numpy(),
+            voter_points[dem_column].to_numpy(),
+            precinct=precinct,
+            crs=voter_points.crs,
+            columns=columns,
+        )